@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Category, Book, BorrowedBook
+from .models import User, Category, Book, BorrowedBook, BorrowedBookArchive, Hold, Task
 
 class CustomUserAdmin(UserAdmin):
     model = User
@@ -15,4 +15,7 @@ class CustomUserAdmin(UserAdmin):
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Category)
 admin.site.register(Book) 
-admin.site.register(BorrowedBook)
\ No newline at end of file
+admin.site.register(BorrowedBook)
+admin.site.register(Task)
+admin.site.register(Hold)
+admin.site.register(BorrowedBookArchive)
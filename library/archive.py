@@ -0,0 +1,85 @@
+"""Loan archival: returned loans leave BorrowedBook once they are old enough.
+
+Borrowing, returning, the book pages and the dashboards only look at open
+loans and a reader's last few returns, so BorrowedBook need not keep years
+of history. archive_loans() moves loans returned more than
+LIBRARY_LOAN_ARCHIVE_AFTER_DAYS ago into BorrowedBookArchive, CHUNK_SIZE
+at a time, each chunk copied and deleted in one short transaction so
+borrowers are never kept waiting behind it. Archived rows keep their
+BorrowedBook pk. It runs as a daily task and as ``manage.py archive_loans``.
+
+Readers of loan history go through this module or loans.list_loan_history,
+which read both tables: recent_returns() for the user dashboard, and
+HISTORY_SQL for the bulk jobs (exports, recommendations).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import tasks
+from .models import BorrowedBook, BorrowedBookArchive
+
+CHUNK_SIZE = 500
+
+# Every loan, open, returned or archived, as (user_id, book_id) rows for raw SQL.
+HISTORY_SQL = (f'SELECT user_id, book_id FROM {BorrowedBook._meta.db_table} '
+               f'UNION ALL SELECT user_id, book_id FROM {BorrowedBookArchive._meta.db_table}')
+
+
+def archive_cutoff(now=None, older_than=None):
+    """Loans returned before this are archived."""
+    if older_than is None:
+        older_than = timedelta(days=settings.LIBRARY_LOAN_ARCHIVE_AFTER_DAYS)
+    return (now or timezone.now()) - older_than
+
+
+def _delete_loans(pks):
+    # A plain DELETE: returned loans hold no statistics (signals.count_deleted_loan only
+    # counts open ones), so the post_delete signals QuerySet.delete() would send are skipped.
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {BorrowedBook._meta.db_table} WHERE id IN ({", ".join(["%s"] * len(pks))})',
+                       pks)
+
+
+def archive_loans(older_than=None, chunk_size=CHUNK_SIZE, now=None):
+    """Moves loans returned more than older_than ago into BorrowedBookArchive; returns the number moved."""
+    now = now or timezone.now()
+    cutoff = archive_cutoff(now, older_than)
+    archived, last_pk = 0, 0
+    while True:
+        with transaction.atomic():
+            rows = list(BorrowedBook.objects.filter(pk__gt=last_pk, return_date__lt=cutoff).order_by('pk')
+                                            .values_list('pk', 'user_id', 'book_id', 'borrow_date', 'due_date',
+                                                         'return_date', 'fine_amount')[:chunk_size])
+            if not rows:
+                return archived
+            BorrowedBookArchive.objects.bulk_create([
+                BorrowedBookArchive(id=pk, user_id=user_id, book_id=book_id, borrow_date=borrow_date,
+                                    due_date=due_date, return_date=return_date, fine_amount=fine_amount,
+                                    archived_at=now)
+                for pk, user_id, book_id, borrow_date, due_date, return_date, fine_amount in rows])
+            _delete_loans([row[0] for row in rows])
+        archived += len(rows)
+        last_pk = rows[-1][0]
+        if len(rows) < chunk_size:
+            return archived
+
+
+@tasks.task('archive_loans', every=timedelta(days=1))
+def archive_loans_task():
+    """Archives loans returned more than LIBRARY_LOAN_ARCHIVE_AFTER_DAYS ago."""
+    return archive_loans()
+
+
+def recent_returns(user, limit=5):
+    """The user's last returned loans, newest first, as BorrowedBook or BorrowedBookArchive rows."""
+    recent = list(BorrowedBook.objects.filter(user=user, return_date__isnull=False)
+                                      .select_related('book').order_by('-return_date')[:limit])
+    if len(recent) < limit:
+        # Archived loans were returned before any returned loan still in BorrowedBook,
+        # so the archive is only read to fill up a short list.
+        recent += list(BorrowedBookArchive.objects.filter(user=user).select_related('book')
+                                                  .order_by('-return_date')[:limit - len(recent)])
+    return recent
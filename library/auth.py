@@ -0,0 +1,78 @@
+"""Authentication backend that keeps recently seen users in process memory.
+
+AuthenticationMiddleware loads the logged-in User row on every request that
+touches request.user. CachedModelBackend serves it from a small per-process
+LRU instead. Entries are dropped when the user is saved or deleted in this
+process (see library.signals) and expire after LIBRARY_USER_CACHE_TIMEOUT
+seconds, which bounds how long another process can serve a stale row (for
+example after a password change or deactivation made elsewhere). Each
+request gets its own copy, so views can modify request.user freely.
+
+Together with the cached_db or signed_cookies session engine a logged-in
+request needs no queries for authentication on a cache hit.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+from . import metrics
+
+_users = OrderedDict()   # pk -> (expires_at, user)
+_lock = threading.Lock()
+
+
+def get_cached_user(pk):
+    with _lock:
+        entry = _users.get(pk)
+        if entry is not None and entry[0] > time.monotonic():
+            _users.move_to_end(pk)
+            user = entry[1]
+        else:
+            user = None
+    metrics.record_cache_lookup('users', user is not None)
+    return copy.copy(user) if user is not None else None
+
+
+def remember_user(user):
+    timeout = settings.LIBRARY_USER_CACHE_TIMEOUT
+    if not timeout:
+        return
+    with _lock:
+        _users[user.pk] = (time.monotonic() + timeout, copy.copy(user))
+        _users.move_to_end(user.pk)
+        while len(_users) > settings.LIBRARY_USER_CACHE_SIZE:
+            _users.popitem(last=False)
+
+
+def forget_user(pk):
+    with _lock:
+        _users.pop(pk, None)
+
+
+def clear():
+    with _lock:
+        _users.clear()
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() is served from the per-process user cache."""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                remember_user(user)
+        return user
+
+    async def aget_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                remember_user(user)
+        return user
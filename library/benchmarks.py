@@ -0,0 +1,147 @@
+"""Shared pieces of the benchmark suite (seed_library, bench_library, load_test).
+
+seed() fills the database with a reproducible synthetic library using bulk
+inserts only, then rebuilds the derived data (search index, stats row,
+recommendation tables) the way import_books does. summarize(), save_results()
+and compare_results() give every benchmark the same report and baseline format:
+``{"name": {"p50_ms": ..., "p95_ms": ..., "p99_ms": ..., "ops_per_s": ...}}``.
+"""
+import json
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import recommendations, search, stats
+from .cache import (bump_catalog_version, schedule_book_version_bump, schedule_category_version_bump,
+                    schedule_suggest_version_bump)
+from .models import Book, BorrowedBook, Category, User
+
+SEED_PASSWORD = 'bench-password'    # Password of every seeded reader (used by load_test).
+WORDS = ('river shadow garden silent empire winter golden broken hidden lost city night house ocean '
+         'fire stone glass paper iron crown storm wild last first secret little northern dark bright').split()
+LANGUAGES = ('English', 'English', 'English', 'Arabic', 'French', 'German', 'Spanish')
+BATCH = 2000
+
+
+def seed(books=10_000, users=1_000, categories=40, loans=50_000, seed_value=1234, stdout=None):
+    """Adds a synthetic catalog, readers and loan history; returns a dict of row counts.
+
+    Roughly 5% of loans are still open; their books' available_copies are reduced to match.
+    """
+    rng = random.Random(seed_value)
+    log = stdout.write if stdout else (lambda message: None)
+    prefix = f'S{seed_value}-'
+
+    with transaction.atomic():
+        Category.objects.bulk_create([Category(name=f'{prefix}Category {i}') for i in range(categories)],
+                                     ignore_conflicts=True)
+        category_pks = list(Category.objects.filter(name__startswith=prefix).values_list('pk', flat=True))
+
+        today = date.today()
+        Book.objects.bulk_create((
+            Book(book_id_json=f'{prefix}{i}', book_name=' '.join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+                 author=f'Author {rng.randrange(max(books // 5, 1))}', description=' '.join(rng.choices(WORDS, k=30)),
+                 publisher=f'Publisher {rng.randrange(50)}', language=rng.choice(LANGUAGES), pages=rng.randint(80, 900),
+                 publication_date=today - timedelta(days=rng.randrange(365 * 80)),
+                 total_copies=(copies := rng.randint(1, 5)), available_copies=copies)
+            for i in range(books)
+        ), batch_size=BATCH)
+        book_pks = list(Book.objects.filter(book_id_json__startswith=prefix).values_list('pk', flat=True))
+        log(f'  {len(book_pks)} books')
+
+        through = Book.categories.through
+        through.objects.bulk_create((
+            through(book_id=pk, category_id=category_pk)
+            for pk in book_pks for category_pk in rng.sample(category_pks, k=min(rng.randint(1, 3), len(category_pks)))
+        ), batch_size=BATCH)
+
+        password = make_password(SEED_PASSWORD)  # Hashed once; hashing per user would dominate seeding time.
+        User.objects.bulk_create((
+            User(username=f'{prefix}reader{i}', email=f'reader{i}@example.com', password=password)
+            for i in range(users)
+        ), batch_size=BATCH)
+        user_pks = list(User.objects.filter(username__startswith=prefix).values_list('pk', flat=True))
+        log(f'  {len(user_pks)} users')
+
+        open_loans, loan_rows, now = set(), [], timezone.now()
+        for _ in range(loans):
+            user_pk, book_pk = rng.choice(user_pks), rng.choice(book_pks)
+            borrowed = now - timedelta(days=rng.randrange(720), minutes=rng.randrange(1440))
+            is_open = rng.random() < 0.05 and (user_pk, book_pk) not in open_loans
+            if is_open:
+                open_loans.add((user_pk, book_pk))
+            loan_rows.append(BorrowedBook(user_id=user_pk, book_id=book_pk, due_date=borrowed + timedelta(days=14),
+                                          return_date=None if is_open else borrowed + timedelta(days=rng.randint(1, 20))))
+        created = BorrowedBook.objects.bulk_create(loan_rows, batch_size=BATCH)
+        # borrow_date is auto_now_add; spread it over the history like the other dates.
+        BorrowedBook.objects.filter(user__username__startswith=prefix)\
+                            .update(borrow_date=F('due_date') - timedelta(days=14))
+
+        on_loan = {}
+        for _, book_pk in open_loans:
+            on_loan[book_pk] = on_loan.get(book_pk, 0) + 1
+        Book.objects.bulk_update([
+            Book(pk=pk, available_copies=max(total - on_loan[pk], 0))
+            for pk, total in Book.objects.filter(pk__in=on_loan).values_list('pk', 'total_copies')
+        ], ['available_copies'], batch_size=BATCH)
+        log(f'  {len(created)} loans ({len(open_loans)} open)')
+
+    if search.is_search_available():
+        search.rebuild_index()
+    stats.recompute_stats()
+    recommendations.build_book_affinity()
+    recommendations.build_category_top_books()
+    bump_catalog_version()
+    schedule_category_version_bump()
+    schedule_book_version_bump(book_pks)
+    schedule_suggest_version_bump(rebuild=True)
+    return {'books': len(book_pks), 'users': len(user_pks), 'categories': len(category_pks),
+            'loans': len(created), 'open_loans': len(open_loans)}
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles (ms) for a list of durations in seconds, plus throughput when elapsed is given."""
+    ordered = sorted(samples)
+    summary = {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+    }
+    summary['ops_per_s'] = round(len(ordered) / (elapsed if elapsed else sum(ordered)), 1)
+    return summary
+
+
+def format_summary(name, summary):
+    return (f'{name:<36} {summary["ops_per_s"]:>10,.1f} ops/s   p50 {summary["p50_ms"]:>9.3f} ms   '
+            f'p95 {summary["p95_ms"]:>9.3f} ms   p99 {summary["p99_ms"]:>9.3f} ms')
+
+
+def save_results(path, results):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.write('\n')
+
+
+def compare_results(baseline_path, results, threshold):
+    """Returns a list of regression messages: p95 latency or throughput worse than baseline by > threshold."""
+    with open(baseline_path, encoding='utf-8') as fh:
+        baseline = json.load(fh)
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p95 {before["p95_ms"]:.3f} -> {current["p95_ms"]:.3f} ms')
+        if current['ops_per_s'] < before['ops_per_s'] * (1 - threshold):
+            regressions.append(f'{name}: throughput {before["ops_per_s"]:,.1f} -> {current["ops_per_s"]:,.1f} ops/s')
+    return regressions
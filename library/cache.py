@@ -0,0 +1,165 @@
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+from .models import Category
+
+CATALOG_VERSION_KEY = 'library:catalog-version'
+CATEGORY_VERSION_KEY = 'library:category-version'
+
+
+def _new_version():
+    """A version no earlier bump used: the clock in nanoseconds with 16 random low bits.
+
+    Versions are only compared for equality. Bumps write a fresh value with
+    cache.set() rather than cache.incr(), which is a non-atomic get and set on
+    the file and database backends: two concurrent increments could both land
+    on the same number, and a page cached between them would outlive the second
+    write. A restarted or evicted key never reuses an old version either.
+    """
+    return time.time_ns() << 16 | random.getrandbits(16)
+
+
+def _get_version(key):
+    """Returns the version stored at key, initialising it if the cache lost it."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def _aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump_version(key):
+    version = _new_version()
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def _bump_versions(keys):
+    cache.set_many({key: _new_version() for key in keys}, timeout=None)
+
+
+def get_catalog_version():
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+async def aget_catalog_version():
+    return await _aget_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Moves the catalog to a new version, orphaning every cached catalog page."""
+    return _bump_version(CATALOG_VERSION_KEY)
+
+
+def schedule_catalog_version_bump(using=None):
+    """Bumps the catalog version once the current transaction commits.
+
+    Outside a transaction the bump happens immediately.
+    """
+    transaction.on_commit(bump_catalog_version, using=using)
+
+
+def catalog_cache_key(version, query_string):
+    """Cache key for one catalog API response; parameter order does not matter."""
+    normalized = '&'.join(sorted(query_string.split('&'))) if query_string else ''
+    digest = hashlib.md5(normalized.encode(), usedforsecurity=False).hexdigest()
+    return f'library:catalog:{version}:{digest}', f'"catalog-{version}-{digest[:16]}"'
+
+
+def get_cached_catalog_page(key):
+    content = cache.get(key)
+    metrics.record_cache_lookup('catalog', content is not None)
+    return content
+
+
+def set_cached_catalog_page(key, content):
+    cache.set(key, content, timeout=settings.LIBRARY_CATALOG_CACHE_TIMEOUT)
+
+
+async def aget_cached_catalog_page(key):
+    content = await cache.aget(key)
+    metrics.record_cache_lookup('catalog', content is not None)
+    return content
+
+
+async def aset_cached_catalog_page(key, content):
+    await cache.aset(key, content, timeout=settings.LIBRARY_CATALOG_CACHE_TIMEOUT)
+
+
+# --- Page fragments ---
+# Server-rendered pages cache their slow-changing fragments under these
+# versions: the category version changes with any category write, a book's
+# version with any save of that book or change of its categories.
+
+def book_version_key(book_pk):
+    return f'library:book-version:{book_pk}'
+
+
+def get_category_version():
+    return _get_version(CATEGORY_VERSION_KEY)
+
+
+async def aget_category_version():
+    return await _aget_version(CATEGORY_VERSION_KEY)
+
+
+def schedule_category_version_bump(using=None):
+    transaction.on_commit(lambda: _bump_version(CATEGORY_VERSION_KEY), using=using)
+
+
+async def aget_book_version(book_pk):
+    return await _aget_version(book_version_key(book_pk))
+
+
+def schedule_book_version_bump(book_pks, using=None):
+    keys = [book_version_key(pk) for pk in book_pks]
+    transaction.on_commit(lambda: _bump_versions(keys), using=using)
+
+
+def get_categories():
+    """All categories as [{'pk', 'name'}] sorted by name, cached until a category changes."""
+    key = f'library:categories:{get_category_version()}'
+    categories = cache.get(key)
+    metrics.record_cache_lookup('categories', categories is not None)
+    if categories is None:
+        categories = list(Category.objects.order_by('name').values('pk', 'name'))
+        cache.set(key, categories, timeout=settings.LIBRARY_FRAGMENT_CACHE_TIMEOUT)
+    return categories
+
+
+# --- Suggest index versions (see library.suggest) ---
+# Book and category writes bump the version, which per-process indexes follow
+# incrementally; deletions and bulk imports bump the generation, which makes
+# them rebuild.
+
+SUGGEST_VERSION_KEY = 'library:suggest-version'
+SUGGEST_GENERATION_KEY = 'library:suggest-generation'
+
+
+def get_suggest_versions():
+    """(generation, version) of the suggest index."""
+    return _get_version(SUGGEST_GENERATION_KEY), _get_version(SUGGEST_VERSION_KEY)
+
+
+async def aget_suggest_versions():
+    return await _aget_version(SUGGEST_GENERATION_KEY), await _aget_version(SUGGEST_VERSION_KEY)
+
+
+def schedule_suggest_version_bump(rebuild=False, using=None):
+    """Bumps the suggest version (or, with rebuild, the generation) once the current transaction commits."""
+    key = SUGGEST_GENERATION_KEY if rebuild else SUGGEST_VERSION_KEY
+    transaction.on_commit(lambda: _bump_version(key), using=using)
@@ -0,0 +1,186 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, timezone
+
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.expressions import RawSQL
+
+from . import search as book_search
+from .models import Book
+
+# Sort options offered by the book list page, mapped to (model field, descending).
+SORT_OPTIONS = {
+    'title-asc': ('book_name', False),
+    'title-desc': ('book_name', True),
+    'author-asc': ('author', False),
+    'author-desc': ('author', True),
+    'newest': ('publication_date', True),
+    'oldest': ('publication_date', False),
+}
+DEFAULT_SORT = 'title-asc'
+SEARCH_TYPES = ('all', 'title', 'author', 'category')
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCatalogQuery(ValueError):
+    """Raised when catalog query parameters cannot be interpreted."""
+
+
+def _category_exists(lookup, value):
+    """Correlated EXISTS over the book/category through table (avoids duplicate rows)."""
+    through = Book.categories.through
+    return Exists(through.objects.filter(book_id=OuterRef('pk'), **{f'category__name__{lookup}': value}))
+
+
+def filter_books(queryset, params, search_available=None):
+    """Applies the category, availability and search filters of the book list page.
+
+    Async callers pass ``search_available`` (from search.ais_search_available)
+    so no introspection query runs inside the event loop.
+    """
+    category = (params.get('category') or 'all').strip()
+    if category.lower() != 'all':
+        queryset = queryset.filter(_category_exists('iexact', category))
+
+    availability = params.get('availability') or 'all'
+    if availability == 'available':
+        queryset = queryset.filter(available_copies__gt=0)
+    elif availability == 'borrowed':
+        queryset = queryset.filter(available_copies=0)
+
+    search = (params.get('search') or '').strip()
+    if search:
+        search_type = params.get('search_type') or 'all'
+        if search_type not in SEARCH_TYPES:
+            raise InvalidCatalogQuery(f'Unknown search_type "{search_type}".')
+        if search_available is None:
+            search_available = book_search.is_search_available(queryset.db)
+        if search_available:
+            expression = book_search.build_match_expression(search, search_type)
+            if expression is None:
+                return queryset.none()
+            return queryset.filter(pk__in=RawSQL(book_search.match_subquery_sql(), [expression]))
+        conditions = Q()
+        if search_type in ('all', 'title'):
+            conditions |= Q(book_name__icontains=search)
+        if search_type in ('all', 'author'):
+            conditions |= Q(author__icontains=search)
+        if search_type in ('all', 'category'):
+            conditions |= Q(_category_exists('icontains', search))
+        queryset = queryset.filter(conditions)
+    return queryset
+
+
+def encode_cursor(value, pk):
+    """Builds an opaque, URL-safe cursor from the last row's sort value and pk."""
+    if isinstance(value, date):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+# Sort fields whose cursor values are stored as ISO strings, with their parsers.
+CURSOR_PARSERS = {'publication_date': date.fromisoformat, 'due_date': datetime.fromisoformat,
+                  'return_date': datetime.fromisoformat}
+# Sort fields that can be NULL, and so have cursors with a null value.
+NULLABLE_CURSOR_FIELDS = frozenset({'publication_date'})
+MAX_PK = 2 ** 63 - 1  # BigAutoField
+
+
+def _cursor_value(value, field):
+    if value is None:
+        if field not in NULLABLE_CURSOR_FIELDS:
+            raise ValueError
+        return None
+    if not isinstance(value, str):  # Every sort value is a string or an ISO date in the cursor.
+        raise TypeError
+    if field in CURSOR_PARSERS:
+        value = CURSOR_PARSERS[field](value)
+        if isinstance(value, datetime):
+            if value.tzinfo is None:  # encode_cursor writes aware datetimes.
+                raise ValueError
+            value = value.astimezone(timezone.utc)
+    return value
+
+
+def decode_cursor(cursor, field):
+    """Reverses encode_cursor, restoring date values for date sort fields.
+
+    Anything encode_cursor cannot have written, such as a null value for a
+    field that is never NULL or a pk out of range, raises InvalidCatalogQuery.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(pk, bool) or not isinstance(pk, int) or not 0 < pk <= MAX_PK:
+            raise ValueError
+        return _cursor_value(value, field), pk
+    except (binascii.Error, ValueError, TypeError, OverflowError):
+        raise InvalidCatalogQuery('Invalid cursor.')
+
+
+def _after_cursor(field, descending, value, pk):
+    """Keyset condition for rows strictly after (value, pk) in the chosen ordering.
+
+    NULL sort values (only possible for publication_date) always sort last.
+    """
+    pk_after = Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+    if value is None:
+        return Q(**{f'{field}__isnull': True}) & pk_after
+    beyond = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+    return beyond | (Q(**{field: value}) & pk_after) | Q(**{f'{field}__isnull': True})
+
+
+def _page_queryset(queryset, params):
+    """Returns (sliced queryset, sort field, page size) for one keyset page; see paginate_books."""
+    sort = params.get('sort') or DEFAULT_SORT
+    if sort not in SORT_OPTIONS:
+        raise InvalidCatalogQuery(f'Unknown sort "{sort}".')
+    field, descending = SORT_OPTIONS[sort]
+
+    try:
+        page_size = int(params.get('page_size') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise InvalidCatalogQuery('page_size must be an integer.')
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    cursor = params.get('cursor')
+    if cursor:
+        value, pk = decode_cursor(cursor, field)
+        queryset = queryset.filter(_after_cursor(field, descending, value, pk))
+
+    if descending:
+        ordering = [F(field).desc(nulls_last=True), '-pk']
+    else:
+        ordering = [F(field).asc(nulls_last=True), 'pk']
+    # One extra row tells whether there is a next page.
+    return queryset.order_by(*ordering)[:page_size + 1], field, page_size
+
+
+def _split_page(rows, field, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[field], last['pk'])
+    return rows, next_cursor
+
+
+def paginate_books(queryset, params):
+    """Returns (rows, next_cursor) for one keyset page of the filtered catalog.
+
+    ``queryset`` must be a ``.values()`` queryset that includes ``pk`` and the
+    sort fields. Ordering is always (sort field, pk) so the cursor is stable
+    even when many books share the same title, author or publication date.
+    """
+    page, field, page_size = _page_queryset(queryset, params)
+    return _split_page(list(page), field, page_size)
+
+
+async def apaginate_books(queryset, params):
+    """Async version of paginate_books."""
+    page, field, page_size = _page_queryset(queryset, params)
+    return _split_page([row async for row in page], field, page_size)
@@ -0,0 +1,94 @@
+"""Borrow and return operations as single conditional UPDATE statements.
+
+Availability is checked and changed by the database in one statement
+(``... SET available_copies = available_copies - 1 WHERE pk = ? AND
+available_copies > 0``), so concurrent borrowers can never overbook a title
+and only the touched columns are written. Duplicate open loans are rejected by
+the ``unique_open_loan_per_user_book`` constraint rather than a pre-query.
+Copies reserved for the hold queue (library.holds) are lent to their holder
+and handed on at return without ever reaching the shelf.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Least, Now
+from django.utils import timezone
+
+from . import stats
+from .cache import schedule_catalog_version_bump
+from .events import schedule_availability_event
+from .models import Book, BorrowedBook
+
+LOAN_PERIOD = timedelta(days=14)
+
+
+class CirculationError(Exception):
+    """Base class for borrow/return requests that cannot be honoured."""
+
+
+class BookUnavailable(CirculationError):
+    pass
+
+
+class AlreadyBorrowed(CirculationError):
+    pass
+
+
+class AlreadyReturned(CirculationError):
+    pass
+
+
+def shift_available_copies(book_pks, change):
+    """Moves available_copies of the books by a change in their total_copies, kept between 0 and
+    the new total, so copies on loan stay on loan. Callers keep library.stats in step."""
+    return Book.objects.filter(pk__in=book_pks).update(
+        available_copies=Greatest(Least(F('available_copies') + change, F('total_copies')), 0))
+
+
+def borrow_book(user, book_pk):
+    """Lends one copy of the book to user and returns the new BorrowedBook.
+
+    Raises Book.DoesNotExist, BookUnavailable or AlreadyBorrowed.
+    """
+    from . import holds
+
+    with transaction.atomic():
+        # A copy reserved for this reader's hold is already off the shelf.
+        claimed = holds.claim_ready_hold(user, book_pk)
+        if not claimed:
+            claimed = Book.objects.filter(pk=book_pk, available_copies__gt=0)\
+                                  .update(available_copies=F('available_copies') - 1, updated_at=Now())
+            if not claimed:
+                if not Book.objects.filter(pk=book_pk).exists():
+                    raise Book.DoesNotExist(f'Book {book_pk} does not exist.')
+                raise BookUnavailable('Book is not available.')
+            stats.adjust(available_copies=-1)  # The new loan itself is counted by a post_save receiver.
+            schedule_catalog_version_bump()
+            schedule_availability_event([book_pk])
+        try:
+            record = BorrowedBook.objects.create(
+                user=user, book_id=book_pk, due_date=timezone.now() + LOAN_PERIOD,
+            )
+        except IntegrityError:
+            # Leaving the atomic block with an exception also gives back the claimed copy or hold.
+            raise AlreadyBorrowed('You have already borrowed this book.')
+    return record
+
+
+def return_book(record):
+    """Closes an open loan and hands its copy to the next holder, else puts it back on the shelf.
+
+    Raises AlreadyReturned if another request closed the loan first.
+    """
+    from . import holds
+
+    with transaction.atomic():
+        now = timezone.now()
+        closed = BorrowedBook.objects.filter(pk=record.pk, return_date__isnull=True).update(return_date=now)
+        if not closed:
+            raise AlreadyReturned('Book already returned.')
+        restored = holds.release_copy(record.book_id, now)
+        stats.adjust(borrowed_books=-1, available_copies=restored)
+    record.return_date = now
+    return record
@@ -0,0 +1,23 @@
+"""Per-connection database tuning (see DATABASES in settings)."""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Applies LIBRARY_SQLITE_PRAGMAS to each new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.LIBRARY_SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+@receiver(connection_created)
+def install_query_observer(sender, connection, **kwargs):
+    """Lets library.metrics count and time every statement run on this connection."""
+    if metrics.query_observer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.query_observer)
@@ -0,0 +1,247 @@
+"""Live availability updates for the book pages, pushed as Server-Sent Events.
+
+When a transaction that changed a book's available copies commits,
+schedule_availability_event() reads the new counts and publishes compact
+``{"bookId", "availableCopies"}`` deltas. The per-process Broker fans them out
+to every open /api/events/availability/ stream. A stream is one coroutine
+waiting on an asyncio queue in the ASGI event loop, so an open tab costs an
+idle connection instead of a catalog download every few seconds.
+
+LIBRARY_EVENTS_BACKEND (settings) selects how events reach the streams:
+'local' publishes straight to the streams of the committing process, and
+skips the read entirely while nobody is listening; 'db' appends to the
+AvailabilityChange table, which a thread in every process with open streams
+tails. Events carry ids, so a reconnecting EventSource (Last-Event-ID)
+receives what it missed, or a 'reset' event telling it to reload its books
+when that is no longer known.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import tasks
+from .models import AvailabilityChange, Book
+
+HISTORY_SIZE = 1000  # Local-backend events kept for reconnecting clients.
+QUEUE_SIZE = 256     # Events a slow stream may fall behind before it is sent a reset.
+CHUNK_SIZE = 500
+RETRY_MS = 3000
+
+
+class Subscriber:
+    __slots__ = ('loop', 'queue', 'overflowed')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, item):
+        """Runs in the subscriber's event loop."""
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Broker:
+    """In-process fan-out. publish() may be called from any thread; streams read their Subscriber's queue."""
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]  # Local event ids are only meaningful within this process.
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._seq = 0
+        self._poller = None
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def add(self, subscriber):
+        """Registers a stream; with the db backend, makes sure this process is tailing the change log."""
+        # Read before registering, so a replay the stream runs next overlaps the poller rather than missing rows.
+        last_pk = latest_change_pk() if settings.LIBRARY_EVENTS_BACKEND == 'db' else None
+        with self._lock:
+            self._subscribers.add(subscriber)
+            start_poller = last_pk is not None and self._poller is None
+            if start_poller:
+                self._poller = threading.Thread(target=self._poll, args=(last_pk,),
+                                                name='availability-events', daemon=True)
+        if start_poller:
+            self._poller.start()
+
+    def remove(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, changes, seq=None):
+        """Sends changes to every stream; seq is the change-log id with the db backend."""
+        with self._lock:
+            if seq is None:
+                self._seq += 1
+                seq = self._seq
+                self._history.append((seq, changes))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, (seq, changes))
+            except RuntimeError:  # Its event loop has shut down.
+                self.remove(subscriber)
+
+    def history_since(self, seq):
+        """Local events after seq, or None if some of them are no longer kept."""
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            if not self._history or seq < self._history[0][0] - 1:
+                return None
+            return [item for item in self._history if item[0] > seq]
+
+    def _poll(self, last_pk):
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller = None
+                        return
+                rows = changes_after(last_pk)
+                if rows:
+                    last_pk = rows[-1][0]
+                    self.publish([change for _, change in rows], seq=last_pk)
+                if len(rows) < CHUNK_SIZE:
+                    time.sleep(settings.LIBRARY_EVENTS_POLL_INTERVAL)
+        except Exception as e:
+            print(f"Availability Event Poller Error: {e}")
+            with self._lock:
+                self._poller = None
+        finally:
+            connection.close()
+
+
+broker = Broker()
+
+
+def latest_change_pk():
+    return AvailabilityChange.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def changes_after(last_pk):
+    """[(pk, change)] of the change log after last_pk, CHUNK_SIZE at most."""
+    rows = AvailabilityChange.objects.filter(pk__gt=last_pk).order_by('pk')\
+                                     .values_list('pk', 'book_id_json', 'available_copies')[:CHUNK_SIZE]
+    return [(pk, {'bookId': book_id, 'availableCopies': copies}) for pk, book_id, copies in rows]
+
+
+def publish_availability(book_pks, using=None):
+    """Publishes the current available copies of the books; returns the number of changes sent."""
+    to_log = settings.LIBRARY_EVENTS_BACKEND == 'db'
+    if not to_log and not broker.subscriber_count():
+        return 0  # Nobody is listening in this process.
+    try:
+        rows = list(Book.objects.using(using).filter(pk__in=book_pks).values_list('book_id_json', 'available_copies'))
+        if to_log:
+            AvailabilityChange.objects.using(using).bulk_create(
+                [AvailabilityChange(book_id_json=book_id, available_copies=copies) for book_id, copies in rows])
+        elif rows:
+            broker.publish([{'bookId': book_id, 'availableCopies': copies} for book_id, copies in rows])
+        return len(rows)
+    except Exception as e:
+        # The change itself is committed; clients catch up on their next reset or page load.
+        print(f"Availability Event Error: {e}")
+        return 0
+
+
+def schedule_availability_event(book_pks, using=None):
+    """Publishes the books' new available copies once the current transaction commits."""
+    book_pks = list(book_pks)
+    transaction.on_commit(lambda: publish_availability(book_pks, using=using), using=using)
+
+
+def event_id(seq):
+    return f'db-{seq}' if settings.LIBRARY_EVENTS_BACKEND == 'db' else f'{broker.epoch}-{seq}'
+
+
+def replay_since(last_event_id):
+    """[(seq, changes)] a client that saw last_event_id missed, or None if that is unknown."""
+    epoch, _, seq = (last_event_id or '').partition('-')
+    if not seq.isdigit():
+        return None
+    seq = int(seq)
+    if settings.LIBRARY_EVENTS_BACKEND != 'db':
+        return broker.history_since(seq) if epoch == broker.epoch else None
+    if epoch != 'db':
+        return None
+    if not AvailabilityChange.objects.filter(pk=seq).exists():
+        return None  # Pruned: older than LIBRARY_EVENTS_RETENTION.
+    rows = changes_after(seq)
+    if len(rows) == CHUNK_SIZE:
+        return None  # Too far behind: a reload is cheaper than the replay.
+    return [(pk, [change]) for pk, change in rows]
+
+
+def format_event(seq, changes):
+    """One SSE message; several changes to a book collapse to the latest."""
+    latest = {}
+    for change in changes:
+        latest[change['bookId']] = change['availableCopies']
+    data = json.dumps([{'bookId': book_id, 'availableCopies': copies} for book_id, copies in latest.items()],
+                      separators=(',', ':'))
+    return f'id: {event_id(seq)}\nevent: availability\ndata: {data}\n\n'
+
+
+RESET_EVENT = 'event: reset\ndata: {}\n\n'
+
+
+async def stream(last_event_id=None):
+    """Async iterator of SSE messages for one client, until it disconnects."""
+    subscriber = Subscriber(asyncio.get_running_loop())
+    await sync_to_async(broker.add)(subscriber)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        last_seq = -1
+        if last_event_id:
+            missed = await sync_to_async(replay_since)(last_event_id)
+            if missed is None:
+                yield RESET_EVENT
+            elif missed:
+                last_seq = missed[-1][0]
+                yield format_event(last_seq, [change for _, changes in missed for change in changes])
+        while True:
+            try:
+                item = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.LIBRARY_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            items = [item]
+            while not subscriber.queue.empty():  # Coalesce a burst into one message.
+                items.append(subscriber.queue.get_nowait())
+            if subscriber.overflowed:
+                subscriber.overflowed = False
+                last_seq = items[-1][0]
+                yield RESET_EVENT
+                continue
+            items = [(seq, changes) for seq, changes in items if seq > last_seq]  # Already sent by the replay.
+            if items:
+                last_seq = items[-1][0]
+                yield format_event(last_seq, [change for _, changes in items for change in changes])
+    finally:
+        broker.remove(subscriber)
+
+
+@tasks.task('prune_availability_changes', every=timedelta(hours=1))
+def prune_availability_changes():
+    """Deletes change-log rows older than LIBRARY_EVENTS_RETENTION."""
+    deleted, _ = AvailabilityChange.objects.filter(
+        created_at__lt=timezone.now() - settings.LIBRARY_EVENTS_RETENTION).delete()
+    return deleted
@@ -0,0 +1,125 @@
+"""Incremental, constant-memory exports of the catalog and loan tables.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` and rendered one line
+at a time, so the same generators can feed a StreamingHttpResponse or a file.
+"""
+import csv
+import json
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Book, BorrowedBook, BorrowedBookArchive
+from .serializers import category_names_by_book
+
+EXPORT_CHUNK_SIZE = 2000
+
+BOOK_COLUMNS = ['bookId', 'bookName', 'author', 'categories', 'description', 'publisher', 'publicationDate',
+                'language', 'pages', 'isbn', 'coverImage', 'availableCopies', 'totalCopies', 'updatedAt', 'django_pk']
+LOAN_COLUMNS = ['borrowedPk', 'username', 'bookId', 'bookName', 'borrowDate', 'dueDate', 'returnDate']
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+EXPORT_DATASETS = ('books', 'loans')
+
+
+def parse_updated_since(value):
+    """Parses an ISO date or datetime (naive values use the current time zone).
+
+    Returns None for an empty value and raises ValueError for anything unparseable.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid updated_since "{value}"; use YYYY-MM-DD or an ISO datetime.')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _chunked(iterator, size):
+    chunk = []
+    for item in iterator:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def book_rows(updated_since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields one dict per book, ordered by pk, with categories fetched once per chunk."""
+    books = Book.objects.order_by('pk')
+    if updated_since:
+        books = books.filter(updated_at__gte=updated_since)
+    books = books.values('pk', 'book_id_json', 'book_name', 'author', 'description', 'publisher',
+                         'publication_date', 'language', 'pages', 'isbn', 'cover_image_file',
+                         'available_copies', 'total_copies', 'updated_at')
+    for chunk in _chunked(books.iterator(chunk_size=chunk_size), chunk_size):
+        categories = category_names_by_book([row['pk'] for row in chunk])
+        for row in chunk:
+            yield {
+                'bookId': row['book_id_json'], 'bookName': row['book_name'], 'author': row['author'],
+                'categories': categories.get(row['pk'], []), 'description': row['description'],
+                'publisher': row['publisher'], 'publicationDate': _isoformat(row['publication_date']),
+                'language': row['language'], 'pages': row['pages'], 'isbn': row['isbn'],
+                'coverImage': row['cover_image_file'] or None, 'availableCopies': row['available_copies'],
+                'totalCopies': row['total_copies'], 'updatedAt': _isoformat(row['updated_at']),
+                'django_pk': row['pk'],
+            }
+
+
+def loan_rows(updated_since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields one dict per loan, BorrowedBook then the archive, each by pk;
+    with updated_since, loans borrowed or returned since then."""
+    for loans in (BorrowedBook.objects.all(), BorrowedBookArchive.objects.all()):
+        loans = loans.order_by('pk')
+        if updated_since:
+            loans = loans.filter(Q(borrow_date__gte=updated_since) | Q(return_date__gte=updated_since))
+        loans = loans.values('pk', 'user__username', 'book__book_id_json', 'book__book_name',
+                             'borrow_date', 'due_date', 'return_date')
+        for row in loans.iterator(chunk_size=chunk_size):
+            yield {
+                'borrowedPk': row['pk'], 'username': row['user__username'], 'bookId': row['book__book_id_json'],
+                'bookName': row['book__book_name'], 'borrowDate': _isoformat(row['borrow_date']),
+                'dueDate': _isoformat(row['due_date']), 'returnDate': _isoformat(row['return_date']),
+            }
+
+
+class _Echo:
+    """File-like object whose write() hands back the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def render_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def render_csv(rows, columns):
+    writer = csv.DictWriter(_Echo(), fieldnames=columns)
+    yield writer.writeheader()
+    for row in rows:
+        if isinstance(row.get('categories'), list):
+            row['categories'] = '|'.join(row['categories'])
+        yield writer.writerow(row)
+
+
+def export_lines(dataset, fmt, updated_since=None):
+    """Returns a generator of text lines for the requested dataset and format."""
+    rows = book_rows(updated_since) if dataset == 'books' else loan_rows(updated_since)
+    if fmt == 'csv':
+        return render_csv(rows, BOOK_COLUMNS if dataset == 'books' else LOAN_COLUMNS)
+    return render_jsonl(rows)
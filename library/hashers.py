@@ -0,0 +1,21 @@
+"""Password hashers with parameters tuned for login latency (see PASSWORD_HASHERS in settings).
+
+Each keeps the algorithm name of the Django hasher it extends, so existing
+hashes still verify. When a hash was made by a different hasher or with other
+parameters than the preferred (first) one, Django rehashes the password on the
+next successful login. `python manage.py bench_hashers` measures the cost of
+each configuration on the current machine.
+"""
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id at the OWASP baseline (19 MiB, 2 passes, 1 lane) instead of Django's 100 MiB x 8 lanes."""
+    time_cost = 2
+    memory_cost = 19 * 1024
+    parallelism = 1
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 at OWASP's 600,000 iterations instead of Django's 1,000,000."""
+    iterations = 600_000
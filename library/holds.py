@@ -0,0 +1,176 @@
+"""Hold queue: readers wait in line for a book with no copy on the shelf.
+
+A returned copy goes straight to the oldest waiting hold, inside the return's
+transaction (see circulation.return_book), instead of back on the shelf: the
+hold becomes READY, the copy stays reserved (available_copies is not
+incremented) and the reader is emailed. Borrowing the book then lends the
+reserved copy. A ready hold not picked up within LIBRARY_HOLD_PICKUP_DAYS is
+expired by the hourly expire_holds task, which passes its copy on to the next
+holder, or to the shelf when nobody is waiting.
+
+The next holder is found with one seek on the partial (book, created_at)
+index of waiting holds, so a return costs the same with one or a thousand
+readers in line. Everything that places a hold or frees a copy locks the
+book row first (SELECT ... FOR UPDATE; SQLite's IMMEDIATE transactions
+serialize writers anyway), so a hold placed while a copy is being returned
+either sees the copy on the shelf or is in line for it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import stats, tasks
+from .cache import schedule_catalog_version_bump
+from .circulation import AlreadyBorrowed, CirculationError
+from .events import schedule_availability_event
+from .models import Book, BorrowedBook, Hold
+
+CHUNK_SIZE = 500
+
+
+class HoldNotNeeded(CirculationError):
+    pass
+
+
+class AlreadyOnHold(CirculationError):
+    pass
+
+
+class HoldNotActive(CirculationError):
+    pass
+
+
+def _lock_book(book_pk):
+    """Locks the book row for the rest of the transaction; returns its available copies."""
+    available = Book.objects.select_for_update().filter(pk=book_pk).values_list('available_copies', flat=True).first()
+    if available is None:
+        raise Book.DoesNotExist(f'Book {book_pk} does not exist.')
+    return available
+
+
+def _waiting(book_pk):
+    return Hold.objects.filter(book_id=book_pk, status=Hold.WAITING)
+
+
+def queue_position(hold):
+    """1 for the next holder in line."""
+    ahead = _waiting(hold.book_id).filter(Q(created_at__lt=hold.created_at) |
+                                          Q(created_at=hold.created_at, pk__lt=hold.pk))
+    return ahead.count() + 1
+
+
+def place_hold(user, book_pk):
+    """Puts user in the queue for the book and returns the new Hold.
+
+    Raises Book.DoesNotExist, HoldNotNeeded (a copy is on the shelf),
+    AlreadyBorrowed or AlreadyOnHold.
+    """
+    with transaction.atomic():
+        if _lock_book(book_pk) > 0:
+            raise HoldNotNeeded('A copy is available; borrow it instead.')
+        if BorrowedBook.objects.filter(user=user, book_id=book_pk, return_date__isnull=True).exists():
+            raise AlreadyBorrowed('You have already borrowed this book.')
+        try:
+            with transaction.atomic():
+                return Hold.objects.create(user=user, book_id=book_pk)
+        except IntegrityError:
+            raise AlreadyOnHold('You are already in the queue for this book.')
+
+
+def hand_over_copy(book_pk, now):
+    """Reserves a copy for the oldest waiting hold and returns it, or None if nobody is waiting.
+
+    The caller must hold the book lock; the copy is not on the shelf either way.
+    """
+    while True:
+        hold = _waiting(book_pk).order_by('created_at', 'pk').first()
+        if hold is None:
+            return None
+        expires_at = now + timedelta(days=settings.LIBRARY_HOLD_PICKUP_DAYS)
+        if Hold.objects.filter(pk=hold.pk, status=Hold.WAITING)\
+                       .update(status=Hold.READY, ready_at=now, expires_at=expires_at):
+            tasks.enqueue('send_hold_ready_notice', {'hold_pk': hold.pk})
+            return hold
+        # Cancelled since we read it: the next one in line gets the copy.
+
+
+def release_copy(book_pk, now):
+    """Gives a freed copy to the next holder, else puts it back on the shelf.
+
+    Returns the number of copies put back on the shelf (0 or 1); the caller
+    adds it to the available_copies statistic.
+    """
+    _lock_book(book_pk)
+    if hand_over_copy(book_pk, now) is not None:
+        return 0
+    restored = Book.objects.filter(pk=book_pk, available_copies__lt=F('total_copies'))\
+                           .update(available_copies=F('available_copies') + 1, updated_at=Now())
+    schedule_catalog_version_bump()
+    schedule_availability_event([book_pk])
+    return restored
+
+
+def claim_ready_hold(user, book_pk):
+    """Marks user's ready hold on the book fulfilled; True if there was one to lend the copy of."""
+    now = timezone.now()
+    return bool(Hold.objects.filter(user=user, book_id=book_pk, status=Hold.READY, expires_at__gt=now)
+                            .update(status=Hold.FULFILLED, closed_at=now))
+
+
+def cancel_hold(hold):
+    """Takes a waiting or ready hold out of the queue; a reserved copy goes to the next holder.
+
+    Raises HoldNotActive if the hold was already fulfilled, cancelled or expired.
+    """
+    with transaction.atomic():
+        _lock_book(hold.book_id)
+        now = timezone.now()
+        was_ready = Hold.objects.filter(pk=hold.pk, status=Hold.READY).update(status=Hold.CANCELLED, closed_at=now)
+        if not was_ready and not Hold.objects.filter(pk=hold.pk, status=Hold.WAITING)\
+                                             .update(status=Hold.CANCELLED, closed_at=now):
+            raise HoldNotActive('This hold is no longer active.')
+        if was_ready:
+            stats.adjust(available_copies=release_copy(hold.book_id, now))
+    hold.status, hold.closed_at = Hold.CANCELLED, now
+    return hold
+
+
+@tasks.task('expire_holds', every=timedelta(hours=1))
+def expire_holds():
+    """Expires ready holds past their pickup deadline, CHUNK_SIZE at a time, passing each copy on."""
+    now = timezone.now()
+    expired = 0
+    while True:
+        rows = list(Hold.objects.filter(status=Hold.READY, expires_at__lte=now)
+                                .order_by('expires_at').values_list('pk', 'book_id')[:CHUNK_SIZE])
+        for hold_pk, book_pk in rows:
+            with transaction.atomic():
+                _lock_book(book_pk)
+                # Skipped if the reader borrowed or cancelled it since the chunk was read.
+                if Hold.objects.filter(pk=hold_pk, status=Hold.READY).update(status=Hold.EXPIRED, closed_at=now):
+                    stats.adjust(available_copies=release_copy(book_pk, now))
+                    expired += 1
+        if len(rows) < CHUNK_SIZE:
+            return expired
+
+
+@tasks.task('send_hold_ready_notice')
+def send_hold_ready_notice(hold_pk):
+    """Tells the reader a copy is waiting for them (skipped if the hold has moved on)."""
+    hold = Hold.objects.filter(pk=hold_pk, status=Hold.READY).exclude(user__email='')\
+                       .select_related('user', 'book').first()
+    if hold is None:
+        return 0
+    EmailMessage(
+        subject=f'Ready for pickup: "{hold.book.book_name}"',
+        body=(f'Hello {hold.user.username},\n\n'
+              f'A copy of "{hold.book.book_name}" is reserved for you until {hold.expires_at:%b %d, %Y %H:%M}. '
+              f'Borrow it before then or it goes to the next reader in line.\n'),
+        to=[hold.user.email],
+    ).send()
+    return 1
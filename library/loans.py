@@ -0,0 +1,182 @@
+"""Loan listings: open loans for the admin circulation API, and loan history.
+
+Pages are keyset-paginated over (due_date, pk) on the partial index of open
+loans by due date, so the hundredth page costs the same as the first. Only
+the columns a client asks for (``fields``) are selected, and the user and
+book tables are joined only when one of their columns is wanted. Dates are
+returned as ISO 8601 and formatted by the client.
+
+Loan history (list_loan_history) pages through returned loans newest first,
+across BorrowedBook and BorrowedBookArchive (see library.archive): each page
+reads at most page_size + 1 rows from both tables by (return_date, pk) on
+their per-user and per-book return-date indexes, and merges them.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .catalog import MAX_PK, InvalidCatalogQuery, decode_cursor, encode_cursor
+from .models import BorrowedBook, BorrowedBookArchive, User
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_DUE_WITHIN_DAYS = 3650
+
+# API name -> column of the .values() query.
+LOAN_FIELDS = {
+    'borrowedPk': 'pk',
+    'userPk': 'user_id',
+    'username': 'user__username',
+    'bookPk': 'book_id',
+    'bookId': 'book__book_id_json',
+    'bookTitle': 'book__book_name',
+    'borrowDate': 'borrow_date',
+    'dueDate': 'due_date',
+    'fineAmount': 'fine_amount',
+}
+DEFAULT_LOAN_FIELDS = ('borrowedPk', 'username', 'bookPk', 'bookTitle', 'borrowDate', 'dueDate')
+HISTORY_FIELDS = ('borrowedPk', 'userPk', 'bookPk', 'bookId', 'bookTitle', 'borrowDate', 'dueDate', 'returnDate',
+                  'fineAmount')
+HISTORY_COLUMNS = {**LOAN_FIELDS, 'returnDate': 'return_date'}
+
+
+class InvalidLoanQuery(ValueError):
+    """Raised when loan listing parameters cannot be interpreted."""
+
+
+def _flag(params, name):
+    return (params.get(name) or '').lower() in ('1', 'true', 'yes')
+
+
+def _positive_int(params, name, maximum=MAX_PK):
+    try:
+        value = int(params[name])
+    except ValueError:
+        raise InvalidLoanQuery(f'{name} must be an integer.')
+    if value < 0:
+        raise InvalidLoanQuery(f'{name} must not be negative.')
+    if value > maximum:
+        raise InvalidLoanQuery(f'{name} must be at most {maximum}.')
+    return value
+
+
+def filter_open_loans(params, now):
+    """Open loans matching the overdue, due_within, user (username prefix) and book filters."""
+    loans = BorrowedBook.objects.filter(return_date__isnull=True)
+    if _flag(params, 'overdue'):
+        loans = loans.filter(due_date__lt=now)
+    if params.get('due_within'):
+        loans = loans.filter(due_date__gte=now, due_date__lt=now + timedelta(days=_positive_int(params, 'due_within', MAX_DUE_WITHIN_DAYS)))
+    prefix = (params.get('user') or '').strip()
+    if prefix:
+        # A range rather than LIKE, so the username index is used (the prefix is case-sensitive).
+        users = User.objects.filter(username__gte=prefix, username__lt=prefix + '\U0010ffff').values('pk')
+        loans = loans.filter(user__in=users)
+    if params.get('book'):
+        loans = loans.filter(book_id=_positive_int(params, 'book'))
+    return loans
+
+
+def _columns(params):
+    names = [name.strip() for name in (params.get('fields') or '').split(',') if name.strip()] or DEFAULT_LOAN_FIELDS
+    unknown = [name for name in names if name not in LOAN_FIELDS]
+    if unknown:
+        raise InvalidLoanQuery(f'Unknown fields: {", ".join(unknown)}.')
+    return names
+
+
+def _page_size(params):
+    try:
+        page_size = int(params.get('page_size') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise InvalidLoanQuery('page_size must be an integer.')
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def _page_queryset(loans, params, names):
+    page_size = _page_size(params)
+    cursor = params.get('cursor')
+    if cursor:
+        try:
+            due_date, pk = decode_cursor(cursor, 'due_date')
+        except InvalidCatalogQuery as e:
+            raise InvalidLoanQuery(str(e))
+        # The leading range term keeps the scan on the due-date index.
+        loans = loans.filter(Q(due_date__gte=due_date) & (Q(due_date__gt=due_date) | Q(pk__gt=pk)))
+
+    columns = {LOAN_FIELDS[name] for name in names} | {'pk', 'due_date'}  # The cursor needs both.
+    # One extra row tells whether there is a next page.
+    return loans.order_by('due_date', 'pk').values(*columns)[:page_size + 1], page_size
+
+
+def _split_page(rows, names, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]['due_date'], rows[-1]['pk'])
+    return [{name: row[LOAN_FIELDS[name]] for name in names} for row in rows], next_cursor
+
+
+def _totals(now):
+    """Aggregates for the optional totals: matching loans, and how many of them are overdue."""
+    return {'count': Count('pk'), 'overdue': Count('pk', filter=Q(due_date__lt=now))}
+
+
+def list_open_loans(params):
+    """Returns (loans, next_cursor, totals or None) for one page; raises InvalidLoanQuery."""
+    now = timezone.now()
+    names = _columns(params)
+    loans = filter_open_loans(params, now)
+    page, page_size = _page_queryset(loans, params, names)
+    rows, next_cursor = _split_page(list(page), names, page_size)
+    return rows, next_cursor, loans.aggregate(**_totals(now)) if _flag(params, 'totals') else None
+
+
+async def alist_open_loans(params):
+    """Async version of list_open_loans."""
+    now = timezone.now()
+    names = _columns(params)
+    loans = filter_open_loans(params, now)
+    page, page_size = _page_queryset(loans, params, names)
+    rows, next_cursor = _split_page([row async for row in page], names, page_size)
+    totals = await loans.aaggregate(**_totals(now)) if _flag(params, 'totals') else None
+    return rows, next_cursor, totals
+
+
+def list_loan_history(params, user_id=None):
+    """Returns (loans, next_cursor) for one page of returned loans, newest first; raises InvalidLoanQuery.
+
+    user_id limits the history to one reader (the API passes the requesting
+    reader's own pk); the book filter takes a book pk.
+    """
+    page_size = _page_size(params)
+    book_id = _positive_int(params, 'book') if params.get('book') else None
+    after = None
+    if params.get('cursor'):
+        try:
+            after = decode_cursor(params['cursor'], 'return_date')
+        except InvalidCatalogQuery as e:
+            raise InvalidLoanQuery(str(e))
+
+    columns = [HISTORY_COLUMNS[name] for name in HISTORY_FIELDS]
+    rows = []
+    for archived, loans in ((False, BorrowedBook.objects.filter(return_date__isnull=False)),
+                            (True, BorrowedBookArchive.objects.all())):
+        if user_id is not None:
+            loans = loans.filter(user_id=user_id)
+        if book_id is not None:
+            loans = loans.filter(book_id=book_id)
+        if after:
+            return_date, pk = after
+            loans = loans.filter(Q(return_date__lte=return_date) & (Q(return_date__lt=return_date) | Q(pk__lt=pk)))
+        rows += [{**row, 'archived': archived}
+                 for row in loans.order_by('-return_date', '-pk').values(*columns)[:page_size + 1]]
+    rows.sort(key=lambda row: (row['return_date'], row['pk']), reverse=True)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]['return_date'], rows[-1]['pk'])
+    return [{**{name: row[HISTORY_COLUMNS[name]] for name in HISTORY_FIELDS}, 'archived': row['archived']}
+            for row in rows], next_cursor
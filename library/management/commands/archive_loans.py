@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import archive
+from library.models import BorrowedBook, BorrowedBookArchive
+
+
+class Command(BaseCommand):
+    help = ("Moves returned loans older than --days (LIBRARY_LOAN_ARCHIVE_AFTER_DAYS by default) from "
+            "BorrowedBook to BorrowedBookArchive in chunks, one short transaction each. Also runs daily "
+            "as the archive_loans task.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive loans returned more than this many days ago.')
+        parser.add_argument('--chunk-size', type=int, default=archive.CHUNK_SIZE, help='Loans moved per transaction.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is not None and days < 0:
+            raise CommandError('--days must not be negative.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        started = time.perf_counter()
+        moved = archive.archive_loans(older_than=None if days is None else timedelta(days=days),
+                                      chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} loans in {elapsed:.1f}s; {BorrowedBook.objects.count()} loans remain, '
+            f'{BorrowedBookArchive.objects.count()} archived.'))
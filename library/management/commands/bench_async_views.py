@@ -0,0 +1,145 @@
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from library.models import Book, BorrowedBook, User
+
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = ("Compares requests/s and latency of the async API views under Django's WSGI and ASGI "
+            "handlers with many concurrent in-process clients (threads for WSGI, tasks for ASGI). "
+            "Runs against a throwaway test database, never the project database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=4000, help='Requests per endpoint and handler.')
+        parser.add_argument('--books', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                targets = self._seed(options['books'])
+                wsgi, asgi = get_wsgi_application(), get_asgi_application()
+                for label, (path, query, cookie) in targets.items():
+                    for handler in ('wsgi', 'asgi'):
+                        connections.close_all()
+                        if handler == 'wsgi':
+                            result = self._run_wsgi(wsgi, path, query, cookie, options)
+                        else:
+                            result = asyncio.run(self._run_asgi(asgi, path, query, cookie, options))
+                        self._report(label, handler, *result)
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _seed(self, count):
+        Book.objects.bulk_create([
+            Book(book_id_json=f'ASYNC{i}', book_name=f'Async book {i}', author=f'Author {i % 40}',
+                 description='', total_copies=3, available_copies=3)
+            for i in range(count)
+        ])
+        admin = User.objects.create_user('bench-admin', password='unused-password', is_admin=True)
+        readers = User.objects.bulk_create([User(username=f'bench-reader{i}') for i in range(50)])
+        books = list(Book.objects.order_by('pk')[:len(readers)])
+        BorrowedBook.objects.bulk_create([
+            BorrowedBook(user=reader, book=book, due_date=book.updated_at) for reader, book in zip(readers, books)
+        ])
+        client = Client()
+        client.force_login(admin)
+        cookie = f'sessionid={client.cookies["sessionid"].value}'
+        return {
+            # The catalog version is not bumped between requests, so this is the cached path.
+            'books api (cached)': (reverse('library:books_api'), 'page_size=24', ''),
+            'book details': (reverse('library:book_detail', args=['ASYNC1']), '', ''),
+            'borrowed books': (reverse('library:all_borrowed_books_api'), '', cookie),
+            'stats api': (reverse('library:stats_api'), '', cookie),
+        }
+
+    def _run_wsgi(self, application, path, query, cookie, options):
+        remaining = iter(range(options['requests']))
+        lock, latencies, failures = threading.Lock(), [], []
+
+        def client():
+            samples, statuses = [], []
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                environ = {
+                    'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                    'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                    'HTTP_HOST': HOST, 'HTTP_COOKIE': cookie, 'wsgi.input': io.BytesIO(),
+                    'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+                }
+                started = time.perf_counter()
+                b''.join(application(environ, lambda status, headers: statuses.append(status)))
+                samples.append(time.perf_counter() - started)
+            connection.close()
+            with lock:
+                latencies.extend(samples)
+                failures.extend(status for status in statuses if not status.startswith('200'))
+
+        threads = [threading.Thread(target=client) for _ in range(options['clients'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, latencies, len(failures)
+
+    async def _run_asgi(self, application, path, query, cookie, options):
+        headers = [(b'host', HOST.encode())] + ([(b'cookie', cookie.encode())] if cookie else [])
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': headers, 'server': (HOST, 80), 'client': ('127.0.0.1', 50000),
+        }
+        remaining = iter(range(options['requests']))
+        latencies, failures = [], []
+
+        async def client():
+            while next(remaining, None) is not None:
+                disconnected = asyncio.Event()
+                messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+                async def receive():
+                    if messages:
+                        return messages.pop()
+                    await disconnected.wait()  # Django listens for a disconnect while the view runs.
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start' and message['status'] != 200:
+                        failures.append(message['status'])
+
+                started = time.perf_counter()
+                await application(dict(scope), receive, send)
+                latencies.append(time.perf_counter() - started)
+                disconnected.set()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        return time.perf_counter() - started, latencies, len(failures)
+
+    def _report(self, label, handler, elapsed, latencies, failures):
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+        self.stdout.write(f'{label:<20} {handler}: {len(latencies) / elapsed:8.1f} req/s   '
+                          f'p50 {p50:8.2f} ms   p99 {p99:8.2f} ms' + (f'   {failures} non-200' if failures else ''))
@@ -0,0 +1,110 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, connections
+from django.test.utils import override_settings
+
+from library import circulation
+from library.models import Book, BorrowedBook, User
+
+# SQLite's out-of-the-box settings, for --untuned. journal_mode is persistent in the
+# file, so it has to be switched back explicitly.
+SQLITE_DEFAULTS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0}
+
+
+class Command(BaseCommand):
+    help = ("Load-tests borrow/return throughput on the active database profile (LIBRARY_DB_PROFILE). "
+            "Runs against a throwaway test database, never the project database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent borrowing threads.')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each run.')
+        parser.add_argument('--books', type=int, default=50)
+        parser.add_argument('--copies', type=int, default=3, help='Copies per book; keep it low to force contention.')
+        parser.add_argument('--untuned', action='store_true',
+                            help='On SQLite, also run without LIBRARY_SQLITE_PRAGMAS for comparison.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                # The default SQLite test database lives in memory; use a file so WAL applies.
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                users, book_pks = self._seed(options)
+                runs = [('tuned', settings.LIBRARY_SQLITE_PRAGMAS)]
+                if options['untuned'] and connection.vendor == 'sqlite':
+                    runs.append(('untuned', SQLITE_DEFAULTS))
+                for label, pragmas in runs:
+                    connections.close_all()  # New connections pick up the pragmas under test.
+                    with override_settings(LIBRARY_SQLITE_PRAGMAS=pragmas):
+                        self._reset(book_pks, options['copies'])
+                        self._report(label, self._run(users, book_pks, options['seconds']), options['seconds'])
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _seed(self, options):
+        users = [User.objects.create_user(f'bench{i}', password='unused-password') for i in range(options['workers'])]
+        Book.objects.bulk_create([
+            Book(book_id_json=f'BENCH{i}', book_name=f'Bench book {i}', author='Bench', description='',
+                 total_copies=options['copies'], available_copies=options['copies'])
+            for i in range(options['books'])
+        ])
+        return users, list(Book.objects.values_list('pk', flat=True))
+
+    def _reset(self, book_pks, copies):
+        BorrowedBook.objects.all().delete()
+        Book.objects.filter(pk__in=book_pks).update(available_copies=copies)
+
+    def _run(self, users, book_pks, seconds):
+        deadline = time.perf_counter() + seconds
+        results = {'latencies': [], 'outcomes': Counter()}
+        lock = threading.Lock()
+
+        def worker(user, seed):
+            rng = random.Random(seed)
+            latencies, outcomes = [], Counter()
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        record = circulation.borrow_book(user, rng.choice(book_pks))
+                        circulation.return_book(record)
+                        outcomes['ok'] += 1
+                    except circulation.CirculationError as e:
+                        outcomes[type(e).__name__] += 1
+                    except DatabaseError as e:
+                        outcomes[f'{type(e).__name__}: {e}'] += 1
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                results['latencies'] += latencies
+                results['outcomes'] += outcomes
+
+        threads = [threading.Thread(target=worker, args=(user, i)) for i, user in enumerate(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _report(self, label, results, seconds):
+        latencies = sorted(results['latencies'])
+        outcomes = results['outcomes']
+        self.stdout.write(f'{connection.vendor} ({label}): {outcomes["ok"] / seconds:8.1f} borrow+return/s')
+        if latencies:
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
+            self.stdout.write(f'    latency p50 {p50:7.2f} ms   p95 {p95:7.2f} ms')
+        for outcome, count in outcomes.most_common():
+            if outcome != 'ok':
+                self.stdout.write(f'    {count:>6} x {outcome}')
@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.models import Book
+from library.renditions import RENDITION_SIZES, render
+
+PAGE_SIZE = 24  # Cards per book list page (library.catalog.DEFAULT_PAGE_SIZE).
+
+
+class Command(BaseCommand):
+    help = ("Reports bytes per book list page with original covers vs. renditions, "
+            "rendering in memory from the covers in media storage.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['WEBP', 'JPEG'], default='WEBP')
+
+    def handle(self, *args, **options):
+        storage = Book._meta.get_field('cover_image_file').storage
+        _, files = storage.listdir('book_covers')
+        covers = sorted(name for name in files if os.path.splitext(name)[1].lower() in ('.jpg', '.jpeg', '.png', '.webp'))
+        if not covers:
+            self.stdout.write('No covers found in media/book_covers/.')
+            return
+
+        totals = {'original': 0, **{size: 0 for size in RENDITION_SIZES}}
+        render_time = 0.0
+        self.stdout.write(f'{"cover":<52}{"original":>10}' + ''.join(f'{size:>10}' for size in RENDITION_SIZES))
+        for name in covers:
+            with storage.open(f'book_covers/{name}', 'rb') as fh:
+                original = fh.read()
+            sizes = {}
+            for size in RENDITION_SIZES:
+                started = time.perf_counter()
+                with storage.open(f'book_covers/{name}', 'rb') as fh:
+                    sizes[size] = len(render(fh, size, options['format']))
+                render_time += time.perf_counter() - started
+                totals[size] += sizes[size]
+            totals['original'] += len(original)
+            self.stdout.write(f'{name[:50]:<52}{len(original):>10,}' + ''.join(f'{sizes[s]:>10,}' for s in RENDITION_SIZES))
+
+        count = len(covers)
+        per_page_original = totals['original'] / count * PAGE_SIZE
+        per_page_card = totals['card'] / count * PAGE_SIZE
+        self.stdout.write('')
+        self.stdout.write(f'Average render time: {render_time / (count * len(RENDITION_SIZES)) * 1000:.1f} ms per rendition')
+        self.stdout.write(f'Book list page ({PAGE_SIZE} cards): {per_page_original / 1024:,.0f} KiB with originals, '
+                          f'{per_page_card / 1024:,.0f} KiB with card renditions '
+                          f'({100 * (1 - per_page_card / per_page_original):.0f}% smaller).')
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from library import benchmarks
+
+# Django's stock parameters, for comparison with the tuned classes in library.hashers.
+STOCK_HASHERS = (
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+)
+
+
+class Command(BaseCommand):
+    help = ("Times one password verification (the cost of a login) for each configured hasher and for "
+            "Django's stock parameters. Hashers whose library is not installed are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help='Timed verifications per hasher.')
+
+    def handle(self, *args, **options):
+        preferred = get_hasher('default')
+        self.stdout.write(f'Preferred: {type(preferred).__module__}.{type(preferred).__name__}')
+        for path in dict.fromkeys([*settings.PASSWORD_HASHERS, *STOCK_HASHERS]):
+            name = path.replace('django.contrib.auth.hashers', 'django').replace('library.hashers', 'library')
+            hasher = import_string(path)()
+            try:
+                encoded = hasher.encode('correct horse battery staple', hasher.salt())
+            except ValueError as e:  # Missing optional library (argon2-cffi, bcrypt).
+                self.stdout.write(f'{name:<36} skipped: {e}')
+                continue
+            samples = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                hasher.verify('correct horse battery staple', encoded)
+                samples.append(time.perf_counter() - started)
+            self.stdout.write(benchmarks.format_summary(name, benchmarks.summarize(samples)))
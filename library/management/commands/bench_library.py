@@ -0,0 +1,130 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from library import benchmarks, circulation, loans, ratelimit, recommendations, search, stats
+from library.cache import bump_catalog_version
+from library.catalog import filter_books, paginate_books
+from library.models import Book, BorrowedBook, Category, User
+from library.serializers import CATALOG_FIELDS, serialize_catalog_rows
+
+
+class Command(BaseCommand):
+    help = ("Micro-benchmarks the catalog queries, serializers, search, stats, suggestions and circulation "
+            "on a freshly seeded throwaway database. --save writes a baseline; --compare flags regressions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5_000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--loans', type=int, default=20_000)
+        parser.add_argument('--repeat', type=int, default=200, help='Timed runs per benchmark.')
+        parser.add_argument('--only', nargs='+', help='Run only benchmarks whose name contains one of these.')
+        parser.add_argument('--save', metavar='PATH', help='Write the results as a baseline JSON file.')
+        parser.add_argument('--compare', metavar='PATH', help='Compare against a baseline JSON file.')
+        parser.add_argument('--threshold', type=float, default=0.20,
+                            help='Relative slowdown (p95 or throughput) counted as a regression.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                self.stdout.write('Seeding...')
+                benchmarks.seed(books=options['books'], users=options['users'], loans=options['loans'],
+                                stdout=self.stdout)
+                results = self.run_benchmarks(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['save']:
+            benchmarks.save_results(options['save'], results)
+            self.stdout.write(f'Baseline written to {options["save"]}.')
+        if options['compare']:
+            regressions = benchmarks.compare_results(options['compare'], results, options['threshold'])
+            for message in regressions:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {message}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) beyond {options["threshold"]:.0%}.')
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
+
+    def run_benchmarks(self, options):
+        results = {}
+        for name, func in self.benchmarks().items():
+            if options['only'] and not any(part in name for part in options['only']):
+                continue
+            func()  # Warm caches and connections.
+            samples = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - started)
+            results[name] = benchmarks.summarize(samples)
+            self.stdout.write(benchmarks.format_summary(name, results[name]))
+        return results
+
+    def benchmarks(self):
+        rng = random.Random(42)
+        values = Book.objects.values(*CATALOG_FIELDS)
+        category = Category.objects.order_by('pk').values_list('name', flat=True).first()
+        page = paginate_books(values, {})[0]
+        big_page = paginate_books(values, {'page_size': 100})[0]
+        deep_cursor = paginate_books(values, {'page_size': 100, 'sort': 'author-asc'})[1]
+        term = Book.objects.values_list('book_name', flat=True).first().split()[0]
+        readers = list(User.objects.filter(borrowed_records__isnull=False).distinct()[:50])
+        available = list(Book.objects.filter(available_copies__gt=1).values_list('pk', flat=True)[:200])
+        borrower = User.objects.create_user('bench-borrower', password=benchmarks.SEED_PASSWORD)
+        client, books_url = Client(SERVER_NAME='localhost'), reverse('library:books_api')
+        login_request = RequestFactory().post(reverse('library:login_api'), {'username': 'bench', 'password': 'x'},
+                                              content_type='application/json')
+        unlimited = ratelimit.TokenBucket(rate=1e9, burst=1e9)
+        loans_cursor = loans.list_open_loans({'page_size': 500})[1]
+
+        def get_books():
+            response = client.get(books_url)
+            if response.status_code != 200:
+                raise CommandError(f'{books_url} returned {response.status_code}.')
+
+        def all_open_loans():
+            """What the admin dashboard used to fetch: every open loan, formatted per row."""
+            return [{
+                'borrowed_pk': rec.pk, 'username': rec.user.username, 'book_title': rec.book.book_name,
+                'borrow_date': rec.borrow_date.strftime('%Y-%m-%d %H:%M'), 'due_date': rec.due_date.strftime('%Y-%m-%d'),
+            } for rec in BorrowedBook.objects.filter(return_date__isnull=True).select_related('user', 'book')
+                                             .order_by('due_date', 'user__username')]
+
+        def borrow_and_return():
+            record = circulation.borrow_book(borrower, rng.choice(available))
+            circulation.return_book(record)
+            BorrowedBook.objects.filter(pk=record.pk).delete()  # Keep the loan table the same size.
+
+        suite = {
+            'catalog.first_page': lambda: paginate_books(values, {}),
+            'catalog.category_available_page': lambda: paginate_books(
+                filter_books(values, {'category': category, 'availability': 'available'}), {}),
+            'catalog.cursor_page_author_sort': lambda: paginate_books(
+                values, {'sort': 'author-asc', 'cursor': deep_cursor}),
+            'catalog.search_filter_page': lambda: paginate_books(filter_books(values, {'search': term}), {}),
+            'serializer.24_rows': lambda: serialize_catalog_rows(page),
+            'serializer.100_rows': lambda: serialize_catalog_rows(big_page),
+            'stats.get_stats': stats.get_stats,
+            'recommendations.suggest_books': lambda: recommendations.suggest_books(rng.choice(readers)),
+            'circulation.borrow_return': borrow_and_return,
+            'loans.all_open_unpaginated': all_open_loans,
+            'loans.first_page': lambda: loans.list_open_loans({}),
+            'loans.cursor_page': lambda: loans.list_open_loans({'cursor': loans_cursor}),
+            'loans.overdue_page_with_totals': lambda: loans.list_open_loans({'overdue': '1', 'totals': '1'}),
+            'ratelimit.check_ip_and_username': lambda: ratelimit.check(
+                login_request, 'bench', [('ip', unlimited), ('username', unlimited)]),
+            'http.books_api_cached': get_books,
+            'http.books_api_uncached': lambda: (bump_catalog_version(), get_books()),
+        }
+        if search.is_search_available():
+            suite['search.ranked_ids'] = lambda: search.ranked_book_ids(term, 'all', 20)
+        return suite
@@ -0,0 +1,78 @@
+import copy
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from library import benchmarks
+from library.models import Book, User
+
+UNCACHED_LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+
+class Command(BaseCommand):
+    help = ("Times the server-rendered pages twice on a seeded throwaway database: with uncached template "
+            "loaders and an empty cache before every request, then with the cached loader and warm fragments.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=2_000)
+        parser.add_argument('--categories', type=int, default=40)
+        parser.add_argument('--repeat', type=int, default=100, help='Timed requests per page and mode.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                benchmarks.seed(books=options['books'], users=20, categories=options['categories'],
+                                loans=options['books'], stdout=self.stdout)
+                self.run_pages(options['repeat'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_pages(self, repeat):
+        admin = User.objects.create_user('bench-admin', password=benchmarks.SEED_PASSWORD, is_admin=True)
+        reader = User.objects.filter(username__endswith='reader0').first()
+        book = Book.objects.order_by('pk').first()
+        anonymous, as_reader, as_admin = (Client(SERVER_NAME='localhost') for _ in range(3))
+        as_reader.force_login(reader)
+        as_admin.force_login(admin)
+        pages = {
+            'pages.book_list': (anonymous, reverse('library:book_list')),
+            'pages.book_detail': (anonymous, reverse('library:book_detail', args=[book.book_id_json])),
+            'pages.book_detail_reader': (as_reader, reverse('library:book_detail', args=[book.book_id_json])),
+            'pages.add_book': (as_admin, reverse('library:add_book_page')),
+            'pages.edit_book': (as_admin, reverse('library:edit_book_page', args=[book.pk])),
+        }
+        uncached_templates = copy.deepcopy(settings.TEMPLATES)
+        uncached_templates[0]['APP_DIRS'] = False
+        uncached_templates[0]['OPTIONS']['loaders'] = UNCACHED_LOADERS
+
+        for name, (client, url) in pages.items():
+            with override_settings(TEMPLATES=uncached_templates):
+                before = benchmarks.summarize(self.time_page(client, url, repeat, cold=True))
+            after = benchmarks.summarize(self.time_page(client, url, repeat, cold=False))
+            self.stdout.write(benchmarks.format_summary(f'{name} (uncached)', before))
+            self.stdout.write(benchmarks.format_summary(f'{name} (cached)', after) +
+                              f'   {before["p50_ms"] / after["p50_ms"]:.1f}x')
+
+    def time_page(self, client, url, repeat, cold):
+        client.get(url)  # Warm connections (and, in cached mode, templates and fragments).
+        samples = []
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}.')
+        return samples
@@ -0,0 +1,82 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import search
+
+SYLLABLES = 'ka lo ri ven tar mi so dun el gra pho ne sil ward bri mor than ae quin oth'.split()
+# Two- and three-syllable pseudo-words give a ~8.4k word vocabulary; drawing them with
+# Zipf-like weights gives the mix of very common and rare terms real titles have.
+VOCABULARY = [a + b for a in SYLLABLES for b in SYLLABLES] + \
+             [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+CATEGORIES = ['Fiction', 'History', 'Science', 'Mystery', 'Biography', 'Fantasy', 'Poetry', 'Travel']
+QUERIES = [
+    (VOCABULARY[0], 'all'),                       # most common word
+    (VOCABULARY[50][:3], 'all'),                  # short prefix
+    (f'{VOCABULARY[10]} {VOCABULARY[200]}', 'all'),
+    (VOCABULARY[1000], 'title'),                  # rare title word
+    ('Author 42', 'author'),
+    ('myst', 'category'),
+]
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks FTS5 search latency on synthetic catalogs of the given sizes. "
+            "Runs against a throwaway SQLite file, never the project database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=50, help='Timed runs per query.')
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1234)
+        for size in options['sizes']:
+            with tempfile.TemporaryDirectory() as tmp:
+                conn = sqlite3.connect(os.path.join(tmp, 'bench.sqlite3'))
+                build_started = time.perf_counter()
+                self._populate(conn, size, rng)
+                build_elapsed = time.perf_counter() - build_started
+                timings = self._time_queries(conn, options['repeat'], options['limit'])
+                conn.close()
+
+            self.stdout.write(f'{size:>9,} books  (index built in {build_elapsed:.1f}s)')
+            for (text, search_type), samples in timings.items():
+                samples.sort()
+                p50 = statistics.median(samples) * 1000
+                p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+                self.stdout.write(f'    {search_type:>8} {text!r:<22} p50 {p50:7.3f} ms   p95 {p95:7.3f} ms')
+
+    def _populate(self, conn, size, rng):
+        conn.execute(search.CREATE_TABLE_SQL)
+        rows = (
+            (pk, ' '.join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=3)).title(), f'Author {rng.randrange(50_000)}',
+             ' '.join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=40)), ' '.join(rng.sample(CATEGORIES, k=2)))
+            for pk in range(1, size + 1)
+        )
+        conn.executemany(
+            f'INSERT INTO {search.SEARCH_TABLE} (rowid, book_name, author, description, categories) '
+            'VALUES (?, ?, ?, ?, ?)', rows)
+        conn.execute(f"INSERT INTO {search.SEARCH_TABLE} ({search.SEARCH_TABLE}) VALUES ('optimize')")
+        conn.commit()
+
+    def _time_queries(self, conn, repeat, limit):
+        sql = f'{search.match_subquery_sql()} ORDER BY {search.RANK_EXPRESSION} LIMIT ?'.replace('%s', '?')
+        timings = {}
+        for text, search_type in QUERIES:
+            expression = search.build_match_expression(text, search_type)
+            conn.execute(sql, (expression, limit)).fetchall()  # Warm the page cache.
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(sql, (expression, limit)).fetchall()
+                samples.append(time.perf_counter() - started)
+            timings[(text, search_type)] = samples
+        return timings
@@ -0,0 +1,67 @@
+import gc
+import random
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import benchmarks, suggest
+from library.management.commands.bench_search import CATEGORIES, CUM_WEIGHTS, VOCABULARY
+
+
+class Command(BaseCommand):
+    help = ("Measures the memory and prefix-query latency of the in-memory suggest index (library.suggest) "
+            "on synthetic catalogs, against a linear scan of the same titles. Needs no database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100_000, 1_000_000])
+        parser.add_argument('--queries', type=int, default=5_000, help='Timed index queries per size.')
+        parser.add_argument('--scan-queries', type=int, default=20, help='Timed linear-scan queries per size.')
+        parser.add_argument('--limit', type=int, default=suggest.DEFAULT_LIMIT)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            rng = random.Random(1234)
+            rows = [(pk, ' '.join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=rng.randint(1, 5))).title(),
+                     f'Author {rng.randrange(max(size // 5, 1))}') for pk in range(1, size + 1)]
+            gc.collect()
+            peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            started = time.perf_counter()
+            index = suggest.SuggestIndex(rows, enumerate(CATEGORIES, start=1))
+            build_elapsed = time.perf_counter() - started
+            # ru_maxrss is in KiB on Linux; only a build that raises the process's peak shows up.
+            peak_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_before) * 1024
+
+            queries = [self.prefix(rng, rows) for _ in range(options['queries'])]
+            samples = []
+            for query in queries:
+                started = time.perf_counter()
+                index.suggest(query, limit=options['limit'])
+                samples.append(time.perf_counter() - started)
+
+            folded = [suggest.fold(title) for _, title, _ in rows]
+            scan_samples = []
+            for query in queries[:options['scan_queries']]:
+                prefix = suggest.fold(query)
+                started = time.perf_counter()
+                [title for title in folded if title.startswith(prefix) or f' {prefix}' in title]
+                scan_samples.append(time.perf_counter() - started)
+
+            titles_as_str = sys.getsizeof(folded) + sum(sys.getsizeof(title) for title in folded)
+            mib = 1 << 20
+            self.stdout.write(
+                f'{size:>9,} titles: index {index.nbytes() / mib:.1f} MiB ({index.nbytes() / size:.0f} B/title) '
+                f'built in {build_elapsed:.1f}s, raising peak RSS by {peak_growth / mib:.0f} MiB; '
+                f'the folded titles alone as a list of str take {titles_as_str / mib:.1f} MiB')
+            self.stdout.write(benchmarks.format_summary('suggest.index', benchmarks.summarize(samples)))
+            self.stdout.write(benchmarks.format_summary('suggest.linear_scan', benchmarks.summarize(scan_samples)))
+            del rows, index, folded
+
+    def prefix(self, rng, rows):
+        """A typed prefix: the start of a title word, of two title words, or of an author."""
+        _, title, author = rows[rng.randrange(len(rows))]
+        words = title.split()
+        start = rng.randrange(len(words))
+        text = rng.choice([words[start], ' '.join(words[start:start + 2]), author])
+        return text[:rng.randint(1, len(text))]
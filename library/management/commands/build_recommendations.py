@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the co-borrow (BookAffinity) and per-category (CategoryTopBook) suggestion "
+            "tables from loan history. Run periodically, e.g. nightly from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=recommendations.DEFAULT_TOP_N,
+                            help='Related books kept per book and per category.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        affinity_rows = recommendations.build_book_affinity(options['top'])
+        category_rows = recommendations.build_category_top_books(options['top'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {affinity_rows} book affinities and {category_rows} category top books in {elapsed:.1f}s.'))
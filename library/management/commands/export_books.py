@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.exports import EXPORT_DATASETS, EXPORT_FORMATS, export_lines, parse_updated_since
+
+
+class Command(BaseCommand):
+    help = "Streams the catalog (or loan history) as JSONL or CSV with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=EXPORT_DATASETS, default='books')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl')
+        parser.add_argument('--updated-since', help='Only rows changed since this ISO date/datetime.')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            updated_since = parse_updated_since(options['updated_since'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        lines = export_lines(options['dataset'], options['format'], updated_since)
+        if options['output']:
+            count = 0
+            with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                for line in lines:
+                    fh.write(line)
+                    count += 1
+            self.stderr.write(f'Wrote {count} lines to {options["output"]}.')
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from library.models import Book
+from library.renditions import generate_for_book, rendition_format
+
+
+def _generate(book_pk, cover_name):
+    try:
+        return generate_for_book(book_pk, cover_name)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ("Builds list/card/detail cover renditions for books that don't have them yet, or have them "
+            "in another format than LIBRARY_COVER_RENDITION_FORMAT.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate renditions for every cover.')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(cover_image_file='').exclude(cover_image_file__isnull=True)
+        if not options['all']:
+            books = books.exclude(cover_rendition_format=rendition_format())
+        pending = list(books.values_list('pk', 'cover_image_file'))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(pool.map(lambda item: _generate(*item), pending))
+        elapsed = time.perf_counter() - started
+
+        done = sum(results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated renditions for {done} of {len(pending)} covers in {elapsed:.1f}s.'))
+        if done < len(pending):
+            self.stdout.write(self.style.WARNING(f'{len(pending) - done} covers failed or changed meanwhile.'))
@@ -0,0 +1,265 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from library import circulation, search, stats
+from library.cache import (schedule_book_version_bump, schedule_catalog_version_bump, schedule_category_version_bump,
+                           schedule_suggest_version_bump)
+from library.models import Book, Category
+
+# Book columns refreshed when a bookId already exists. available_copies is not
+# overwritten, so re-importing a feed never hands out copies that are on loan;
+# it moves with total_copies instead (see circulation.shift_available_copies).
+UPDATE_FIELDS = ['book_name', 'author', 'description', 'publisher', 'publication_date',
+                 'language', 'pages', 'isbn', 'total_copies', 'updated_at']
+
+
+def iter_json_records(fp, chunk_size=1 << 16):
+    """Yields objects from a JSON array or a JSONL file while holding one chunk in memory."""
+    decoder = json.JSONDecoder()
+    buffer = fp.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        # JSON Lines: one object per line.
+        for number, line in enumerate(_iter_lines(buffer, fp), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise CommandError(f'Malformed JSON on line {number}: {e}')
+            if not isinstance(record, dict):
+                raise CommandError(f'Line {number} is not a JSON object.')
+            yield record
+        return
+
+    buffer, position, eof = buffer[1:], 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Malformed JSON array in input file.')
+            more = fp.read(chunk_size)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+        yield record
+
+
+def _iter_lines(head, fp):
+    yield from (head + fp.readline()).splitlines()
+    yield from fp
+
+
+def parse_date(value):
+    """Accepts YYYY-MM-DD or a bare year; anything else becomes None."""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return date(int(value), 1, 1) if value.isdigit() and len(value) == 4 else None
+
+
+def parse_count(value):
+    """Accepts a non-negative integer or a string of digits; anything else becomes None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value >= 0 else None
+    value = str(value).strip() if isinstance(value, str) else ''
+    return int(value) if value.isdigit() else None
+
+
+def category_names(record):
+    raw = record.get('categories', record.get('category')) or []
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    return {name.strip() for name in raw if name and name.strip()}
+
+
+class Command(BaseCommand):
+    help = ("Streams books from a JSON array or JSONL feed (bookId, bookName, author, categories, ...) "
+            "and upserts them in batches keyed on bookId.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON or JSONL file to import.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--covers-dir', help='Directory holding the files named by coverImage; '
+                                                 'when given, covers are copied into media storage.')
+        parser.add_argument('--workers', type=int, default=8, help='Threads used to copy cover images.')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f'{options["path"]} does not exist.')
+
+        self.category_ids = dict(Category.objects.values_list('name', 'pk'))
+        self.storage = Book._meta.get_field('cover_image_file').storage
+        self.covers_dir = options['covers_dir']
+        self.copier = ThreadPoolExecutor(max_workers=options['workers']) if self.covers_dir else None
+        self.pending_copies = threading.BoundedSemaphore(options['workers'] * 4)
+        self.imported = self.skipped = 0
+        started = time.perf_counter()
+
+        batch = []
+        with open(options['path'], encoding='utf-8') as fp:
+            for record in iter_json_records(fp):
+                batch.append(record)
+                if len(batch) >= options['batch_size']:
+                    self.import_batch(batch)
+                    batch = []
+                    self.report(started)
+            if batch:
+                self.import_batch(batch)
+
+        if self.copier:
+            self.copier.shutdown(wait=True)
+        if search.is_search_available():
+            search.rebuild_index()
+        stats.recompute_stats()  # bulk_create skips the counter signals.
+        # bulk_create skips the signals that follow single saves.
+        schedule_catalog_version_bump()
+        schedule_category_version_bump()
+        schedule_suggest_version_bump(rebuild=True)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} books ({self.skipped} skipped) in {elapsed:.1f}s '
+            f'({self.imported / elapsed if elapsed else 0:.0f} rows/s).'))
+
+    def report(self, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {self.imported} books, {self.imported / elapsed if elapsed else 0:.0f} rows/s')
+
+    def build_book(self, record):
+        book_id = str(record.get('bookId') or '').strip()
+        if not book_id or not record.get('bookName'):
+            return None
+        total = record.get('totalCopies')
+        total = 1 if total is None else parse_count(total)
+        available = record.get('availableCopies')
+        available = total if available is None else parse_count(available)
+        if total is None or available is None:
+            self.stderr.write(f'Skipped bookId {book_id}: totalCopies and availableCopies must be whole numbers.')
+            return None
+        book = Book(
+            book_id_json=book_id, book_name=record['bookName'], author=record.get('author') or '',
+            description=record.get('description') or '', publisher=record.get('publisher') or None,
+            publication_date=parse_date(record.get('publicationDate')), language=record.get('language') or None,
+            pages=parse_count(record.get('pages')) or None, isbn=record.get('isbn') or None,
+            total_copies=total, available_copies=min(available, total),
+        )
+        cover = record.get('coverImage')
+        if self.covers_dir and cover and not str(cover).startswith(('http://', 'https://')):
+            book.cover_image_file.name = self.schedule_cover_copy(os.path.basename(cover))
+        return book
+
+    def schedule_cover_copy(self, filename):
+        """Queues a cover copy on the worker pool and returns the storage name it will have,
+        or None when covers_dir has no such file."""
+        name = f'book_covers/{filename}'
+        source = os.path.join(self.covers_dir, filename)
+        if not os.path.exists(source):
+            self.stderr.write(f'Cover not found: {source}')
+            return None
+        self.pending_copies.acquire()  # Bounds queued copies so memory stays flat.
+        self.copier.submit(self.copy_cover, source, name)
+        return name
+
+    def copy_cover(self, source, name):
+        try:
+            if os.path.exists(source) and not self.storage.exists(name):
+                with open(source, 'rb') as fh:
+                    self.storage.save(name, File(fh))
+        except OSError as e:
+            self.stderr.write(f'Cover copy failed for {source}: {e}')
+        finally:
+            self.pending_copies.release()
+
+    def resolve_categories(self, names):
+        """Creates any unseen category names in one statement and returns name -> pk."""
+        missing = names - self.category_ids.keys()
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'pk'))
+        return self.category_ids
+
+    def import_batch(self, records):
+        books, categories = {}, {}
+        for record in records:
+            book = self.build_book(record)
+            if book is None:
+                self.skipped += 1
+                continue
+            books[book.book_id_json] = book  # Last occurrence of a bookId wins.
+            categories[book.book_id_json] = category_names(record)
+
+        # A record without a usable cover leaves an existing book's cover alone.
+        with_cover = [book for book in books.values() if book.cover_image_file]
+        without_cover = [book for book in books.values() if not book.cover_image_file]
+        with transaction.atomic():
+            category_ids = self.resolve_categories(set().union(*categories.values()))
+            previous_totals = dict(Book.objects.filter(book_id_json__in=books)
+                                               .values_list('book_id_json', 'total_copies'))
+            saved = self.upsert(without_cover, UPDATE_FIELDS)
+            if with_cover:
+                saved += self.upsert(with_cover, UPDATE_FIELDS + ['cover_image_file'])
+            self.shift_available_copies(saved, previous_totals)
+            schedule_book_version_bump([book.pk for book in saved])  # The book page fragments.
+            through = Book.categories.through
+            through.objects.filter(book_id__in=[book.pk for book in saved]).delete()
+            through.objects.bulk_create([
+                through(book_id=book.pk, category_id=category_ids[name])
+                for book in saved for name in categories[book.book_id_json]
+            ], batch_size=5000)
+        self.imported += len(saved)
+
+    def shift_available_copies(self, books, previous_totals):
+        """Moves available_copies of re-imported books with their change in total_copies."""
+        pks_by_change = {}
+        for book in books:
+            change = book.total_copies - previous_totals.get(book.book_id_json, book.total_copies)
+            if change:
+                pks_by_change.setdefault(change, []).append(book.pk)
+        for change, pks in pks_by_change.items():
+            circulation.shift_available_copies(pks, change)
+
+    def upsert(self, books, update_fields):
+        """bulk_create with ON CONFLICT(book_id_json) DO UPDATE; rows that still fail
+        (e.g. an ISBN already used by another bookId) are retried one by one and skipped."""
+        if not books:
+            return []
+        try:
+            with transaction.atomic():
+                saved = Book.objects.bulk_create(books, update_conflicts=True, unique_fields=['book_id_json'],
+                                                 update_fields=update_fields)
+        except IntegrityError:
+            saved = []
+            for book in books:
+                try:
+                    with transaction.atomic():
+                        saved += Book.objects.bulk_create([book], update_conflicts=True,
+                                                          unique_fields=['book_id_json'], update_fields=update_fields)
+                except IntegrityError as e:
+                    self.skipped += 1
+                    self.stderr.write(f'Skipped bookId {book.book_id_json}: {e}')
+        if any(book.pk is None for book in saved):
+            # Backends that can't return ids from an upsert: look them up in one query.
+            ids = dict(Book.objects.filter(book_id_json__in=[b.book_id_json for b in saved])
+                                   .values_list('book_id_json', 'pk'))
+            for book in saved:
+                book.pk = ids[book.book_id_json]
+        return saved
@@ -0,0 +1,225 @@
+import http.client
+import json
+import multiprocessing
+import random
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Weighted request mix; every name is a scenario method on LoadClient.
+SCENARIOS = {
+    'books_api': 35,
+    'book_detail': 20,
+    'books_api_search': 10,
+    'search_api': 5,
+    'book_list': 5,
+    'index': 5,
+    'user_dashboard': 10,
+    'borrow_return': 10,
+}
+SORTS = ('title-asc', 'title-desc', 'author-asc', 'newest', 'oldest')
+
+
+class LoadClient:
+    """One simulated reader: a keep-alive connection, a cookie jar and a logged-in session."""
+
+    def __init__(self, base_url, username, password, catalog, rng, keepalive=True):
+        parts = urlsplit(base_url)
+        self.keepalive = keepalive
+        self.host = parts.netloc
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = self.connection_class(self.host, timeout=30)
+        self.cookies = {}
+        self.catalog = catalog
+        self.rng = rng
+        self.request('GET', '/login/')  # Sets the CSRF cookie, as it does for a browser.
+        status, _ = self.request('POST', '/api/login/', json.dumps({'username': username, 'password': password}),
+                                 content_type='application/json')
+        if status != 200:
+            raise RuntimeError(f'Login as {username} failed with HTTP {status}.')
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {'Host': self.host}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+            headers['Referer'] = f'http://{self.host}/'
+        if content_type:
+            headers['Content-Type'] = content_type
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+            if not self.keepalive:
+                self.connection.close()  # http.client reconnects on the next request.
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = self.connection_class(self.host, timeout=30)
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, payload
+
+    def get(self, path, **params):
+        return self.request('GET', f'{path}?{urlencode(params)}' if params else path)[0]
+
+    # --- Scenarios: each returns the HTTP status of its last request ---
+
+    def books_api(self):
+        return self.get('/api/books/', sort=self.rng.choice(SORTS), page_size=24,
+                        availability=self.rng.choice(('all', 'all', 'available')))
+
+    def books_api_search(self):
+        return self.get('/api/books/', search=self.rng.choice(self.catalog['words']))
+
+    def search_api(self):
+        return self.get('/api/books/search/', q=self.rng.choice(self.catalog['words'])[:4])
+
+    def book_detail(self):
+        return self.get(f'/books/{self.rng.choice(self.catalog["book_ids"])}/')
+
+    def book_list(self):
+        return self.get('/books/')
+
+    def index(self):
+        return self.get('/')
+
+    def user_dashboard(self):
+        return self.get('/user-dashboard/')
+
+    def borrow_return(self):
+        status, payload = self.request('POST', f'/api/books/borrow/{self.rng.choice(self.catalog["book_pks"])}/')
+        if status != 200:
+            return 200 if status == 400 else status  # 400 = unavailable/already borrowed: a valid outcome.
+        borrowed_pk = json.loads(payload)['borrowed_pk']
+        return self.request('POST', f'/api/borrowed-books/return/{borrowed_pk}/')[0]
+
+
+def _run_process(base_url, usernames, password, catalog, duration, seed, keepalive):
+    """Runs one thread per username for `duration` seconds; returns {scenario: (latencies, errors)}."""
+    names, weights = list(SCENARIOS), list(SCENARIOS.values())
+    results = defaultdict(lambda: ([], [0]))
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def run(username, thread_seed):
+        rng = random.Random(thread_seed)
+        client = LoadClient(base_url, username, password, catalog, rng, keepalive)
+        local = defaultdict(lambda: ([], [0]))
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok = getattr(client, scenario)() == 200
+            except (http.client.HTTPException, OSError, ValueError, KeyError):
+                ok = False
+            latencies, errors = local[scenario]
+            latencies.append(time.perf_counter() - started)
+            errors[0] += not ok
+        with lock:
+            for scenario, (latencies, errors) in local.items():
+                results[scenario][0].extend(latencies)
+                results[scenario][1][0] += errors[0]
+
+    threads = [threading.Thread(target=run, args=(name, seed * 1000 + i)) for i, name in enumerate(usernames)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {scenario: (latencies, errors[0]) for scenario, (latencies, errors) in results.items()}
+
+
+class Command(BaseCommand):
+    help = ("Multi-process HTTP load driver for a running server (runserver, gunicorn, uvicorn...). "
+            "Logs in as readers created by seed_library and replays a weighted mix of catalog, detail, "
+            "dashboard and borrow/return requests, then reports throughput and p50/p95/p99 per scenario.")
+
+    def add_arguments(self, parser):
+        from library import benchmarks  # Imported lazily: spawned load processes never set up Django.
+
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients (threads) per process.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run.')
+        parser.add_argument('--seed', type=int, default=1234, help='The --seed given to seed_library.')
+        parser.add_argument('--password', default=benchmarks.SEED_PASSWORD)
+        parser.add_argument('--no-keepalive', action='store_true',
+                            help="Open a connection per request. Use it against runserver, whose keep-alive "
+                                 "responses stall ~40 ms on Nagle's algorithm.")
+        parser.add_argument('--save', metavar='PATH', help='Write the results as a baseline JSON file.')
+        parser.add_argument('--compare', metavar='PATH', help='Compare against a baseline JSON file.')
+        parser.add_argument('--threshold', type=float, default=0.20,
+                            help='Relative slowdown (p95 or throughput) counted as a regression.')
+
+    def handle(self, *args, **options):
+        from library import benchmarks
+
+        catalog = self.fetch_catalog(options['url'])
+        prefix = f'S{options["seed"]}-reader'
+        process_users = [[f'{prefix}{p * options["clients"] + c}' for c in range(options['clients'])]
+                         for p in range(options['processes'])]
+        self.stdout.write(f'{options["processes"]} processes x {options["clients"]} clients '
+                          f'against {options["url"]} for {options["duration"]:.0f}s...')
+
+        with multiprocessing.get_context('spawn').Pool(options['processes']) as pool:
+            per_process = pool.starmap(_run_process, [
+                (options['url'], usernames, options['password'], catalog, options['duration'], p,
+                 not options['no_keepalive'])
+                for p, usernames in enumerate(process_users)
+            ])
+        elapsed = options['duration']  # Throughput over the timed window; process start-up and login excluded.
+
+        merged = defaultdict(lambda: ([], 0))
+        for result in per_process:
+            for scenario, (latencies, errors) in result.items():
+                merged[scenario] = (merged[scenario][0] + latencies, merged[scenario][1] + errors)
+        if not merged:
+            raise CommandError('No requests completed.')
+
+        results = {}
+        for scenario in sorted(merged):
+            latencies, errors = merged[scenario]
+            results[f'http.{scenario}'] = {**benchmarks.summarize(latencies, elapsed), 'errors': errors}
+        every = [latency for latencies, _ in merged.values() for latency in latencies]
+        results['http.all'] = {**benchmarks.summarize(every, elapsed),
+                               'errors': sum(errors for _, errors in merged.values())}
+        for name, summary in results.items():
+            line = benchmarks.format_summary(name, summary)
+            self.stdout.write(line + (f'   {summary["errors"]} errors' if summary['errors'] else ''))
+
+        if options['save']:
+            benchmarks.save_results(options['save'], results)
+            self.stdout.write(f'Baseline written to {options["save"]}.')
+        if options['compare']:
+            regressions = benchmarks.compare_results(options['compare'], results, options['threshold'])
+            for message in regressions:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {message}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) beyond {options["threshold"]:.0%}.')
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
+
+    def fetch_catalog(self, base_url):
+        """Books and title words to request, read from the server's own catalog API."""
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.netloc, timeout=30)
+        try:
+            connection.request('GET', '/api/books/?page_size=100', headers={'Host': parts.netloc})
+            books = json.loads(connection.getresponse().read())['books']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Could not read the catalog from {base_url}: {e}')
+        finally:
+            connection.close()
+        if not books:
+            raise CommandError('The catalog is empty; run seed_library first.')
+        return {
+            'book_ids': [book['bookId'] for book in books],
+            'book_pks': [book['django_pk'] for book in books],
+            'words': sorted({word for book in books for word in book['bookName'].split() if len(word) > 3}) or ['a'],
+        }
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the dashboard counters from the Book, BorrowedBook and User tables."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            before = stats.get_stats()
+            after = stats.recompute_stats()
+        for field in stats.STAT_FIELDS:
+            drift = after[field] - before[field]
+            note = f'  (corrected by {drift:+d})' if drift else ''
+            self.stdout.write(f'{field:>17}: {after[field]}{note}')
+        self.stdout.write(self.style.SUCCESS('Library stats recomputed.'))
@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# library.tasks is imported inside the functions: spawned worker processes import
+# this module before django.setup() has loaded the app registry.
+
+
+def _worker_process(options, stop):
+    import django
+    django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles Ctrl+C and sets stop.
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())  # Also when SIGTERM reaches the whole group.
+    try:
+        _work(options, stop)
+    finally:
+        connections.close_all()
+
+
+def _work(options, stop):
+    from library import tasks
+    return tasks.work(batch_size=options['batch_size'], lease=timedelta(seconds=options['lease']),
+                      once=options['once'], stop=stop, poll_interval=options['poll_interval'])
+
+
+class Command(BaseCommand):
+    help = ("Runs background tasks from the database queue (overdue detection, reminder emails, fines). "
+            "Start as many as you like, on one or several machines.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to start.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed per round trip.')
+        parser.add_argument('--lease', type=int, default=300,
+                            help='Seconds a claimed task stays reserved before other workers may retry it; '
+                                 'renewed while the task runs.')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due (e.g. from cron).')
+
+    def handle(self, *args, **options):
+        from library import tasks
+        tasks.schedule_periodic_tasks()
+        if options['processes'] <= 1:
+            # On SIGTERM the task in hand is finished before the worker exits.
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            try:
+                processed = _work(options, stop)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f'Ran {processed} tasks.'))
+            return
+
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        workers = [context.Process(target=_worker_process, args=(options, stop), name=f'library-worker-{i}')
+                   for i in range(options['processes'])]
+        connections.close_all()
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {len(workers)} workers.')
+        # On Ctrl+C or SIGTERM, workers finish the task in hand, then exit.
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        while any(worker.is_alive() for worker in workers):
+            try:
+                for worker in workers:
+                    worker.join()
+            except KeyboardInterrupt:
+                stop.set()
@@ -0,0 +1,119 @@
+import copy
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+ASSET_RE = re.compile(r'<(link|script|img)\b([^>]*?)\b(?:href|src)="([^"]+)"([^>]*)>')
+
+
+class Command(BaseCommand):
+    help = ("Reports the bytes a page and its static assets transfer, on a first and a repeat visit, in the "
+            "development static mode and in the production mode (hashed, precompressed, immutable). "
+            "First paint is estimated from a simple network model (--rtt-ms, --kbps), not measured in a browser.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', default='library:book_list', help='URL name of the page to report.')
+        parser.add_argument('--rtt-ms', type=float, default=150.0, help='Round-trip time of the modelled network.')
+        parser.add_argument('--kbps', type=float, default=1600.0, help='Bandwidth of the modelled network.')
+
+    def handle(self, *args, **options):
+        saved_settings = copy.deepcopy(connection.settings_dict)
+        with tempfile.TemporaryDirectory() as tmp:
+            # The report renders pages against a scratch database of its own. Its name
+            # never matches an existing (test) database, which is therefore never dropped.
+            if connection.vendor == 'sqlite':
+                scratch_name = os.path.join(tmp, 'report.sqlite3')
+            else:
+                scratch_name = f'{saved_settings["NAME"]}_static_report_{os.getpid()}'
+            connection.settings_dict['TEST'] = {**saved_settings['TEST'], 'NAME': scratch_name}
+            try:
+                old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+            except BaseException:
+                self.restore_connection(saved_settings)
+                raise
+            try:
+                url = reverse(options['page'])
+                development = {**settings.STORAGES, 'staticfiles': {
+                    'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+                production = {**settings.STORAGES, 'staticfiles': {
+                    'BACKEND': 'library.static.CompressedManifestStaticFilesStorage'}}
+                with override_settings(LIBRARY_STATIC_MODE='development', STORAGES=development):
+                    before = self.visit(url, production=False)
+                # Hashed names are only used with DEBUG off, as in a real deployment.
+                with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost'], LIBRARY_STATIC_MODE='production',
+                                       STATIC_ROOT=os.path.join(tmp, 'static'), STORAGES=production):
+                    call_command('collectstatic', interactive=False, verbosity=0)
+                    after = self.visit(url, production=True)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                self.restore_connection(saved_settings)
+
+        self.stdout.write(f'{url}  (modelled network: {options["rtt_ms"]:.0f} ms RTT, {options["kbps"]:.0f} kbit/s)')
+        for label, report in (('development', before), ('production', after)):
+            self.stdout.write(f'\n{label}:')
+            for asset_url, size, encoding, cache_control, blocking in report['assets']:
+                flags = ', '.join(filter(None, (encoding, 'render-blocking' if blocking else '', cache_control)))
+                self.stdout.write(f'  {size:>9,} B  {asset_url}  {f"({flags})" if flags else ""}')
+            first_bytes = report['html'] + sum(asset[1] for asset in report['assets'])
+            repeat_requests = sum(1 for asset in report['assets'] if 'immutable' not in asset[3])
+            self.stdout.write(f'  first visit:  {first_bytes:>9,} B in {len(report["assets"]) + 1} requests, '
+                              f'first paint ~{self.first_paint(report, options, repeat=False):.0f} ms')
+            self.stdout.write(f'  repeat visit: {report["html"]:>9,} B in {repeat_requests + 1} requests, '
+                              f'first paint ~{self.first_paint(report, options, repeat=True):.0f} ms')
+
+    def restore_connection(self, saved_settings):
+        """Puts back the connection settings that creating the scratch database changed."""
+        connection.close()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(saved_settings)
+
+    def visit(self, url, production):
+        """The page's HTML size and (url, bytes, encoding, cache-control, render-blocking) per static asset."""
+        client = Client(SERVER_NAME='localhost', HTTP_ACCEPT_ENCODING='br, gzip')
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}.')
+        html = response.content.decode()
+        head_end = html.find('</head>')
+        assets = []
+        for match in ASSET_RE.finditer(html):
+            tag, before_attrs, asset_url, after_attrs = match.groups()
+            if not asset_url.startswith(settings.STATIC_URL):
+                continue
+            attrs = before_attrs + after_attrs
+            blocking = match.start() < head_end and (
+                (tag == 'link' and 'stylesheet' in attrs) or (tag == 'script' and not re.search(r'\b(async|defer)\b', attrs)))
+            if production:
+                asset = client.get(asset_url)
+                if asset.status_code != 200:
+                    raise CommandError(f'{asset_url} returned {asset.status_code}.')
+                size = sum(len(chunk) for chunk in asset.streaming_content)
+                encoding, cache_control = asset.get('Content-Encoding', ''), asset.get('Cache-Control', '')
+            else:
+                path = finders.find(asset_url[len(settings.STATIC_URL):])
+                if path is None:
+                    raise CommandError(f'{asset_url} not found by the static file finders.')
+                size, encoding, cache_control = os.path.getsize(path), '', ''  # runserver: no compression, no caching.
+            assets.append((asset_url, size, encoding, cache_control, blocking))
+        return {'html': len(response.content), 'assets': assets}
+
+    def first_paint(self, report, options, repeat):
+        """Connection + HTML, then the render-blocking assets in parallel over the shared link."""
+        rtt, bytes_per_ms = options['rtt_ms'], options['kbps'] * 1000 / 8 / 1000
+        elapsed = 2 * rtt + report['html'] / bytes_per_ms
+        blocking = [asset for asset in report['assets'] if asset[4]]
+        if repeat:
+            blocking = [asset for asset in blocking if 'immutable' not in asset[3]]
+            return elapsed + (rtt if blocking else 0)  # Revalidation: a round trip, no body.
+        if blocking:
+            elapsed += rtt + sum(asset[1] for asset in blocking) / bytes_per_ms
+        return elapsed
@@ -0,0 +1,167 @@
+"""In-process request metrics, exposed in Prometheus text format at /metrics.
+
+RequestMetricsMiddleware opens a RequestStats for every request; the query
+observer (installed on each new connection by library.db) adds every SQL
+statement's duration to it, wherever the ORM runs it: the contextvar is
+carried into the sync_to_async threads used by async views. When the response
+is ready the totals are folded into per-view aggregates under one lock.
+
+Metrics are per process. With several server processes, scrape each one (or
+sum them in Prometheus).
+"""
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('library.metrics')
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LOGGED_QUERIES = 50
+
+_current = contextvars.ContextVar('library_request_stats', default=None)
+_lock = threading.Lock()
+_views = {}            # view name -> ViewMetrics
+_responses = {}        # (view name, method, status) -> count
+_cache_lookups = {}    # (cache name, 'hit' | 'miss') -> count
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'statements')
+
+    def __init__(self, keep_sql):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = [] if keep_sql else None
+
+
+class ViewMetrics:
+    __slots__ = ('buckets', 'count', 'latency_sum', 'queries', 'query_time', 'response_bytes')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.response_bytes = 0
+
+
+def _slow_request_logging_enabled():
+    return settings.LIBRARY_SLOW_REQUEST_MS is not None or settings.LIBRARY_SLOW_REQUEST_QUERIES is not None
+
+
+def start_request():
+    """Starts collecting query stats for the current request; returns (stats, token for end_request)."""
+    stats = RequestStats(keep_sql=_slow_request_logging_enabled())
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def query_observer(execute, sql, params, many, context):
+    """connection.execute_wrapper hook: times each statement for the current request, if any."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - started
+        if stats.statements is not None and len(stats.statements) < MAX_LOGGED_QUERIES:
+            stats.statements.append(sql)
+
+
+def record_cache_lookup(cache_name, hit):
+    key = (cache_name, 'hit' if hit else 'miss')
+    with _lock:
+        _cache_lookups[key] = _cache_lookups.get(key, 0) + 1
+
+
+def record_request(view, method, status, latency, response_bytes, stats):
+    """Folds one finished request into the aggregates and logs it if it broke a budget."""
+    with _lock:
+        metrics = _views.get(view)
+        if metrics is None:
+            metrics = _views[view] = ViewMetrics()
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                metrics.buckets[i] += 1
+                break
+        metrics.count += 1
+        metrics.latency_sum += latency
+        metrics.queries += stats.queries
+        metrics.query_time += stats.query_time
+        metrics.response_bytes += response_bytes
+        key = (view, method, status)
+        _responses[key] = _responses.get(key, 0) + 1
+
+    if stats.statements is not None:
+        slow_ms, max_queries = settings.LIBRARY_SLOW_REQUEST_MS, settings.LIBRARY_SLOW_REQUEST_QUERIES
+        if (slow_ms is not None and latency * 1000 > slow_ms) or \
+                (max_queries is not None and stats.queries > max_queries):
+            logger.warning('Slow request %s %s: %.1f ms, %d queries (%.1f ms in SQL)\n%s',
+                           method, view, latency * 1000, stats.queries, stats.query_time * 1000,
+                           '\n'.join(stats.statements))
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _responses.clear()
+        _cache_lookups.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_prometheus():
+    """Returns all metrics in the Prometheus text exposition format."""
+    with _lock:
+        views = {view: (list(m.buckets), m.count, m.latency_sum, m.queries, m.query_time, m.response_bytes)
+                 for view, m in _views.items()}
+        responses = dict(_responses)
+        cache_lookups = dict(_cache_lookups)
+
+    lines = [
+        '# HELP library_request_duration_seconds Request latency by view.',
+        '# TYPE library_request_duration_seconds histogram',
+    ]
+    for view, (buckets, count, latency_sum, *_) in sorted(views.items()):
+        cumulative = 0
+        for bound, in_bucket in zip(LATENCY_BUCKETS, buckets):
+            cumulative += in_bucket
+            lines.append(f'library_request_duration_seconds_bucket{{view="{_label(view)}",le="{bound}"}} {cumulative}')
+        lines.append(f'library_request_duration_seconds_bucket{{view="{_label(view)}",le="+Inf"}} {count}')
+        lines.append(f'library_request_duration_seconds_sum{{view="{_label(view)}"}} {latency_sum:.6f}')
+        lines.append(f'library_request_duration_seconds_count{{view="{_label(view)}"}} {count}')
+
+    for name, index, kind, help_text in (
+        ('library_db_queries_total', 3, 'counter', 'SQL statements executed, by view.'),
+        ('library_db_query_seconds_total', 4, 'counter', 'Time spent in SQL, by view.'),
+        ('library_response_bytes_total', 5, 'counter', 'Response body bytes (non-streaming responses), by view.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for view, values in sorted(views.items()):
+            value = values[index]
+            lines.append(f'{name}{{view="{_label(view)}"}} {value:.6f}' if isinstance(value, float)
+                         else f'{name}{{view="{_label(view)}"}} {value}')
+
+    lines += ['# HELP library_responses_total Responses by view, method and status.',
+              '# TYPE library_responses_total counter']
+    for (view, method, status), count in sorted(responses.items()):
+        lines.append(f'library_responses_total{{view="{_label(view)}",method="{method}",status="{status}"}} {count}')
+
+    lines += ['# HELP library_cache_lookups_total Cache lookups by cache and result.',
+              '# TYPE library_cache_lookups_total counter']
+    for (cache_name, result), count in sorted(cache_lookups.items()):
+        lines.append(f'library_cache_lookups_total{{cache="{cache_name}",result="{result}"}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Kept in step with library.search (SEARCH_TABLE / CREATE_TABLE_SQL); migrations
+# carry their own copy so later edits to that module can't change history.
+CREATE_SEARCH_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS library_book_search USING fts5("
+    "book_name, author, description, categories, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+POPULATE_SEARCH_TABLE = (
+    "INSERT INTO library_book_search (rowid, book_name, author, description, categories) "
+    "SELECT b.id, b.book_name, b.author, b.description, "
+    "COALESCE((SELECT group_concat(c.name, ' ') FROM library_book_categories bc "
+    "JOIN library_category c ON c.id = bc.category_id WHERE bc.book_id = b.id), '') "
+    "FROM library_book b"
+)
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return  # Other databases use the icontains fallback in library.catalog.
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(POPULATE_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS library_book_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_remove_book_cover_image_path_book_cover_image_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='borrowedbook',
+            constraint=models.UniqueConstraint(condition=models.Q(('return_date__isnull', True)), fields=('user', 'book'), name='unique_open_loan_per_user_book'),
+        ),
+    ]
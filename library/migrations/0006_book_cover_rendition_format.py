@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_rendition_format',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+    ]
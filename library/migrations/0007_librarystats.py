@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:00
+
+from django.db import migrations, models
+from django.db.models.functions import Least
+
+
+def populate_stats(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    BorrowedBook = apps.get_model('library', 'BorrowedBook')
+    User = apps.get_model('library', 'User')
+    LibraryStats = apps.get_model('library', 'LibraryStats')
+    LibraryStats.objects.create(
+        pk=1,
+        total_books=Book.objects.count(),
+        # As library.stats.compute_stats: never more copies than exist.
+        available_copies=Book.objects.aggregate(total=models.Sum(Least('available_copies', 'total_copies')))['total'] or 0,
+        borrowed_books=BorrowedBook.objects.filter(return_date__isnull=True).count(),
+        total_users=User.objects.count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_book_cover_rendition_format'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_books', models.IntegerField(default=0)),
+                ('available_copies', models.IntegerField(default=0)),
+                ('borrowed_books', models.IntegerField(default=0)),
+                ('total_users', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'library stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_librarystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to='library.book')),
+                ('related_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score'], name='bookaffinity_book_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'related_book'), name='unique_book_affinity')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryTopBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='top_books', to='library.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', '-score'], name='categorytop_category_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'book'), name='unique_category_top_book')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_recommendation_tables'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='available_copies',
+            field=models.PositiveIntegerField(db_index=True, default=1),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='book_name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['book'], name='borrowedbook_open_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['due_date'], name='borrowedbook_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(condition=models.Q(('return_date__isnull', False)), fields=['user', '-return_date'], name='borrowedbook_returned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(fields=['user', '-borrow_date'], name='borrowedbook_user_recent_idx'),
+        ),
+    ]
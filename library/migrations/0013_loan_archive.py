@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_availability_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowedBookArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrow_date', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('return_date', models.DateTimeField()),
+                ('fine_amount', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='library.book')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-return_date'], name='loanarchive_user_returned_idx'), models.Index(fields=['book', '-return_date'], name='loanarchive_book_returned_idx'), models.Index(fields=['-return_date'], name='loanarchive_returned_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+
+from .renditions import rendition_name
 
 class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
@@ -16,8 +19,8 @@ class Category(models.Model):
 class Book(models.Model):
 
     book_id_json = models.CharField(max_length=20, unique=True, help_text="Corresponds to bookId in original JSON") 
-    book_name = models.CharField(max_length=255)
-    author = models.CharField(max_length=255)
+    book_name = models.CharField(max_length=255, db_index=True)
+    author = models.CharField(max_length=255, db_index=True)
     categories = models.ManyToManyField(Category, related_name='books')
     description = models.TextField()
     publisher = models.CharField(max_length=255, blank=True, null=True)
@@ -26,9 +29,22 @@ class Book(models.Model):
     pages = models.IntegerField(blank=True, null=True)
     isbn = models.CharField(max_length=20, unique=True, blank=True, null=True)
     cover_image_file = models.ImageField(upload_to='book_covers/', blank=True, null=True, verbose_name="Cover Image File")
+    cover_rendition_format = models.CharField(max_length=4, blank=True, default='', editable=False) # Format library.renditions built the resized covers in; empty until then
     
     total_copies = models.PositiveIntegerField(default=1)
-    available_copies = models.PositiveIntegerField(default=1)
+    available_copies = models.PositiveIntegerField(default=1, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded value so library.stats can apply the delta on save.
+        instance._loaded_available_copies = instance.__dict__.get('available_copies')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_available_copies = self.__dict__.get('available_copies')
 
     @property
     def cover_image_url(self):
@@ -36,6 +52,21 @@ class Book(models.Model):
             return self.cover_image_file.url
         return None 
         
+    def cover_rendition_url(self, size):
+        """URL of a resized cover, falling back to the original until renditions exist."""
+        if self.cover_image_file and self.cover_rendition_format:
+            name = rendition_name(self.cover_image_file.name, size, self.cover_rendition_format)
+            return self.cover_image_file.storage.url(name)
+        return self.cover_image_url
+
+    @property
+    def cover_card_url(self):
+        return self.cover_rendition_url('card')
+
+    @property
+    def cover_detail_url(self):
+        return self.cover_rendition_url('detail')
+
     @property
     def is_available(self):
         return self.available_copies > 0
@@ -49,10 +80,182 @@ class BorrowedBook(models.Model):
     borrow_date = models.DateTimeField(auto_now_add=True)
     due_date = models.DateTimeField() # To be calculated upon borrowing
     return_date = models.DateTimeField(null=True, blank=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True) # Set by the overdue reminder job
+    fine_amount = models.DecimalField(max_digits=8, decimal_places=2, default=0) # Accrued by the fines job
+
+    class Meta:
+        constraints = [
+            # A user can hold at most one open loan per book.
+            models.UniqueConstraint(
+                fields=['user', 'book'], condition=models.Q(return_date__isnull=True),
+                name='unique_open_loan_per_user_book',
+            ),
+        ]
+        # Open loans per user are served by the partial unique index above.
+        indexes = [
+            models.Index(fields=['book'], condition=models.Q(return_date__isnull=True),
+                         name='borrowedbook_open_book_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(return_date__isnull=True),
+                         name='borrowedbook_open_due_idx'),
+            models.Index(fields=['user', '-return_date'], condition=models.Q(return_date__isnull=False),
+                         name='borrowedbook_returned_idx'),
+            models.Index(fields=['user', '-borrow_date'], name='borrowedbook_user_recent_idx'),
+        ]
     
     @property
     def is_returned(self):
         return self.return_date is not None
 
     def __str__(self):
-        return f"{self.user.username} borrowed {self.book.book_name}"
\ No newline at end of file
+        return f"{self.user.username} borrowed {self.book.book_name}"
+
+class BorrowedBookArchive(models.Model):
+    """Returned loans moved out of BorrowedBook by ``manage.py archive_loans`` (see library.archive)."""
+    id = models.BigIntegerField(primary_key=True) # The BorrowedBook pk, kept so exports and links stay stable
+    # Not indexed on their own: the (user|book, -return_date) indexes below lead with them.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_loans', db_index=False)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_loans', db_index=False)
+    borrow_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    return_date = models.DateTimeField()
+    fine_amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-return_date'], name='loanarchive_user_returned_idx'),
+            models.Index(fields=['book', '-return_date'], name='loanarchive_book_returned_idx'),
+            models.Index(fields=['-return_date'], name='loanarchive_returned_idx'),
+        ]
+
+    @property
+    def is_returned(self):
+        return True
+
+    def __str__(self):
+        return f"{self.user.username} borrowed {self.book.book_name} (archived)"
+
+class BookAffinity(models.Model):
+    """Precomputed "readers of book also borrowed related_book" scores (see library.recommendations)."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='affinities')
+    related_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'related_book'], name='unique_book_affinity'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-score'], name='bookaffinity_book_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.related_book_id} ({self.score:.3f})"
+
+class CategoryTopBook(models.Model):
+    """Most-borrowed books per category, precomputed for category-based suggestions."""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='top_books')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'book'], name='unique_category_top_book'),
+        ]
+        indexes = [
+            models.Index(fields=['category', '-score'], name='categorytop_category_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id}: {self.book_id} ({self.score:.0f})"
+
+class LibraryStats(models.Model):
+    """Single-row table of dashboard counters, kept current by library.stats."""
+    total_books = models.IntegerField(default=0)
+    available_copies = models.IntegerField(default=0)
+    borrowed_books = models.IntegerField(default=0)
+    total_users = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "library stats"
+
+    def __str__(self):
+        return f"{self.total_books} books, {self.borrowed_books} on loan"
+
+
+class Task(models.Model):
+    """A unit of background work run by ``manage.py run_worker`` (see library.tasks)."""
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    unique_key = models.CharField(max_length=100, null=True, blank=True) # At most one queued task per key
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True) # Lease; expired leases are reclaimed
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'], condition=models.Q(status__in=['pending', 'running']),
+                name='unique_queued_task_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['run_at'], condition=models.Q(status='pending'), name='task_pending_run_at_idx'),
+            models.Index(fields=['locked_until'], condition=models.Q(status='running'), name='task_running_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class Hold(models.Model):
+    """A reader's place in the queue for a book with no copy on the shelf (see library.holds)."""
+    WAITING, READY, FULFILLED, CANCELLED, EXPIRED = 'waiting', 'ready', 'fulfilled', 'cancelled', 'expired'
+    STATUS_CHOICES = [(WAITING, 'Waiting'), (READY, 'Ready for pickup'), (FULFILLED, 'Fulfilled'),
+                      (CANCELLED, 'Cancelled'), (EXPIRED, 'Expired')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    created_at = models.DateTimeField(default=timezone.now)
+    ready_at = models.DateTimeField(null=True, blank=True) # When a copy was reserved for this hold
+    expires_at = models.DateTimeField(null=True, blank=True) # Pickup deadline of a ready hold
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # A user can be in the queue for a book at most once.
+            models.UniqueConstraint(
+                fields=['user', 'book'], condition=models.Q(status__in=['waiting', 'ready']),
+                name='unique_active_hold_per_user_book',
+            ),
+        ]
+        indexes = [
+            # Next in line for a book: one seek, whatever the length of the queue.
+            models.Index(fields=['book', 'created_at'], condition=models.Q(status='waiting'),
+                         name='hold_queue_idx'),
+            models.Index(fields=['expires_at'], condition=models.Q(status='ready'), name='hold_ready_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.book_id} ({self.status})"
+
+
+class AvailabilityChange(models.Model):
+    """Availability events shared between server processes when LIBRARY_EVENTS_BACKEND is 'db' (see library.events)."""
+    book_id_json = models.CharField(max_length=20)
+    available_copies = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True) # Rows are pruned after LIBRARY_EVENTS_RETENTION
+
+    def __str__(self):
+        return f"{self.book_id_json}: {self.available_copies}"
@@ -0,0 +1,95 @@
+"""Overdue-loan jobs run by the task queue (see library.tasks).
+
+Every job walks open loans in primary-key order, CHUNK_SIZE rows at a time,
+using the partial open-loans-by-due-date index, so memory use does not
+depend on how many loans are open.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from . import tasks
+from .models import BorrowedBook
+
+CHUNK_SIZE = 500
+
+
+def _overdue_loans(now):
+    return BorrowedBook.objects.filter(return_date__isnull=True, due_date__lt=now)
+
+
+def _chunks(queryset, fields):
+    """Yields lists of .values() rows in pk order, CHUNK_SIZE at a time."""
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values(*fields)[:CHUNK_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1]['pk']
+
+
+@tasks.task('detect_overdue_loans', every=timedelta(hours=1))
+def detect_overdue_loans():
+    """Queues one reminder task per chunk of overdue loans that have not been reminded yet."""
+    now = timezone.now()
+    pending = _overdue_loans(now).filter(reminder_sent_at__isnull=True)
+    queued = 0
+    for rows in _chunks(pending, ['pk']):
+        # While a chunk's task is still queued (workers behind), the next hourly run doesn't queue it again.
+        tasks.enqueue('send_overdue_reminders', {'loan_pks': [row['pk'] for row in rows]},
+                      unique_key=f'overdue-reminders:{rows[0]["pk"]}')
+        queued += len(rows)
+    return queued
+
+
+@tasks.task('send_overdue_reminders')
+def send_overdue_reminders(loan_pks):
+    """Emails the borrowers of the given loans (skipping any already reminded or returned)."""
+    # Loans are claimed with one conditional UPDATE before sending, so two tasks
+    # covering the same loans never both email them.
+    claimed_at = timezone.now()
+    BorrowedBook.objects.filter(pk__in=loan_pks, return_date__isnull=True, reminder_sent_at__isnull=True)\
+                        .exclude(user__email='').update(reminder_sent_at=claimed_at)
+    loans = BorrowedBook.objects.filter(pk__in=loan_pks, reminder_sent_at=claimed_at).select_related('user', 'book')
+    messages, sent_pks = [], []
+    for loan in loans:
+        messages.append(EmailMessage(
+            subject=f'Overdue: "{loan.book.book_name}"',
+            body=(f'Hello {loan.user.username},\n\n'
+                  f'"{loan.book.book_name}" was due on {loan.due_date:%b %d, %Y}. '
+                  f'Please return it as soon as you can; a fine of {settings.LIBRARY_FINE_PER_DAY} '
+                  f'per day applies to overdue loans.\n'),
+            to=[loan.user.email],
+        ))
+        sent_pks.append(loan.pk)
+    if messages:
+        try:
+            get_connection().send_messages(messages)  # One backend connection for the whole chunk.
+        except Exception:
+            # Release the claim so the retry (or the next detect run) sends them.
+            BorrowedBook.objects.filter(pk__in=sent_pks, reminder_sent_at=claimed_at).update(reminder_sent_at=None)
+            raise
+    return len(sent_pks)
+
+
+def fine_for(due_date, now):
+    """Fine for a loan that is still out at ``now``: a daily rate for each full day late, capped."""
+    days_late = max((now - due_date).days, 0)
+    return min(settings.LIBRARY_FINE_PER_DAY * days_late, settings.LIBRARY_FINE_CAP).quantize(Decimal('0.01'))
+
+
+@tasks.task('accrue_fines', every=timedelta(days=1))
+def accrue_fines():
+    """Brings fine_amount of every overdue open loan up to date."""
+    now = timezone.now()
+    updated = 0
+    for rows in _chunks(_overdue_loans(now), ['pk', 'due_date', 'fine_amount']):
+        changed = [BorrowedBook(pk=row['pk'], fine_amount=fine) for row in rows
+                   if (fine := fine_for(row['due_date'], now)) != row['fine_amount']]
+        BorrowedBook.objects.bulk_update(changed, ['fine_amount'])
+        updated += len(changed)
+    return updated
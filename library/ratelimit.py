@@ -0,0 +1,200 @@
+"""Token-bucket rate limiting, checked before a view does any hashing or ORM work.
+
+A scope in LIBRARY_RATE_LIMITS (settings) lists the buckets a request must
+get a token from: ``(key, rate, burst)`` where key is 'ip', 'username' (from
+the JSON body, for the auth APIs) or 'user' (the logged-in user, else the IP),
+rate is tokens refilled per second and burst is the bucket size. Use the
+rate_limit(scope) decorator on a view; RateLimitMiddleware applies the
+'unsafe' scope to every POST/PUT/PATCH/DELETE before sessions are loaded.
+
+Buckets live in the 'ratelimit' cache so every process sharing that cache
+shares the limits. Each bucket is two counters, for the current and previous
+refill period (burst / rate seconds), and a request costs one cache.incr(),
+one touch() and one get(). The tokens left are estimated by weighting the
+previous period's count by how much of it still overlaps the last period,
+which follows a token bucket closely with nothing to read, modify and write
+back. Rejected requests are counted too, so a client that keeps hammering
+stays limited until it backs off.
+
+How exact the limits are depends on the cache's incr(). Redis
+(LIBRARY_RATELIMIT_REDIS_URL) and local memory increment atomically, but local
+memory limits each process separately. The file backend shares counters
+between processes with a get and a set, so concurrent requests can overwrite
+each other's increments and limits there are best-effort: a burst of parallel
+requests may get a few more tokens than the bucket holds.
+"""
+import hashlib
+import json
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+UNSAFE_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+
+
+class TokenBucket:
+    """`burst` tokens, refilled at `rate` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.period = burst / rate  # Seconds to refill an empty bucket.
+
+    def _keys(self, key, now):
+        slot = int(now // self.period)
+        return f'{key}:{slot}', f'{key}:{slot - 1}', now / self.period - slot
+
+    def _wait(self, spent, previous, elapsed):
+        """0 if the token taken was available, else seconds until one is."""
+        tokens_used = previous * (1 - elapsed) + spent
+        return 0 if tokens_used <= self.burst else (tokens_used - self.burst) / self.rate
+
+    def take(self, cache, key, now=None):
+        current_key, previous_key, elapsed = self._keys(key, time.time() if now is None else now)
+        timeout = math.ceil(self.period * 2) + 1
+        try:
+            spent = cache.incr(current_key)
+        except ValueError:  # First request of this period.
+            cache.add(current_key, 0, timeout=timeout)
+            spent = cache.incr(current_key)
+        # The generic incr() (file backend) stores the count with the default
+        # 300 second timeout; longer periods would forget it before they end.
+        cache.touch(current_key, timeout)
+        return self._wait(spent, cache.get(previous_key, 0), elapsed)
+
+    async def atake(self, cache, key, now=None):
+        current_key, previous_key, elapsed = self._keys(key, time.time() if now is None else now)
+        timeout = math.ceil(self.period * 2) + 1
+        try:
+            spent = await cache.aincr(current_key)
+        except ValueError:
+            await cache.aadd(current_key, 0, timeout=timeout)
+            spent = await cache.aincr(current_key)
+        await cache.atouch(current_key, timeout)
+        return self._wait(spent, await cache.aget(previous_key, 0), elapsed)
+
+
+_buckets = {}   # (rate, burst) -> TokenBucket
+
+
+def rules_for(scope):
+    """[(key, TokenBucket)] for a scope in LIBRARY_RATE_LIMITS; empty when limiting is off."""
+    if not settings.LIBRARY_RATE_LIMITS_ENABLED:
+        return []
+    rules = []
+    for key, rate, burst in settings.LIBRARY_RATE_LIMITS.get(scope, ()):
+        bucket = _buckets.get((rate, burst))
+        if bucket is None:
+            bucket = _buckets[(rate, burst)] = TokenBucket(rate, burst)
+        rules.append((key, bucket))
+    return rules
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _username(request):
+    try:
+        username = json.loads(request.body).get('username')
+    except (ValueError, AttributeError):
+        return None
+    return username.lower() if isinstance(username, str) and username else None
+
+
+def _identity(request, key, user):
+    if key == 'ip':
+        return client_ip(request)
+    if key == 'username':
+        return _username(request)
+    if key == 'user':
+        return f'u{user.pk}' if user is not None and user.is_authenticated else client_ip(request)
+    raise ValueError(f'Unknown rate limit key {key!r}.')
+
+
+def _cache_key(scope, key, identity):
+    digest = hashlib.md5(identity.encode(), usedforsecurity=False).hexdigest()
+    return f'ratelimit:{scope}:{key}:{digest}'
+
+
+def check(request, scope, rules=None):
+    """Takes a token from every bucket of the scope; returns 0, or the seconds to wait."""
+    cache = caches['ratelimit']
+    for key, bucket in rules_for(scope) if rules is None else rules:
+        identity = _identity(request, key, getattr(request, 'user', None) if key == 'user' else None)
+        if identity is not None:
+            wait = bucket.take(cache, _cache_key(scope, key, identity))
+            if wait:
+                return wait
+    return 0
+
+
+async def acheck(request, scope, rules=None):
+    """Async version of check."""
+    cache = caches['ratelimit']
+    for key, bucket in rules_for(scope) if rules is None else rules:
+        user = await request.auser() if key == 'user' and hasattr(request, 'auser') else None
+        identity = _identity(request, key, user)
+        if identity is not None:
+            wait = await bucket.atake(cache, _cache_key(scope, key, identity))
+            if wait:
+                return wait
+    return 0
+
+
+def too_many_requests(wait):
+    retry_after = max(math.ceil(wait), 1)
+    response = JsonResponse({'success': False, 'message': f'Too many requests. Try again in {retry_after} seconds.'},
+                            status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope):
+    """View decorator: answers 429 when the request gets no token from the scope's buckets."""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                wait = await acheck(request, scope)
+                return too_many_requests(wait) if wait else await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapped(request, *args, **kwargs):
+                wait = check(request, scope)
+                return too_many_requests(wait) if wait else view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+class RateLimitMiddleware:
+    """Applies the 'unsafe' scope to every state-changing request, ahead of sessions and views."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.method in UNSAFE_METHODS:
+            wait = check(request, 'unsafe')
+            if wait:
+                return too_many_requests(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method in UNSAFE_METHODS:
+            wait = await acheck(request, 'unsafe')
+            if wait:
+                return too_many_requests(wait)
+        return await self.get_response(request)
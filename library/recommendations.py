@@ -0,0 +1,136 @@
+"""Book suggestions for the user dashboard.
+
+Suggestions come from two tables rebuilt periodically by ``manage.py
+build_recommendations`` from the loan history, archived loans included:
+
+* BookAffinity: for each book, the books most often borrowed by the same
+  readers (cosine-normalised co-borrow counts).
+* CategoryTopBook: the most borrowed books in each category.
+
+At request time only indexed lookups keyed on the user's recent books are
+made. When those yield too few available books the remainder is sampled
+from a random primary-key position instead of ``ORDER BY RANDOM()``, so the
+cost does not grow with the size of the catalog.
+"""
+import heapq
+import math
+import random
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+
+from .archive import HISTORY_SQL
+from .models import Book, BookAffinity, BorrowedBook, CategoryTopBook
+
+RECENT_HISTORY = 10     # Recent loans used as seeds for a user's suggestions.
+CANDIDATE_POOL = 50     # Candidates fetched per source before filtering.
+DEFAULT_TOP_N = 20      # Neighbours kept per book / category when building.
+
+
+def _top_n_per_key(rows, top_n):
+    """Groups (key, item, score) rows and keeps the top_n items per key by score."""
+    heaps = defaultdict(list)
+    for key, item, score in rows:
+        heap = heaps[key]
+        if len(heap) < top_n:
+            heapq.heappush(heap, (score, item))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, item))
+    return heaps
+
+
+def build_book_affinity(top_n=DEFAULT_TOP_N):
+    """Recomputes BookAffinity from co-borrowing and returns the number of rows written."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'WITH loans AS ({HISTORY_SQL}) SELECT book_id, COUNT(DISTINCT user_id) FROM loans GROUP BY book_id')
+        readers = dict(cursor.fetchall())
+        cursor.execute(
+            f'WITH loans AS ({HISTORY_SQL}) SELECT a.book_id, b.book_id, COUNT(DISTINCT a.user_id) '
+            f'FROM loans a JOIN loans b ON a.user_id = b.user_id AND a.book_id <> b.book_id '
+            f'GROUP BY a.book_id, b.book_id'
+        )
+        pairs = (
+            (book, related, shared / math.sqrt(readers[book] * readers[related]))
+            for book, related, shared in cursor
+        )
+        neighbours = _top_n_per_key(pairs, top_n)
+
+    rows = [BookAffinity(book_id=book, related_book_id=related, score=score)
+            for book, heap in neighbours.items() for score, related in heap]
+    with transaction.atomic():
+        BookAffinity.objects.all().delete()
+        BookAffinity.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def build_category_top_books(top_n=DEFAULT_TOP_N):
+    """Recomputes CategoryTopBook from borrow counts and returns the number of rows written."""
+    through = Book.categories.through._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH loans AS ({HISTORY_SQL}) SELECT bc.category_id, bc.book_id, COUNT(*) FROM {through} bc '
+            f'JOIN loans l ON l.book_id = bc.book_id GROUP BY bc.category_id, bc.book_id'
+        )
+        top_books = _top_n_per_key(cursor, top_n)
+
+    rows = [CategoryTopBook(category_id=category, book_id=book, score=score)
+            for category, heap in top_books.items() for score, book in heap]
+    with transaction.atomic():
+        CategoryTopBook.objects.all().delete()
+        CategoryTopBook.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def _candidate_ids(user):
+    """Ranked candidate book pks from the user's recent loans (affinity first, then categories)."""
+    recent = list(BorrowedBook.objects.filter(user=user).order_by('-borrow_date')
+                                      .values_list('book_id', flat=True)[:RECENT_HISTORY])
+    if not recent:
+        return [], set()
+
+    scored = BookAffinity.objects.filter(book_id__in=recent).values('related_book_id')\
+                                 .annotate(total=Sum('score')).order_by('-total')[:CANDIDATE_POOL]
+    candidates = [row['related_book_id'] for row in scored]
+
+    category_ids = Book.categories.through.objects.filter(book_id__in=recent)\
+                                                  .values_list('category_id', flat=True).distinct()
+    popular = CategoryTopBook.objects.filter(category_id__in=category_ids).values('book_id')\
+                                     .annotate(total=Sum('score')).order_by('-total')[:CANDIDATE_POOL]
+    candidates += [row['book_id'] for row in popular]
+    return candidates, set(recent)
+
+
+def _random_available(limit, exclude):
+    """Samples available books starting at a random pk, wrapping around once."""
+    bounds = Book.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    pivot = random.randint(bounds['low'], bounds['high'])
+    available = Book.objects.filter(available_copies__gt=0).exclude(pk__in=exclude)
+    picked = list(available.filter(pk__gte=pivot).order_by('pk')[:limit])
+    if len(picked) < limit:
+        picked += list(available.filter(pk__lt=pivot).order_by('pk')[:limit - len(picked)])
+    return picked
+
+
+def suggest_books(user, limit=3, exclude=()):
+    """Returns up to ``limit`` available Books for user, excluding pks in ``exclude``."""
+    excluded = set(exclude)
+    candidates, recent = _candidate_ids(user)
+    excluded |= recent
+
+    ordered = []
+    for pk in candidates:
+        if pk not in excluded and pk not in ordered:
+            ordered.append(pk)
+    suggestions = []
+    if ordered:
+        available = Book.objects.in_bulk(ordered)
+        suggestions = [available[pk] for pk in ordered
+                       if pk in available and available[pk].available_copies > 0][:limit]
+
+    if len(suggestions) < limit:
+        excluded |= {book.pk for book in suggestions}
+        suggestions += _random_available(limit - len(suggestions), excluded)
+    return suggestions
@@ -0,0 +1,132 @@
+"""Size-specific cover renditions generated with Pillow.
+
+Each uploaded cover gets one derivative per entry in RENDITION_SIZES, stored
+next to the original under a deterministic name (``book_covers/renditions/
+<filename>_<size>.<ext>``, keeping the original extension so a.jpg and a.png
+don't share renditions), so URLs can be computed from the cover name and
+format. ``Book.cover_rendition_format`` records the format they were built in,
+so changing LIBRARY_COVER_RENDITION_FORMAT never points pages at files that
+don't exist; until renditions exist pages keep serving the original upload.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+# Bounding boxes (width, height); images keep their aspect ratio inside them.
+RENDITION_SIZES = {
+    'list': (120, 180),
+    'card': (300, 450),
+    'detail': (600, 900),
+}
+FORMAT_OPTIONS = {
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def rendition_format():
+    return settings.LIBRARY_COVER_RENDITION_FORMAT
+
+
+def rendition_urls(cover_name, storage, fmt):
+    """Maps each rendition size to its public URL for a cover with renditions in format fmt."""
+    return {size: storage.url(rendition_name(cover_name, size, fmt)) for size in RENDITION_SIZES}
+
+
+def srcset(urls):
+    """Formats rendition URLs as an <img srcset> value."""
+    return ', '.join(f'{urls[size]} {RENDITION_SIZES[size][0]}w' for size in RENDITION_SIZES)
+
+
+def rendition_name(cover_name, size, fmt=None):
+    """Storage name of the given size of a cover, e.g. book_covers/renditions/book1.jpg_card.webp."""
+    extension = FORMAT_OPTIONS[fmt or rendition_format()][0]
+    directory, filename = os.path.split(cover_name)
+    return f'{directory}/renditions/{filename}_{size}.{extension}'
+
+
+def render(source, size, fmt=None):
+    """Returns the encoded bytes of one rendition of the image file object ``source``."""
+    fmt = fmt or rendition_format()
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        image.thumbnail(RENDITION_SIZES[size], Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, fmt, **FORMAT_OPTIONS[fmt][1])
+    return buffer.getvalue()
+
+
+def generate_renditions(cover_name, storage, fmt=None):
+    """Writes every rendition of cover_name into storage, replacing stale ones."""
+    with storage.open(cover_name, 'rb') as fh:
+        original = fh.read()
+    for size in RENDITION_SIZES:
+        name = rendition_name(cover_name, size, fmt)
+        content = render(io.BytesIO(original), size, fmt)
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(content))
+
+
+def generate_for_book(book_pk, cover_name):
+    """Builds a book's renditions in the configured format and records it, unless the cover changed meanwhile."""
+    from .cache import bump_catalog_version
+    from .models import Book
+
+    fmt = rendition_format()
+    storage = Book._meta.get_field('cover_image_file').storage
+    try:
+        generate_renditions(cover_name, storage, fmt)
+    except (OSError, Image.UnidentifiedImageError) as e:
+        logger.warning('Cover rendition error for %s: %s', cover_name, e)
+        return False
+    updated = Book.objects.filter(pk=book_pk, cover_image_file=cover_name).update(cover_rendition_format=fmt, updated_at=Now())
+    if updated:
+        bump_catalog_version()
+    return bool(updated)
+
+
+def _generate_in_worker(book_pk, cover_name):
+    try:
+        generate_for_book(book_pk, cover_name)
+    finally:
+        connection.close()  # Pool threads are long-lived; don't leave their connections open.
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LIBRARY_RENDITION_WORKERS,
+                                           thread_name_prefix='cover-renditions')
+        return _executor
+
+
+def schedule_renditions(book):
+    """Queues rendition generation for a newly uploaded cover once the transaction commits.
+
+    With LIBRARY_RENDITION_WORKERS = 0 the work runs inline after commit instead.
+    """
+    if not book.cover_image_file:
+        return
+    book_pk, cover_name = book.pk, book.cover_image_file.name
+
+    def submit():
+        if settings.LIBRARY_RENDITION_WORKERS:
+            _get_executor().submit(_generate_in_worker, book_pk, cover_name)
+        else:
+            generate_for_book(book_pk, cover_name)
+    transaction.on_commit(submit)
@@ -0,0 +1,137 @@
+"""Full-text search over the catalog using an SQLite FTS5 index.
+
+The ``library_book_search`` virtual table holds one row per book (rowid = Book pk)
+with the title, author, description and space-joined category names. It is kept
+in step with ``Book`` and its ``categories`` by the receivers in ``signals.py`` and
+can be rebuilt wholesale with ``manage.py rebuild_search_index``. On databases
+without FTS5 the catalog falls back to ``icontains`` filtering.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+SEARCH_TABLE = 'library_book_search'
+
+# Column filters for the book list's search_type options ('all' searches every column).
+SEARCH_COLUMNS = {
+    'title': ('book_name',),
+    'author': ('author',),
+    'category': ('categories',),
+    'all': ('book_name', 'author', 'description', 'categories'),
+}
+
+# bm25 weights in column order: book_name, author, description, categories.
+RANK_EXPRESSION = f'bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0, 3.0)'
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "book_name, author, description, categories, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+DROP_TABLE_SQL = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+# One statement that (re)indexes the books matching the WHERE clause appended to it.
+_INDEX_SELECT_SQL = (
+    f"INSERT INTO {SEARCH_TABLE} (rowid, book_name, author, description, categories) "
+    "SELECT b.id, b.book_name, b.author, b.description, "
+    "COALESCE((SELECT group_concat(c.name, ' ') FROM library_book_categories bc "
+    "JOIN library_category c ON c.id = bc.category_id WHERE bc.book_id = b.id), '') "
+    "FROM library_book b"
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_availability = {}
+
+
+def _availability_key(using):
+    return using, str(connections[using].settings_dict['NAME'])
+
+
+def is_search_available(using='default'):
+    """True when the database is SQLite and the FTS5 table has been created.
+
+    The answer is remembered per database so the introspection query runs once.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    key = _availability_key(using)
+    if not _availability.get(key):
+        _availability[key] = SEARCH_TABLE in conn.introspection.table_names()
+    return _availability[key]
+
+
+async def ais_search_available(using='default'):
+    """Async is_search_available(); only the introspection query leaves the event loop."""
+    if connections[using].vendor == 'sqlite' and _availability.get(_availability_key(using)):
+        return True
+    return await sync_to_async(is_search_available)(using)
+
+
+def build_match_expression(text, search_type='all'):
+    """Turns free text into an FTS5 MATCH expression, or None if it has no terms.
+
+    Every token is quoted (so user input can't inject FTS syntax) and treated
+    as a prefix, so "harr pot" matches "Harry Potter".
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    columns = SEARCH_COLUMNS.get(search_type, SEARCH_COLUMNS['all'])
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    return f'{{{" ".join(columns)}}} : ({terms})'
+
+
+def match_subquery_sql():
+    """SQL (one %s parameter: the MATCH expression) selecting matching book pks."""
+    return f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+
+
+def ranked_book_ids(text, search_type='all', limit=20, using='default'):
+    """Returns up to ``limit`` matching book pks, best bm25 match first."""
+    expression = build_match_expression(text, search_type)
+    if expression is None:
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'{match_subquery_sql()} ORDER BY {RANK_EXPRESSION} LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def index_books(book_pks, using='default'):
+    """Re-indexes the given books from their current rows (deleted books are just removed)."""
+    book_pks = list(book_pks)
+    if not book_pks or not is_search_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(book_pks), 500):
+            chunk = book_pks[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            cursor.execute(f'{_INDEX_SELECT_SQL} WHERE b.id IN ({placeholders})', chunk)
+
+
+def remove_books(book_pks, using='default'):
+    book_pks = list(book_pks)
+    if not book_pks or not is_search_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(book_pks), 500):
+            chunk = book_pks[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+
+def rebuild_index(using='default'):
+    """Rebuilds the whole index in two statements and merges its segments. Returns the row count."""
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(_INDEX_SELECT_SQL)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,175 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import auth, search, stats
+from .cache import (schedule_book_version_bump, schedule_catalog_version_bump, schedule_category_version_bump,
+                    schedule_suggest_version_bump)
+from .events import schedule_availability_event
+from .models import Book, BorrowedBook, Category, User
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_write(sender, using, **kwargs):
+    """Any committed book or category write changes what /api/books/ returns."""
+    schedule_catalog_version_bump(using=using)
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def invalidate_catalog_on_category_change(sender, action, using, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_catalog_version_bump(using=using)
+
+
+# --- Page fragment versions (see library.cache) ---
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_fragments(sender, using, **kwargs):
+    schedule_category_version_bump(using=using)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_fragments(sender, instance, using, **kwargs):
+    schedule_book_version_bump([instance.pk], using=using)
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def invalidate_book_category_fragments(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        schedule_book_version_bump([instance.pk], using=using)
+    else:
+        # A category gained or lost books; the category version covers every book page.
+        schedule_category_version_bump(using=using)
+
+
+# --- Suggest index versions (library.suggest) ---
+# Saved books and categories are picked up incrementally; deleted books need a rebuild.
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def follow_suggest_changes(sender, using, **kwargs):
+    schedule_suggest_version_bump(using=using)
+
+
+@receiver(post_delete, sender=Book)
+def rebuild_suggest_index(sender, using, **kwargs):
+    schedule_suggest_version_bump(rebuild=True, using=using)
+
+
+# --- Search index maintenance ---
+# Index rows are written in the same transaction as the change they mirror,
+# so a rolled-back write never leaves the index out of step.
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, using, **kwargs):
+    search.remove_books([instance.pk], using=using)
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def reindex_book_categories(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_books([instance.pk], using=using)
+    elif action == 'post_clear':
+        # pk_set is None for a reverse clear; the category's books were captured in pre_clear.
+        search.index_books(getattr(instance, '_search_book_pks', ()), using=using)
+    else:
+        search.index_books(pk_set, using=using)
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def remember_cleared_category_books(sender, instance, action, reverse, using, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._search_book_pks = list(instance.books.using(using).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_deleted_category_books(sender, instance, using, **kwargs):
+    instance._search_book_pks = list(instance.books.using(using).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def reindex_renamed_category(sender, instance, created, using, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_books(instance.books.using(using).values_list('pk', flat=True), using=using)
+
+
+@receiver(post_delete, sender=Category)
+def reindex_deleted_category_books(sender, instance, using, **kwargs):
+    search.index_books(getattr(instance, '_search_book_pks', ()), using=using)
+
+
+# --- Dashboard counters ---
+# Queryset .update()/bulk_create() paths (library.circulation, import_books)
+# skip these receivers and adjust or recompute the counters themselves.
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.adjust(total_books=1, available_copies=instance.available_copies)
+    elif update_fields is None or 'available_copies' in update_fields:
+        previous = getattr(instance, '_loaded_available_copies', None)
+        if previous is not None:
+            stats.adjust(available_copies=instance.available_copies - previous)
+    instance._loaded_available_copies = instance.available_copies
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    stats.adjust(total_books=-1, available_copies=-instance.available_copies)
+
+
+@receiver(post_save, sender=BorrowedBook)
+def count_new_loan(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.return_date is None:
+        stats.adjust(borrowed_books=1)
+
+
+@receiver(post_delete, sender=BorrowedBook)
+def count_deleted_loan(sender, instance, **kwargs):
+    if instance.return_date is None:
+        stats.adjust(borrowed_books=-1)
+
+
+@receiver(post_save, sender=User)
+def count_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(total_users=1)
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    stats.adjust(total_users=-1)
+
+
+# --- User cache (library.auth) ---
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    auth.forget_user(instance.pk)
+
+
+# --- Live availability events (library.events) ---
+# Circulation publishes its own events; this covers books added or edited.
+
+@receiver(post_save, sender=Book)
+def publish_saved_book_availability(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'available_copies' in update_fields):
+        schedule_availability_event([instance.pk], using=using)
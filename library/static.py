@@ -0,0 +1,171 @@
+"""Production static files: fingerprinted names, precompressed variants, in-process serving.
+
+With LIBRARY_STATIC_MODE=production (settings), collectstatic stores every
+file under a content-hashed name (css/style.3f2a9c.css) through
+CompressedManifestStaticFilesStorage, and writes .gz and, when the brotli
+package is installed, .br variants of text assets next to both names in
+STATIC_ROOT. StaticFilesMiddleware then serves STATIC_ROOT itself: it picks
+the smallest variant the client accepts and marks hashed names immutable for
+a year, since a changed file gets a new name. Unhashed names (still
+referenced from JavaScript) are cached briefly and revalidated with
+If-Modified-Since.
+
+The middleware indexes STATIC_ROOT once at start-up, so restart the server
+after running collectstatic.
+"""
+import gzip
+import json
+import mimetypes
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = frozenset(('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico'))
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Encodings in order of preference, with the suffix of their precompressed file.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path):
+    """Writes path.gz (and path.br) when compression saves space; returns the suffixes written."""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    written = []
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses text assets after hashing them."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                compress_file(self.path(name))
+
+
+class StaticFile:
+    __slots__ = ('path', 'size', 'mtime', 'content_type', 'cache_control', 'variants')
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'image/svg+xml'):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else \
+            f'public, max-age={settings.LIBRARY_STATIC_MAX_AGE}'
+        # (encoding, path, size) of each precompressed variant, preferred first.
+        self.variants = [(encoding, path + suffix, os.path.getsize(path + suffix))
+                         for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)]
+
+
+def build_static_index(root, url_prefix):
+    """{url path: StaticFile} for every file under root, skipping compressed variants and the manifest."""
+    hashed = set()
+    manifest_path = os.path.join(root, 'staticfiles.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as fh:
+            hashed = set(json.load(fh).get('paths', {}).values())
+    index = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(('.gz', '.br')) or filename == 'staticfiles.json':
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            index[url_prefix + name] = StaticFile(path, immutable=name in hashed)
+    return index
+
+
+def accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    accepted = set()
+    for part in header.split(','):
+        encoding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def serve(request, static_file):
+    """Response for one indexed file: 304, HEAD headers, or the best encoded body."""
+    if not static_file.cache_control.endswith('immutable') and \
+            not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), static_file.mtime):
+        response = HttpResponseNotModified()
+    else:
+        path, size, encoding = static_file.path, static_file.size, None
+        accepted = accepted_encodings(request) if static_file.variants else ()
+        for variant_encoding, variant_path, variant_size in static_file.variants:
+            if variant_encoding in accepted:
+                path, size, encoding = variant_path, variant_size, variant_encoding
+                break
+        response = HttpResponse() if request.method == 'HEAD' else FileResponse(open(path, 'rb'))
+        response['Content-Type'] = static_file.content_type
+        response['Content-Length'] = str(size)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    if static_file.variants:
+        response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = static_file.cache_control
+    response['Last-Modified'] = http_date(static_file.mtime)
+    return response
+
+
+class StaticFilesMiddleware:
+    """Serves STATIC_ROOT in production static mode, ahead of sessions, CSRF and URL resolution."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.LIBRARY_STATIC_MODE != 'production':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.files = build_static_index(settings.STATIC_ROOT, settings.STATIC_URL)
+
+    def _find(self, request):
+        if request.method in ('GET', 'HEAD'):
+            return self.files.get(request.path_info)
+        return None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        static_file = self._find(request)
+        return serve(request, static_file) if static_file else self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self._find(request)
+        return serve(request, static_file) if static_file else await self.get_response(request)
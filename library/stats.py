@@ -0,0 +1,56 @@
+"""Dashboard counters kept in the single LibraryStats row.
+
+Writers apply small F() deltas in the same transaction as the change they
+count (see adjust()), so the admin dashboard reads one row by primary key
+instead of aggregating the Book, BorrowedBook and User tables.
+``manage.py recompute_library_stats`` rebuilds the row from scratch.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import F, Sum
+from django.db.models.functions import Least
+
+from .models import Book, BorrowedBook, LibraryStats, User
+
+STATS_PK = 1
+STAT_FIELDS = ('total_books', 'available_copies', 'borrowed_books', 'total_users')
+
+
+def compute_stats():
+    """Aggregates the counters from the source tables (full scans; reconciliation only)."""
+    return {
+        'total_books': Book.objects.count(),
+        # Never more copies than exist, even if a bulk write left a row inconsistent.
+        'available_copies': Book.objects.aggregate(total=Sum(Least('available_copies', 'total_copies')))['total'] or 0,
+        'borrowed_books': BorrowedBook.objects.filter(return_date__isnull=True).count(),
+        'total_users': User.objects.count(),
+    }
+
+
+def recompute_stats():
+    """Rewrites the stats row from compute_stats() and returns the new values."""
+    values = compute_stats()
+    LibraryStats.objects.update_or_create(pk=STATS_PK, defaults=values)
+    return values
+
+
+def get_stats():
+    """Returns the counters as a dict, building the row on first use."""
+    row = LibraryStats.objects.filter(pk=STATS_PK).values(*STAT_FIELDS).first()
+    return row if row is not None else recompute_stats()
+
+
+async def aget_stats():
+    """Async version of get_stats."""
+    row = await LibraryStats.objects.filter(pk=STATS_PK).values(*STAT_FIELDS).afirst()
+    return row if row is not None else await sync_to_async(recompute_stats)()
+
+
+def adjust(**deltas):
+    """Adds the given deltas to the counters with a single UPDATE."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = LibraryStats.objects.filter(pk=STATS_PK)\
+                                  .update(**{field: F(field) + delta for field, delta in deltas.items()})
+    if not updated:
+        recompute_stats()  # No row yet: the full recompute already includes this change.
@@ -0,0 +1,320 @@
+"""Typeahead suggestions for the book list search box (/api/books/suggest/).
+
+Each process keeps book titles, authors and category names in memory and
+answers prefix queries without touching the database. A section (titles,
+authors or categories) stores its strings as one UTF-8 bytes object and an
+array of offsets, about a byte per character and four per string instead of
+a str object each, plus an array of the positions where words start, sorted
+by the folded text that follows them. A query is one binary search in that
+array, so "pot" finds "Harry Potter" in O(log n); at most SCAN_LIMIT
+neighbouring entries are then ranked: matches at the start of the string
+first, then authors with more books, then shorter strings.
+
+The index follows the suggest version and generation in the cache (see
+library.cache). When the version moves, books saved since the last sync
+(Book.updated_at) go into a small overlay index that shadows their old
+entries, and categories are re-read. When the generation moves (book
+deletions, bulk imports) or the overlay outgrows OVERLAY_LIMIT, the index is
+rebuilt: in a background thread for catalogs over BACKGROUND_REBUILD_SIZE
+books, while the old index keeps answering. Until then a deleted book, or an
+author whose books were all renamed away, may still be suggested.
+"""
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.utils import timezone
+
+from .cache import aget_suggest_versions, get_suggest_versions
+from .models import Book, Category
+
+SUGGEST_TYPES = ('category', 'author', 'title')
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+KEY_BYTES = 24          # Folded bytes entries are sorted by; longer queries are checked per match.
+MAX_WORDS = 8           # Words of a string that start an entry.
+SCAN_LIMIT = 128        # Matching entries ranked per query and section.
+OVERLAY_LIMIT = 2_000   # Changed books followed in the overlay before the index is rebuilt.
+BACKGROUND_REBUILD_SIZE = 50_000
+SYNC_SLACK = timedelta(minutes=1)  # Re-read window for transactions that committed after a sync began.
+BUILD_CHUNK_SIZE = 5_000
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text):
+    """The words of text, lower-cased and without accents, joined by single spaces."""
+    text = text or ''
+    if not text.isascii():
+        text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    return ' '.join(_WORD_RE.findall(text.casefold()))
+
+
+class _Packed:
+    """A list of strings stored as one UTF-8 bytes object and an array of end offsets."""
+    __slots__ = ('data', 'offsets', 'separator')
+
+    def __init__(self, separator=b''):
+        self.data = bytearray()
+        self.offsets = array('I', [0])
+        self.separator = separator
+
+    def append(self, text):
+        self.data += text.encode()
+        self.data += self.separator
+        self.offsets.append(len(self.data))
+
+    def freeze(self):
+        self.data = bytes(self.data)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1] - len(self.separator)].decode()
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+class _Section:
+    """One suggestion type: display strings, folded keys and the sorted word-start entries."""
+
+    def __init__(self, items, weighted=False):
+        """items: (display, pk, weight); strings without words are kept but get no entries."""
+        self.display = _Packed()
+        self.keys = _Packed(separator=b'\x00')  # The separator sorts a whole key before its extensions.
+        self.pks = array('q')  # BigAutoField pks.
+        self.weights = array('I') if weighted else None  # Unweighted sections rank every item alike.
+        # Word starts, bucketed by their first two bytes so that only one bucket's sort keys exist at a time.
+        buckets = defaultdict(lambda: array('I'))
+        data = self.keys.data
+        for display, pk, weight in items:
+            self.display.append(display)
+            self.pks.append(pk)
+            if weighted:
+                self.weights.append(weight)
+            position = len(data)
+            self.keys.append(fold(display))
+            end = len(data) - 1
+            for _ in range(MAX_WORDS if position < end else 0):
+                buckets[bytes(data[position:position + 2])].append(position)
+                position = data.find(b' ', position, end) + 1
+                if not position:
+                    break
+        for packed in (self.display, self.keys):
+            packed.freeze()
+
+        data, offsets = self.keys.data, self.keys.offsets
+        self.entries = array('I')
+        for first_bytes in sorted(buckets):
+            self.entries.extend(sorted(buckets.pop(first_bytes), key=lambda p: data[p:p + KEY_BYTES]))
+        # The item of each entry, so that a query need not search offsets per match.
+        self.entry_items = array('I', (bisect_right(offsets, p) - 1 for p in self.entries))
+
+    def __len__(self):
+        return len(self.pks)
+
+    def nbytes(self):
+        arrays = (self.pks, self.weights or array('I'), self.entries, self.entry_items)
+        return self.display.nbytes() + self.keys.nbytes() + sum(a.itemsize * len(a) for a in arrays)
+
+    def key(self, item):
+        return self.keys.data[self.keys.offsets[item]:self.keys.offsets[item + 1] - 1]
+
+    def find(self, item_pk):
+        """Index of the item with this pk (items must be in pk order), or None."""
+        i = bisect_left(self.pks, item_pk)
+        return i if i < len(self.pks) and self.pks[i] == item_pk else None
+
+    def search(self, prefix, shadowed=frozenset()):
+        """{item: rank} for items with a word starting with the folded UTF-8 prefix, pks in shadowed excluded.
+
+        Lower ranks are better: a match at the start of the string, then a higher weight, then a shorter string.
+        """
+        data, offsets, entries, entry_items = self.keys.data, self.keys.offsets, self.entries, self.entry_items
+        pks, weights = self.pks, self.weights
+        probe = prefix[:KEY_BYTES]
+        width, check = len(probe), len(prefix) > KEY_BYTES
+        start = bisect_left(entries, probe, key=lambda p: data[p:p + width])
+        matches = {}
+        for i in range(start, min(start + SCAN_LIMIT, len(entries))):
+            position = entries[i]
+            if data[position:position + width] != probe:
+                break
+            if check and data[position:position + len(prefix)] != prefix:
+                continue
+            item = entry_items[i]
+            if item in matches or (shadowed and pks[item] in shadowed):
+                continue
+            begin = offsets[item]
+            matches[item] = (((position != begin) << 50) - (weights[item] << 25 if weights else 0) +
+                             offsets[item + 1] - begin)
+        return matches
+
+    def suggestion(self, item, suggestion_type):
+        suggestion = {'type': suggestion_type, 'text': self.display[item]}
+        if suggestion_type == 'title':
+            suggestion['bookPk'] = self.pks[item]
+        return suggestion
+
+
+class SuggestIndex:
+    """Title, author and category sections built from (pk, title, author) rows in pk order."""
+
+    def __init__(self, books, categories=()):
+        author_ids, title_authors = {}, array('I')
+
+        def titles():
+            for pk, title, author in books:
+                title_authors.append(author_ids.setdefault(author, len(author_ids)))
+                yield title, pk, 0
+
+        self.titles = _Section(titles())
+        counts = Counter(title_authors)
+        self.authors = _Section(((author, 0, counts[i]) for author, i in author_ids.items()), weighted=True)
+        self.title_authors = title_authors
+        self.categories = _Section((name, pk, 0) for pk, name in categories)
+
+    def nbytes(self):
+        return (self.titles.nbytes() + self.authors.nbytes() + self.categories.nbytes() +
+                self.title_authors.itemsize * len(self.title_authors))
+
+    def book(self, book_pk):
+        """(title, author) as indexed, or None."""
+        i = self.titles.find(book_pk)
+        if i is None:
+            return None
+        return self.titles.display[i], self.authors.display[self.title_authors[i]]
+
+    def suggest(self, query, types=SUGGEST_TYPES, limit=DEFAULT_LIMIT):
+        sections = {'title': [(self.titles, frozenset())], 'author': [(self.authors, frozenset())],
+                    'category': [(self.categories, frozenset())]}
+        return _suggest(sections, query, types, limit)
+
+
+def _suggest(sections, query, types, limit):
+    """Up to limit suggestions per type from {type: [(section, shadowed pks)]}, best first."""
+    prefix = fold(query).encode()
+    if not prefix:
+        return []
+    results = []
+    for suggestion_type in types:
+        candidates = sections[suggestion_type]
+        ranked = []
+        for n, (section, shadowed) in enumerate(candidates):
+            ranked += [(rank, item, n) for item, rank in section.search(prefix, shadowed).items()]
+        ranked.sort()
+        seen = set()
+        for _, item, n in ranked:
+            section = candidates[n][0]
+            key = section.key(item)
+            if key not in seen:  # The same title or name twice is one suggestion.
+                seen.add(key)
+                results.append(section.suggestion(item, suggestion_type))
+                if len(seen) == limit:
+                    break
+    return results
+
+
+class LiveIndex:
+    """This process's suggestions, kept in step with the database (see the module docstring)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None      # (base, overlay, pks shadowed in base), replaced as a whole.
+        self._changed = {}      # pk -> (title, author) of books indexed in the overlay.
+        self._synced_at = None
+        self._generation = None
+        self._rebuilding = False
+        self.versions = None    # (generation, version) last synced.
+
+    def suggest(self, query, types=SUGGEST_TYPES, limit=DEFAULT_LIMIT):
+        base, overlay, shadowed = self._state
+        none = frozenset()
+        sections = {'title': [(base.titles, shadowed), (overlay.titles, none)],
+                    'author': [(base.authors, none), (overlay.authors, none)],
+                    'category': [(overlay.categories, none)]}
+        return _suggest(sections, query, types, limit)
+
+    def sync(self, versions):
+        """Brings the index up to versions, the (generation, version) read from the cache."""
+        with self._lock:
+            if versions == self.versions:
+                return
+            if self._state is None:
+                self._install(versions, *self._build())
+                return
+            if versions[0] != self._generation or len(self._changed) > OVERLAY_LIMIT:
+                if len(self._state[0].titles) <= BACKGROUND_REBUILD_SIZE:
+                    self._install(versions, *self._build())
+                    return
+                if not self._rebuilding:
+                    self._rebuilding = True
+                    threading.Thread(target=self._rebuild_in_background, args=(versions,),
+                                     name='suggest-rebuild', daemon=True).start()
+            self._apply_changes(versions)  # Until a rebuild lands, edits go to the overlay.
+
+    def _build(self):
+        started = timezone.now()
+        books = Book.objects.order_by('pk').values_list('pk', 'book_name', 'author')
+        return SuggestIndex(books.iterator(chunk_size=BUILD_CHUNK_SIZE)), started
+
+    def _install(self, versions, base, started):
+        self._changed = {}
+        self._state = (base, self._overlay(), frozenset())
+        self._synced_at, self._generation, self.versions = started, versions[0], versions
+
+    def _overlay(self):
+        changed = self._changed
+        return SuggestIndex(((pk, *changed[pk]) for pk in sorted(changed)),
+                            Category.objects.order_by('pk').values_list('pk', 'name'))
+
+    def _apply_changes(self, versions):
+        started = timezone.now()
+        base = self._state[0]
+        rows = Book.objects.filter(updated_at__gte=self._synced_at - SYNC_SLACK)\
+                           .values_list('pk', 'book_name', 'author')
+        # Circulation touches updated_at too; only books whose indexed text changed are kept.
+        for pk, *book in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            if base.book(pk) == tuple(book):
+                self._changed.pop(pk, None)
+            else:
+                self._changed[pk] = tuple(book)
+        self._state = (base, self._overlay(), frozenset(self._changed))
+        self._synced_at, self.versions = started, versions
+
+    def _rebuild_in_background(self, versions):
+        try:
+            built = self._build()
+            with self._lock:
+                self._install(versions, *built)
+        except Exception as e:
+            print(f"Suggest Index Rebuild Error: {e}")
+            self.versions = None  # Retried on the next request.
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+
+index = LiveIndex()
+
+
+def suggest(query, types=SUGGEST_TYPES, limit=DEFAULT_LIMIT):
+    """[{'type', 'text'(, 'bookPk')}]: up to limit suggestions of each type, in SUGGEST_TYPES order."""
+    index.sync(get_suggest_versions())
+    return index.suggest(query, types, limit)
+
+
+async def asuggest(query, types=SUGGEST_TYPES, limit=DEFAULT_LIMIT):
+    """Async suggest(); the database is only read, off the event loop, when the index is behind."""
+    versions = await aget_suggest_versions()
+    if versions != index.versions:
+        await sync_to_async(index.sync)(versions)
+    return index.suggest(query, types, limit)
@@ -0,0 +1,168 @@
+"""A small database-backed task queue.
+
+Tasks are rows in ``library_task``. Functions become runnable tasks with the
+``@task`` decorator and are queued with ``enqueue()``; ``manage.py run_worker``
+claims and runs them. A claim is a lease: the worker owns the task until
+``locked_until``, which is renewed every third of the lease while the task
+runs, and a task whose worker died is picked up again once its lease expires.
+On PostgreSQL, candidates are selected with ``SELECT ... FOR UPDATE SKIP
+LOCKED`` so workers never queue behind each other. Elsewhere (SQLite), each candidate is claimed with a conditional UPDATE
+and a worker simply skips rows another worker got first.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE = timedelta(minutes=5)
+RETRY_BACKOFF = timedelta(seconds=30)   # Doubled after every failed attempt.
+
+TASKS = {}
+# Recurring tasks: name -> interval. The worker keeps one instance queued and
+# each run, successful or finally failed, queues the next.
+PERIODIC_TASKS = {}
+
+
+def task(name, every=None):
+    """Registers the decorated function as the task ``name``, optionally repeating ``every`` timedelta."""
+    def register(func):
+        TASKS[name] = func
+        if every is not None:
+            PERIODIC_TASKS[name] = every
+        return func
+    return register
+
+
+def enqueue(name, payload=None, run_at=None, unique_key=None, max_attempts=3):
+    """Queues a task and returns it, or None when a task with unique_key is already queued."""
+    if name not in TASKS:
+        raise KeyError(f'Unknown task "{name}".')
+    try:
+        with transaction.atomic():
+            return Task.objects.create(name=name, payload=payload or {}, run_at=run_at or timezone.now(),
+                                       unique_key=unique_key, max_attempts=max_attempts)
+    except IntegrityError:
+        return None
+
+
+def schedule_periodic_tasks():
+    """Makes sure every periodic task has one queued instance."""
+    for name in PERIODIC_TASKS:
+        enqueue(name, unique_key=f'periodic:{name}')
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claimable(now):
+    return Q(status=Task.PENDING, run_at__lte=now) | Q(status=Task.RUNNING, locked_until__lt=now)
+
+
+def claim_tasks(worker, limit=10, lease=DEFAULT_LEASE):
+    """Leases up to ``limit`` due tasks to ``worker`` and returns them."""
+    now = timezone.now()
+    claim = {'status': Task.RUNNING, 'locked_by': worker, 'locked_until': now + lease,
+             'attempts': F('attempts') + 1}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pks = list(Task.objects.select_for_update(skip_locked=True).filter(_claimable(now))
+                                   .order_by('run_at').values_list('pk', flat=True)[:limit])
+            Task.objects.filter(pk__in=pks).update(**claim)
+    else:
+        pks = []
+        for pk in Task.objects.filter(_claimable(now)).order_by('run_at').values_list('pk', flat=True)[:limit * 2]:
+            # Zero rows updated means another worker claimed it since the SELECT.
+            if Task.objects.filter(_claimable(now), pk=pk).update(**claim):
+                pks.append(pk)
+                if len(pks) == limit:
+                    break
+    return list(Task.objects.filter(pk__in=pks, locked_by=worker).order_by('run_at'))
+
+
+def _renew_lease(owned, lease, done):
+    """Extends a running task's lease every third of it until done is set."""
+    try:
+        while not done.wait(lease.total_seconds() / 3):
+            owned.update(locked_until=timezone.now() + lease)
+    except Exception:
+        logger.exception('Task lease renewal error')
+    finally:
+        connection.close()
+
+
+@contextmanager
+def _kept_leased(owned, lease):
+    """Renews the lease from a background thread while the block runs, so a long task is not claimed twice."""
+    done = threading.Event()
+    renewer = threading.Thread(target=_renew_lease, args=(owned, lease, done), name='task-lease', daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        done.set()
+        renewer.join()
+
+
+def _queue_next_run(task_row):
+    interval = PERIODIC_TASKS.get(task_row.name)
+    if interval is not None:
+        enqueue(task_row.name, run_at=timezone.now() + interval, unique_key=task_row.unique_key)
+
+
+def run_task(task_row, lease=DEFAULT_LEASE):
+    """Runs one claimed task and records the outcome. Returns True on success."""
+    owned = Task.objects.filter(pk=task_row.pk, status=Task.RUNNING, locked_by=task_row.locked_by)
+    try:
+        with _kept_leased(owned, lease):
+            TASKS[task_row.name](**task_row.payload)
+    except Exception:
+        logger.exception('Task %s #%s error', task_row.name, task_row.pk)
+        if task_row.attempts >= task_row.max_attempts:
+            with transaction.atomic():
+                owned.update(status=Task.FAILED, last_error=traceback.format_exc(), finished_at=timezone.now(),
+                             locked_until=None)
+                _queue_next_run(task_row)  # A failing periodic task still keeps its schedule.
+        else:
+            owned.update(status=Task.PENDING, last_error=traceback.format_exc(), locked_until=None,
+                         run_at=timezone.now() + RETRY_BACKOFF * 2 ** (task_row.attempts - 1))
+        return False
+
+    with transaction.atomic():
+        owned.update(status=Task.DONE, finished_at=timezone.now(), locked_until=None)
+        _queue_next_run(task_row)
+    return True
+
+
+def work(worker=None, batch_size=10, lease=DEFAULT_LEASE, once=False, stop=None, poll_interval=2.0):
+    """Claims and runs tasks until ``stop`` (a threading/multiprocessing Event) is set.
+
+    With once=True, returns as soon as no task is due. Returns the number of tasks run.
+    """
+    worker = worker or worker_name()
+    processed = 0
+    while stop is None or not stop.is_set():
+        claimed = claim_tasks(worker, batch_size, lease)
+        for task_row in claimed:
+            run_task(task_row, lease)
+            processed += 1
+        if not claimed:
+            if once:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+    return processed
@@ -1,3 +1,1162 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import io
+import json
+import pickle
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from asgiref.sync import sync_to_async
+from PIL import Image
+
+from . import archive, auth, benchmarks, circulation, events, exports, holds, loans, metrics, overdue, ratelimit, recommendations, renditions, stats, suggest, tasks
+from .management.commands.import_books import iter_json_records
+from .models import AvailabilityChange, Book, BookAffinity, BorrowedBook, BorrowedBookArchive, Category, Hold, Task, User
+
+
+class BooksApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fiction = Category.objects.create(name='Fiction')
+        cls.history = Category.objects.create(name='History')
+        for i in range(7):
+            book = Book.objects.create(
+                book_id_json=f'B{i}', book_name=f'Title {i % 3}', author=f'Author {i}',
+                description='...', publication_date=date(2000 + i, 1, 1) if i % 2 else None,
+                total_copies=1, available_copies=i % 2,
+            )
+            book.categories.add(cls.fiction if i < 4 else cls.history)
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch_all(self, **params):
+        """Follows nextCursor until exhausted and returns the bookIds in order."""
+        ids, cursor = [], None
+        while True:
+            query = dict(params, page_size=2)
+            if cursor:
+                query['cursor'] = cursor
+            data = self.client.get(reverse('library:books_api'), query).json()
+            ids += [b['bookId'] for b in data['books']]
+            cursor = data['nextCursor']
+            if not cursor:
+                return ids
+
+    def test_keyset_pages_cover_catalog_once_in_order(self):
+        expected = list(Book.objects.order_by('book_name', 'pk').values_list('book_id_json', flat=True))
+        self.assertEqual(self.fetch_all(sort='title-asc'), expected)
+        self.assertEqual(self.fetch_all(sort='title-desc'), list(
+            Book.objects.order_by('-book_name', '-pk').values_list('book_id_json', flat=True)))
+
+    def test_nullable_sort_field_pages_without_gaps(self):
+        ids = self.fetch_all(sort='newest')
+        self.assertEqual(ids, ['B5', 'B3', 'B1', 'B6', 'B4', 'B2', 'B0'])
+
+    def test_filters(self):
+        self.assertEqual(sorted(self.fetch_all(category='fiction')), ['B0', 'B1', 'B2', 'B3'])
+        self.assertEqual(sorted(self.fetch_all(availability='available')), ['B1', 'B3', 'B5'])
+        self.assertEqual(sorted(self.fetch_all(search='author 6', search_type='author')), ['B6'])
+        self.assertEqual(len(self.fetch_all(search='hist', search_type='category')), 3)
+
+    def test_invalid_parameters_are_rejected(self):
+        url = reverse('library:books_api')
+        self.assertEqual(self.client.get(url, {'sort': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': '!!!'}).status_code, 400)
+
+    def test_query_count_does_not_grow_with_catalog_size(self):
+        url = reverse('library:books_api')
+        with self.assertNumQueries(2):
+            small = self.client.get(url, {'page_size': 100}).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(30):
+                book = Book.objects.create(book_id_json=f'X{i}', book_name=f'Extra {i}', author='A', description='...')
+                book.categories.add(self.fiction, self.history)
+        with self.assertNumQueries(2):
+            large = self.client.get(url, {'page_size': 100}).json()
+        self.assertEqual(len(large['books']), len(small['books']) + 30)
+        self.assertEqual(large['books'][0]['categories'], ['Fiction', 'History'])
+
+    def test_cached_pages_revalidate_with_etag(self):
+        url = reverse('library:books_api')
+        first = self.client.get(url, {'sort': 'title-asc'})
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'sort': 'title-asc'})
+            not_modified = self.client.get(url, {'sort': 'title-asc'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(book_id_json='B0').get().save()
+        changed = self.client.get(url, {'sort': 'title-asc'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.poetry = Category.objects.create(name='Poetry')
+        self.dune = Book.objects.create(book_id_json='S1', book_name='Dune', author='Frank Herbert',
+                                        description='Desert planet politics.')
+        self.messiah = Book.objects.create(book_id_json='S2', book_name='Messiah', author='Frank Herbert',
+                                           description='A sequel to Dune.')
+
+    def search(self, q, search_type='all'):
+        response = self.client.get(reverse('library:search_books_api'), {'q': q, 'search_type': search_type})
+        return [b['bookId'] for b in response.json()['books']]
+
+    def test_ranked_prefix_search_prefers_title_matches(self):
+        self.assertEqual(self.search('dun'), ['S1', 'S2'])
+        self.assertEqual(self.search('dun', 'title'), ['S1'])
+        self.assertEqual(sorted(self.search('herb fra', 'author')), ['S1', 'S2'])
+
+    def test_index_follows_category_and_book_changes(self):
+        self.messiah.categories.add(self.poetry)
+        self.assertEqual(self.search('poet', 'category'), ['S2'])
+        self.poetry.name = 'Verse'
+        self.poetry.save()
+        self.assertEqual(self.search('poet', 'category'), [])
+        self.assertEqual(self.search('verse', 'category'), ['S2'])
+        self.poetry.delete()
+        self.assertEqual(self.search('verse', 'category'), [])
+        self.dune.delete()
+        self.assertEqual(self.search('dun', 'title'), [])
+
+
+class CirculationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw-123456')
+        self.book = Book.objects.create(book_id_json='C1', book_name='Popular', author='A', description='...',
+                                        total_copies=2, available_copies=2)
+
+    def test_borrow_and_return_adjust_copies(self):
+        record = circulation.borrow_book(self.user, self.book.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        with self.assertRaises(circulation.AlreadyBorrowed):
+            circulation.borrow_book(self.user, self.book.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)  # Rejected duplicate gave its copy back.
+
+        circulation.return_book(record)
+        with self.assertRaises(circulation.AlreadyReturned):
+            circulation.return_book(record)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_unavailable_book(self):
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+        response = self.client.post(reverse('library:borrow_book_api', args=[self.book.pk]))
+        self.assertEqual(response.status_code, 302)  # Login required.
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('library:borrow_book_api', args=[self.book.pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Book is not available.')
+
+
+class BookUpdateTests(TestCase):
+    def test_total_copies_change_moves_availability_and_keeps_loans(self):
+        admin = User.objects.create_user('boss', password='pw-123456', is_admin=True)
+        book = Book.objects.create(book_id_json='U1', book_name='Edited', author='A', description='...',
+                                   total_copies=3, available_copies=3)
+        circulation.borrow_book(admin, book.pk)
+        self.client.force_login(admin)
+        url = reverse('library:update_book_api', args=[book.pk])
+        for total, available in ((1, 0), (5, 4), (5, 4)):
+            form = {'book_id_json': 'U1', 'book_name': 'Edited', 'author': 'A', 'description': '...',
+                    'total_copies': total}
+            self.assertTrue(self.client.post(url, form).json()['success'])
+            book.refresh_from_db()
+            self.assertEqual((book.total_copies, book.available_copies), (total, available))
+            self.assertEqual(stats.get_stats(), stats.compute_stats())
+
+
+class CirculationStressTests(TransactionTestCase):
+    THREADS = 16
+    COPIES = 5
+
+    def test_concurrent_borrows_never_overbook(self):
+        book = Book.objects.create(book_id_json='HOT', book_name='Hot Title', author='A', description='...',
+                                   total_copies=self.COPIES, available_copies=self.COPIES)
+        users = [User.objects.create(username=f'stress{i}') for i in range(self.THREADS)]
+        outcomes, start = [], threading.Barrier(self.THREADS)
+
+        def worker(user):
+            start.wait()
+            try:
+                for _ in range(200):  # SQLite serialises writers; retry while the lock is held.
+                    try:
+                        circulation.borrow_book(user, book.pk)
+                        outcomes.append('ok')
+                        return
+                    except OperationalError:
+                        time.sleep(0.005)
+                    except circulation.BookUnavailable:
+                        outcomes.append('unavailable')
+                        return
+                outcomes.append('gave-up')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        self.assertEqual(outcomes.count('ok'), self.COPIES, outcomes)
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(BorrowedBook.objects.filter(book=book, return_date__isnull=True).count(), self.COPIES)
+        print(f"\n{self.THREADS} concurrent borrowers: {len(outcomes) / elapsed:.0f} requests/s")
+
+
+class HoldTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(book_id_json='H1', book_name='Queued', author='A', description='...',
+                                        total_copies=1, available_copies=1)
+        self.lender, self.first, self.second = (User.objects.create_user(name, email=f'{name}@example.com',
+                                                                         password='pw-123456')
+                                                for name in ('lender', 'first', 'second'))
+        self.loan = circulation.borrow_book(self.lender, self.book.pk)
+
+    def test_return_hands_copy_to_next_in_line(self):
+        self.client.force_login(self.first)
+        response = self.client.post(reverse('library:borrow_book_api', args=[self.book.pk]))
+        self.assertTrue(response.json()['can_hold'])
+        response = self.client.post(reverse('library:place_hold_api', args=[self.book.pk]))
+        self.assertEqual(response.json()['position'], 1)
+        self.assertEqual(self.client.post(reverse('library:place_hold_api', args=[self.book.pk])).status_code, 400)
+        second = holds.place_hold(self.second, self.book.pk)
+        self.assertEqual(holds.queue_position(second), 2)
+
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            circulation.return_book(self.loan)
+            tasks.work(worker='w1', once=True)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)  # Reserved, not back on the shelf.
+        self.assertEqual(Hold.objects.get(user=self.first).status, Hold.READY)
+        self.assertEqual(mail.outbox[0].to, ['first@example.com'])
+
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.borrow_book(self.second, self.book.pk)
+        circulation.borrow_book(self.first, self.book.pk)
+        self.assertEqual(Hold.objects.get(user=self.first).status, Hold.FULFILLED)
+        self.assertEqual(holds.queue_position(second), 1)
+
+    def test_cancel_and_expiry_pass_the_copy_on(self):
+        first = holds.place_hold(self.first, self.book.pk)
+        second = holds.place_hold(self.second, self.book.pk)
+        circulation.return_book(self.loan)
+        self.client.force_login(self.second)
+        response = self.client.post(reverse('library:cancel_hold_api', args=[first.pk]))
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.first)
+        self.assertTrue(self.client.post(reverse('library:cancel_hold_api', args=[first.pk])).json()['success'])
+        second.refresh_from_db()
+        self.assertEqual(second.status, Hold.READY)
+
+        Hold.objects.filter(pk=second.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.borrow_book(self.second, self.book.pk)  # Too late to pick it up.
+        self.assertEqual(holds.expire_holds(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)  # Nobody left in line.
+        self.assertEqual(stats.get_stats()['available_copies'], 1)
+        with self.assertRaises(holds.HoldNotNeeded):
+            holds.place_hold(self.second, self.book.pk)
+
+
+class HoldStressTests(TransactionTestCase):
+    COPIES = 4
+    HOLDERS = 12
+
+    def test_concurrent_returns_and_holds_on_one_title(self):
+        book = Book.objects.create(book_id_json='HOLD', book_name='Hot Title', author='A', description='...',
+                                   total_copies=self.COPIES, available_copies=self.COPIES)
+        loans = [circulation.borrow_book(User.objects.create(username=f'lender{i}'), book.pk)
+                 for i in range(self.COPIES)]
+        holders = [User.objects.create(username=f'holder{i}') for i in range(self.HOLDERS)]
+        outcomes, start = [], threading.Barrier(self.COPIES + self.HOLDERS)
+
+        def run(action, delay):
+            start.wait()
+            time.sleep(delay)  # Stagger the two groups so returns and new holds interleave.
+            try:
+                for _ in range(200):  # SQLite serialises writers; retry while the lock is held.
+                    try:
+                        outcomes.append(action())
+                        return
+                    except OperationalError:
+                        time.sleep(0.005)
+                    except holds.HoldNotNeeded:
+                        outcomes.append('on-shelf')
+                        return
+                outcomes.append('gave-up')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(lambda loan=loan: circulation.return_book(loan) and 'returned',
+                                                      i * 0.01)) for i, loan in enumerate(loans)]
+        threads += [threading.Thread(target=run, args=(lambda user=user: holds.place_hold(user, book.pk) and 'held',
+                                                       i * 0.004)) for i, user in enumerate(holders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertNotIn('gave-up', outcomes)
+        self.assertEqual(outcomes.count('returned'), self.COPIES)
+        book.refresh_from_db()
+        ready = list(Hold.objects.filter(book=book, status=Hold.READY).order_by('created_at', 'pk'))
+        waiting = list(Hold.objects.filter(book=book, status=Hold.WAITING).order_by('created_at', 'pk'))
+        # Every returned copy is either reserved or on the shelf, never both, never lost...
+        self.assertEqual(len(ready) + book.available_copies, self.COPIES)
+        # ...nobody waits while a copy sits on the shelf, and copies went to the front of the queue.
+        self.assertTrue(book.available_copies == 0 or not waiting, outcomes)
+        if waiting:
+            self.assertLessEqual((ready[-1].created_at, ready[-1].pk), (waiting[0].created_at, waiting[0].pk))
+
+
+class AvailabilityEventTests(TestCase):
+    def borrow(self, user, book):
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.borrow_book(user, book.pk)
+
+    async def test_stream_pushes_committed_changes(self):
+        book = await Book.objects.acreate(book_id_json='LIVE', book_name='Live', author='A', description='...',
+                                          total_copies=2, available_copies=2)
+        reader = await User.objects.acreate(username='live-reader')
+        response = await self.async_client.get(reverse('library:availability_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = aiter(response.streaming_content)
+        self.assertTrue((await anext(messages)).startswith(b'retry:'))
+        self.assertEqual(events.broker.subscriber_count(), 1)
+
+        await sync_to_async(self.borrow)(reader, book)
+        message = (await asyncio.wait_for(anext(messages), 5)).decode()
+        fields = dict(line.split(': ', 1) for line in message.strip().splitlines())
+        self.assertEqual(fields['event'], 'availability')
+        self.assertEqual(json.loads(fields['data']), [{'bookId': 'LIVE', 'availableCopies': 1}])
+
+        # A reconnecting client gets what it missed since its last event id.
+        await sync_to_async(self.borrow)(await User.objects.acreate(username='live-reader2'), book)
+        missed = events.replay_since(fields['id'])
+        self.assertEqual(missed[-1][1], [{'bookId': 'LIVE', 'availableCopies': 0}])
+        self.assertIsNone(events.replay_since('another-process-1'))
+        await messages.aclose()
+
+    def test_no_stream_under_wsgi_and_no_work_without_listeners(self):
+        self.assertEqual(self.client.get(reverse('library:availability_events')).status_code, 204)
+        book = Book.objects.create(book_id_json='QUIET', book_name='Quiet', author='A', description='...')
+        self.assertEqual(events.publish_availability([book.pk]), 0)
+
+    @override_settings(LIBRARY_EVENTS_BACKEND='db')
+    def test_db_backend_logs_changes_for_other_processes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(book_id_json='SHARED', book_name='Shared', author='A', description='...',
+                                       total_copies=3, available_copies=3)
+        first = events.latest_change_pk()  # Logged by the post_save receiver.
+        self.assertEqual(events.changes_after(first - 1), [(first, {'bookId': 'SHARED', 'availableCopies': 3})])
+        self.borrow(User.objects.create(username='shared-reader'), book)
+        self.assertEqual(events.changes_after(first)[-1][1], {'bookId': 'SHARED', 'availableCopies': 2})
+        self.assertEqual(events.replay_since(f'db-{first}')[-1][1], [{'bookId': 'SHARED', 'availableCopies': 2}])
+        AvailabilityChange.objects.update(created_at=timezone.now() - timedelta(days=1))
+        self.assertGreater(events.prune_availability_changes(), 0)
+        self.assertIsNone(events.replay_since(f'db-{first}'))
+
+
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Pottery')
+        cls.books = {title: Book.objects.create(book_id_json=f'T{i}', book_name=title, author=author, description='...')
+                     for i, (title, author) in enumerate([('Harry Potter', 'J. K. Rowling'), ('Pottery Basics', 'Ann Potts'),
+                                                          ("The Potter's Field", 'Ellis Peters'), ('Nana', 'Émile Zola'),
+                                                          ('Germinal', 'Émile Zola')])}
+
+    def setUp(self):
+        cache.clear()  # New suggest versions: the index is rebuilt from this test's rows.
+
+    def get(self, q, **params):
+        return self.client.get(reverse('library:suggest_books_api'), {'q': q, **params}).json()['suggestions']
+
+    def title(self, title):
+        return {'type': 'title', 'text': title, 'bookPk': self.books[title].pk}
+
+    def test_word_prefixes_ranked_with_string_starts_first(self):
+        self.assertEqual(self.get('pot'), [
+            {'type': 'category', 'text': 'Pottery'},
+            {'type': 'author', 'text': 'Ann Potts'},
+            self.title('Pottery Basics'),
+            self.title('Harry Potter'),
+            self.title("The Potter's Field"),
+        ])
+        self.assertEqual(self.get('HARRY pot', search_type='title'), [self.title('Harry Potter')])
+        self.assertEqual(self.get('emi', search_type='author'), [{'type': 'author', 'text': 'Émile Zola'}])
+        self.assertEqual(len(self.get('pot', limit=1)), 3)
+        self.assertEqual(self.get('  '), [])
+        response = self.client.get(reverse('library:suggest_books_api'), {'q': 'pot', 'search_type': 'isbn'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_edits_and_rebuilds_after_deletes(self):
+        self.get('pot')
+        with self.assertNumQueries(0):
+            self.get('harry')
+        with self.captureOnCommitCallbacks(execute=True):
+            book = self.books['Harry Potter']
+            book.book_name = 'Harriet the Spy'
+            book.save()
+            Category.objects.create(name='Spy Fiction')
+        self.assertEqual([s['text'] for s in self.get('har')], ['Harriet the Spy'])
+        self.assertEqual([s['text'] for s in self.get('spy')], ['Spy Fiction', 'Harriet the Spy'])
+        self.assertEqual(suggest.index._changed.keys(), {book.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books['Nana'].delete()
+        self.assertEqual([s['text'] for s in self.get('na', search_type='title')], [])
+        self.assertEqual(suggest.index._changed, {})
+        self.assertEqual(suggest.index.suggest('harriet', ('title',)), [{'type': 'title', 'text': 'Harriet the Spy', 'bookPk': book.pk}])
+
+    def test_index_matches_a_linear_scan(self):
+        rng = random.Random(7)
+        rows = [(pk, ' '.join(rng.choices(benchmarks.WORDS, k=rng.randint(1, 4))).title(), f'Author {pk % 40}')
+                for pk in range(1, 1001)]
+        index = suggest.SuggestIndex(rows)
+        for prefix in ('northe', 'golden p', 'river sh', 'zzz'):  # Each matches fewer than SCAN_LIMIT entries.
+            words = {title: title.lower().split() for _, title, _ in rows}
+            expected = {title for title, split in words.items()
+                        if any(' '.join(split[i:]).startswith(prefix) for i in range(len(split)))}
+            found = {s['text'] for s in index.suggest(prefix, ('title',), limit=len(rows))}
+            self.assertEqual(found, expected, prefix)
+
+    def test_index_holds_bigautofield_pks(self):
+        big = 2 ** 40
+        index = suggest.SuggestIndex([(7, 'Small Title', 'Author'), (big, 'Big Title', 'Author')])
+        self.assertEqual(index.suggest('big', ('title',)), [{'type': 'title', 'text': 'Big Title', 'bookPk': big}])
+        self.assertEqual(index.book(big), ('Big Title', 'Author'))
+
+
+class CirculationApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('librarian', password='pw-123456', is_admin=True)
+        readers = [User.objects.create_user(name, password='pw-123456') for name in ('alice', 'albert', 'bob')]
+        cls.books = [Book.objects.create(book_id_json=f'C{i}', book_name=f'Loaned {i}', author='A', description='...')
+                     for i in range(3)]
+        now = timezone.now()
+        # Due in -5, -1, 2, 6, 10 and 20 days; one returned loan that must never be listed.
+        for i, days in enumerate([10, -1, 2, 20, -5, 6]):
+            BorrowedBook.objects.create(user=readers[i % 3], book=cls.books[i // 3], due_date=now + timedelta(days=days))
+        BorrowedBook.objects.create(user=readers[0], book=cls.books[2], due_date=now, return_date=now)
+
+    def get(self, **params):
+        return self.client.get(reverse('library:circulation_api'), params)
+
+    def test_pages_follow_due_date_with_constant_queries(self):
+        self.client.force_login(self.admin)
+        self.get()  # Warm the session and user caches.
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                data = self.get(page_size=2, **({'cursor': cursor} if cursor else {})).json()
+            seen += data['loans']
+            cursor = data['nextCursor']
+            if not cursor:
+                break
+        due_dates = [loan['dueDate'] for loan in seen]
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(due_dates, sorted(due_dates))
+        self.assertEqual(set(seen[0]), set(loans.DEFAULT_LOAN_FIELDS))
+
+    def test_filters_projection_and_totals(self):
+        self.client.force_login(self.admin)
+        data = self.get(overdue=1, totals=1, fields='username,dueDate').json()
+        self.assertEqual([loan['username'] for loan in data['loans']], ['albert', 'albert'])
+        self.assertEqual(set(data['loans'][0]), {'username', 'dueDate'})
+        self.assertEqual(data['totals'], {'count': 2, 'overdue': 2})
+        self.assertEqual(len(self.get(due_within=7).json()['loans']), 2)
+        self.assertEqual({loan['username'] for loan in self.get(user='al').json()['loans']}, {'alice', 'albert'})
+        self.assertEqual(self.get(book=self.books[1].pk, totals=1).json()['totals'], {'count': 3, 'overdue': 1})
+        for bad in ({'fields': 'password'}, {'due_within': 'soon'}, {'cursor': 'garbage'}):
+            self.assertEqual(self.get(**bad).status_code, 400, bad)
+
+        self.client.force_login(User.objects.get(username='bob'))
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_out_of_range_parameters_are_rejected(self):
+        self.client.force_login(self.admin)
+        for value, pk in ([None, 1], [1, 1], ['2030-01-01T00:00:00', 1], ['2030-01-01T00:00:00+00:00', 2 ** 63],
+                          ['0001-01-01T00:00:00+05:00', 1], ['2030-01-01T00:00:00+00:00', True]):
+            bad = {'cursor': base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode()}
+            self.assertEqual(self.get(**bad).status_code, 400, (value, pk))
+        for bad in ({'due_within': '999999999'}, {'book': '99999999999999999999999'}):
+            self.assertEqual(self.get(**bad).status_code, 400, bad)
+
+
+class LoanArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', password='pw-123456')
+        cls.other = User.objects.create_user('other', password='pw-123456')
+        cls.books = [Book.objects.create(book_id_json=f'H{i}', book_name=f'History {i}', author='A', description='...')
+                     for i in range(4)]
+        now = timezone.now()
+        # Returned 500, 450 and 400 days ago and yesterday; one still open from long ago; another reader's old loan.
+        for i, days in enumerate([500, 450, 400, 1]):
+            BorrowedBook.objects.create(user=cls.reader, book=cls.books[i], due_date=now,
+                                        return_date=now - timedelta(days=days))
+        cls.open_loan = BorrowedBook.objects.create(user=cls.reader, book=cls.books[0], due_date=now)
+        BorrowedBook.objects.filter(pk=cls.open_loan.pk).update(borrow_date=now - timedelta(days=600))
+        BorrowedBook.objects.create(user=cls.other, book=cls.books[1], due_date=now, return_date=now - timedelta(days=700))
+
+    def test_archive_moves_old_returned_loans_in_chunks(self):
+        old_pks = set(BorrowedBook.objects.filter(return_date__lt=timezone.now() - timedelta(days=365))
+                                          .values_list('pk', flat=True))
+        borrowed_before = stats.get_stats()['borrowed_books']
+        self.assertEqual(archive.archive_loans(chunk_size=2), 4)
+        self.assertEqual(set(BorrowedBookArchive.objects.values_list('pk', flat=True)), old_pks)
+        self.assertEqual(BorrowedBook.objects.count(), 2)
+        self.assertTrue(BorrowedBook.objects.filter(pk=self.open_loan.pk).exists())
+        self.assertEqual(stats.get_stats()['borrowed_books'], borrowed_before)
+        self.assertEqual(archive.archive_loans(), 0)
+
+        out = io.StringIO()
+        call_command('archive_loans', days=0, stdout=out)
+        self.assertIn('Archived 1 loans', out.getvalue())
+
+    def test_history_reads_across_both_tables(self):
+        archive.archive_loans()
+        self.client.force_login(self.reader)
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 2, 'user': self.other.pk, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(reverse('library:loan_history_api'), params).json()
+            seen += data['loans']
+            cursor = data['nextCursor']
+            if not cursor:
+                break
+        # Readers only ever see their own history, newest first.
+        self.assertEqual([loan['bookId'] for loan in seen], ['H3', 'H2', 'H1', 'H0'])
+        self.assertEqual([loan['archived'] for loan in seen], [False, True, True, True])
+        self.assertEqual({loan['userPk'] for loan in seen}, {self.reader.pk})
+
+        dashboard = self.client.get(reverse('library:user_dashboard'))
+        self.assertEqual([loan.book.book_id_json for loan in dashboard.context['past_borrowed_books']],
+                         ['H3', 'H2', 'H1', 'H0'])
+
+        self.client.force_login(User.objects.create_user('librarian', password='pw-123456', is_admin=True))
+        data = self.client.get(reverse('library:loan_history_api'), {'book': self.books[1].pk}).json()
+        self.assertEqual({loan['userPk'] for loan in data['loans']}, {self.reader.pk, self.other.pk})
+        null_cursor = base64.urlsafe_b64encode(b'[null,1]').decode()
+        for bad in ({'cursor': 'garbage'}, {'cursor': null_cursor}, {'user': str(2 ** 64)}, {'book': str(2 ** 64)}):
+            self.assertEqual(self.client.get(reverse('library:loan_history_api'), bad).status_code, 400, bad)
+
+    def test_exports_and_recommendations_include_archived_loans(self):
+        archive.archive_loans()
+        self.assertEqual(len(list(exports.loan_rows())), 6)
+        recommendations.build_book_affinity()
+        self.assertTrue(BookAffinity.objects.filter(book=self.books[1], related_book=self.books[2]).exists())
+
+
+class ImportBooksTests(TestCase):
+    def import_records(self, records, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as fh:
+            fh.write('\n'.join(json.dumps(record) for record in records))
+            fh.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_books', fh.name, *args, stdout=out, stderr=err)
+        return err.getvalue()
+
+    def test_json_array_and_jsonl_are_streamed(self):
+        records = [{'bookId': str(i), 'bookName': f'Title {i}, with "quotes"'} for i in range(20)]
+        self.assertEqual(list(iter_json_records(io.StringIO(json.dumps(records, indent=1)), chunk_size=7)), records)
+        jsonl = '\n'.join(json.dumps(record) for record in records) + '\n\n'
+        self.assertEqual(list(iter_json_records(io.StringIO(jsonl), chunk_size=7)), records)
+        with self.assertRaises(CommandError):
+            list(iter_json_records(io.StringIO('[{"bookId": "1"}, {"bookId": '), chunk_size=4))
+        with self.assertRaisesMessage(CommandError, 'line 2'):
+            list(iter_json_records(io.StringIO('{"bookId": "1"}\n{"bookId": \n'), chunk_size=4))
+
+    def test_reimport_updates_books_and_keeps_loans(self):
+        self.import_records([{'bookId': 'I1', 'bookName': 'First', 'categories': ['Poetry'], 'totalCopies': 3}])
+        book = Book.objects.get(book_id_json='I1')
+        circulation.borrow_book(User.objects.create_user('reader', password='pw-123456'), book.pk)
+
+        self.import_records([{'bookId': 'I1', 'bookName': 'First, revised', 'categories': 'Drama', 'totalCopies': 1}])
+        book.refresh_from_db()
+        self.assertEqual((Book.objects.count(), book.book_name, book.total_copies, book.available_copies),
+                         (1, 'First, revised', 1, 0))
+        self.assertEqual([category.name for category in book.categories.all()], ['Drama'])
+        self.import_records([{'bookId': 'I1', 'bookName': 'First, revised', 'totalCopies': 4}])
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 3)  # One copy is still on loan.
+        self.assertEqual(stats.get_stats()['available_copies'], 3)
+
+    def test_bad_rows_are_skipped(self):
+        errors = self.import_records([
+            {'bookId': 'I1', 'bookName': 'Numbered', 'isbn': '111', 'pages': 'about 300'},
+            {'bookId': 'I2', 'bookName': 'Miscounted', 'totalCopies': '3 copies'},
+            {'bookId': 'I3', 'bookName': 'Null copies', 'totalCopies': 2, 'availableCopies': None},
+            {'bookId': 'I4', 'bookName': 'Same ISBN', 'isbn': '111'},
+            {'bookId': 'I5', 'bookName': 'None left', 'totalCopies': 0},
+        ])
+        books = dict(Book.objects.values_list('book_id_json', 'available_copies'))
+        self.assertEqual(books, {'I1': 1, 'I3': 2, 'I5': 0})
+        self.assertIsNone(Book.objects.get(book_id_json='I1').pages)
+        self.assertIn('Skipped bookId I2', errors)
+        self.assertIn('Skipped bookId I4', errors)  # From the row-by-row retry after the ISBN conflict.
+
+    def test_covers_are_only_set_from_existing_files(self):
+        with tempfile.TemporaryDirectory() as covers, tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            Image.new('RGB', (10, 15)).save(f'{covers}/c1.jpg')
+            errors = self.import_records([{'bookId': 'I1', 'bookName': 'Covered', 'coverImage': 'c1.jpg'},
+                                         {'bookId': 'I2', 'bookName': 'Missing', 'coverImage': 'nope.jpg'}],
+                                        '--covers-dir', covers)
+            self.assertIn('nope.jpg', errors)
+            self.import_records([{'bookId': 'I1', 'bookName': 'Covered again'}], '--covers-dir', covers)
+            covers_by_id = dict(Book.objects.values_list('book_id_json', 'cover_image_file'))
+            self.assertEqual(covers_by_id, {'I1': 'book_covers/c1.jpg', 'I2': ''})
+            self.assertTrue(Book.objects.get(book_id_json='I1').cover_image_file.storage.exists('book_covers/c1.jpg'))
+
+
+class ExportTests(TestCase):
+    def test_admin_export_streams_incremental_rows(self):
+        old = Book.objects.create(book_id_json='E1', book_name='Old', author='A', description='...')
+        Book.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=30))
+        Book.objects.create(book_id_json='E2', book_name='New', author='A', description='...')
+        url = reverse('library:export_api')
+
+        self.client.force_login(User.objects.create_user('member', password='pw-123456'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('admin', password='pw-123456', is_admin=True))
+        response = self.client.get(url, {'updated_since': (timezone.now() - timedelta(days=1)).date().isoformat()})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['bookId'] for row in rows], ['E2'])
+
+        response = self.client.get(url, {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(self.client.get(url, {'updated_since': 'yesterday'}).status_code, 400)
+
+
+class CoverRenditionTests(TestCase):
+    def test_renditions_are_generated_and_exposed(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 1800), 'navy').save(buffer, 'JPEG')
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            book = Book.objects.create(book_id_json='R1', book_name='Covered', author='A', description='...',
+                                       cover_image_file=SimpleUploadedFile('big.jpg', buffer.getvalue()))
+            cache.clear()
+            before = self.client.get(reverse('library:books_api')).json()['books'][0]
+            self.assertEqual(before['coverThumb'], before['coverImage'])
+
+            self.assertTrue(renditions.generate_for_book(book.pk, book.cover_image_file.name))
+            with Image.open(f'{media_root}/book_covers/renditions/big.jpg_card.webp') as card:
+                self.assertEqual(card.size, (300, 450))
+            after = self.client.get(reverse('library:books_api')).json()['books'][0]
+            self.assertTrue(after['coverThumb'].endswith('/book_covers/renditions/big.jpg_card.webp'))
+            self.assertIn('big.jpg_detail.webp 600w', after['coverSrcset'])
+
+            with override_settings(LIBRARY_COVER_RENDITION_FORMAT='JPEG'):
+                cache.clear()
+                stale = self.client.get(reverse('library:books_api')).json()['books'][0]
+                self.assertEqual(stale['coverThumb'], after['coverThumb'])  # The WEBP files still exist.
+                self.assertTrue(renditions.generate_for_book(book.pk, book.cover_image_file.name))
+                self.assertTrue(Book.objects.get(pk=book.pk).cover_card_url.endswith('/big.jpg_card.jpg'))
+
+    def test_rendition_names_keep_the_extension(self):
+        self.assertNotEqual(renditions.rendition_name('book_covers/a.jpg', 'card', 'WEBP'),
+                            renditions.rendition_name('book_covers/a.png', 'card', 'WEBP'))
+
+
+class LibraryStatsTests(TestCase):
+    def test_counters_track_writes(self):
+        admin = User.objects.create_user('boss', password='pw-123456', is_admin=True)
+        reader = User.objects.create_user('reader', password='pw-123456')
+        book = Book.objects.create(book_id_json='T1', book_name='Counted', author='A', description='...',
+                                   total_copies=3, available_copies=3)
+        Book.objects.create(book_id_json='T2', book_name='Gone', author='A', description='...').delete()
+        record = circulation.borrow_book(reader, book.pk)
+        circulation.borrow_book(admin, book.pk)
+        circulation.return_book(record)
+        book.refresh_from_db()
+        book.total_copies = book.available_copies = 5
+        book.save()
+        self.assertEqual(stats.get_stats(), stats.compute_stats())
+
+        self.client.force_login(admin)
+        with self.assertNumQueries(2):  # User (the session is cached), one stats row.
+            data = self.client.get(reverse('library:stats_api')).json()
+        self.assertEqual(data, {'totalBooks': 1, 'availableCopies': 5, 'borrowedBooks': 1, 'totalUsers': 2})
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.scifi = Category.objects.create(name='Sci-Fi')
+        self.books = [Book.objects.create(book_id_json=f'K{i}', book_name=f'Book {i}', author='A',
+                                          description='...', total_copies=5, available_copies=5)
+                      for i in range(6)]
+        self.readers = [User.objects.create_user(f'r{i}', password='pw-123456') for i in range(3)]
+
+    def test_co_borrowed_books_are_suggested_first(self):
+        for reader in self.readers[:2]:
+            for book in self.books[:2]:
+                circulation.borrow_book(reader, book.pk)
+        self.books[3].categories.add(self.scifi)
+        self.books[4].categories.add(self.scifi)
+        circulation.borrow_book(self.readers[1], self.books[4].pk)
+        recommendations.build_book_affinity()
+        recommendations.build_category_top_books()
+
+        newcomer = self.readers[2]
+        circulation.borrow_book(newcomer, self.books[0].pk)
+        suggested = recommendations.suggest_books(newcomer, limit=2)
+        self.assertEqual([book.pk for book in suggested], [self.books[1].pk, self.books[4].pk])
+
+    def test_falls_back_to_random_available_books(self):
+        Book.objects.filter(pk__in=[b.pk for b in self.books[:3]]).update(available_copies=0)
+        suggested = recommendations.suggest_books(self.readers[0], limit=3, exclude=[self.books[3].pk])
+        self.assertEqual({book.pk for book in suggested}, {self.books[4].pk, self.books[5].pk})
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Plan assertions are written against SQLite EXPLAIN QUERY PLAN output.')
+class QueryPlanTests(TestCase):
+    """Each hot circulation/catalog query must be answered from an index, never a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='pw-123456')
+        cls.book = Book.objects.create(book_id_json='P1', book_name='Plan', author='A', description='...')
+
+    def assertUsesIndex(self, queryset, table):
+        plan = queryset.explain()
+        steps = [line for line in plan.splitlines() if f' {table}' in line]
+        self.assertTrue(steps, plan)
+        for step in steps:
+            self.assertRegex(step, r'USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY', plan)
+
+    def test_open_loan_for_user_and_book(self):
+        qs = BorrowedBook.objects.filter(book=self.book, user=self.user, return_date__isnull=True)
+        self.assertUsesIndex(qs, 'library_borrowedbook')
+
+    def test_open_loans_per_user(self):
+        qs = BorrowedBook.objects.filter(user=self.user, return_date__isnull=True)
+        self.assertUsesIndex(qs, 'library_borrowedbook')
+
+    def test_open_loans_per_book(self):
+        qs = BorrowedBook.objects.filter(book=self.book, return_date__isnull=True)
+        self.assertUsesIndex(qs, 'library_borrowedbook')
+
+    def test_open_loans_by_due_date(self):
+        qs = BorrowedBook.objects.filter(return_date__isnull=True).select_related('user', 'book')\
+                                 .order_by('due_date', 'user__username')
+        self.assertUsesIndex(qs, 'library_borrowedbook')
+
+    def test_recently_returned_loans(self):
+        qs = BorrowedBook.objects.filter(user=self.user, return_date__isnull=False).order_by('-return_date')[:5]
+        self.assertUsesIndex(qs, 'library_borrowedbook')
+        qs = BorrowedBookArchive.objects.filter(user=self.user).order_by('-return_date', '-pk')[:51]
+        self.assertUsesIndex(qs, 'library_borrowedbookarchive')
+
+    def test_book_lookups(self):
+        self.assertUsesIndex(Book.objects.order_by('book_name', 'pk')[:24], 'library_book')
+        self.assertUsesIndex(Book.objects.filter(author='A'), 'library_book')
+        self.assertUsesIndex(Book.objects.filter(available_copies=0), 'library_book')
+
+    def test_open_loans_page_after_cursor(self):
+        now = timezone.now()
+        qs = BorrowedBook.objects.filter(return_date__isnull=True).filter(
+            Q(due_date__gte=now) & (Q(due_date__gt=now) | Q(pk__gt=1))).order_by('due_date', 'pk')[:51]
+        self.assertUsesIndex(qs, 'library_borrowedbook')
+
+    def test_next_hold_in_line(self):
+        qs = Hold.objects.filter(book=self.book, status=Hold.WAITING).order_by('created_at', 'pk')[:1]
+        self.assertUsesIndex(qs, 'library_hold')
+        self.assertUsesIndex(Hold.objects.filter(status=Hold.READY, expires_at__lte=timezone.now()), 'library_hold')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite connection tuning.')
+class SqliteTuningTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('async-admin', password='pw-123456', is_admin=True)
+        cls.member = User.objects.create_user('async-member', password='pw-123456')
+        cls.book = Book.objects.create(book_id_json='AS1', book_name='Async', author='A', description='...',
+                                       total_copies=2, available_copies=2)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_books_api(self):
+        response = await self.async_client.get(reverse('library:books_api'), {'search': 'async'})
+        self.assertEqual([book['bookId'] for book in response.json()['books']], ['AS1'])
+
+    async def test_book_details_shows_open_loan(self):
+        record = await BorrowedBook.objects.acreate(user=self.member, book=self.book, due_date=timezone.now())
+        await self.async_client.aforce_login(self.member)
+        response = await self.async_client.get(reverse('library:book_detail', args=['AS1']))
+        self.assertEqual(response.context['current_borrow_record'], record)
+        missing = await self.async_client.get(reverse('library:book_detail', args=['nope']))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_dashboard_endpoints_require_admin(self):
+        await BorrowedBook.objects.acreate(user=self.member, book=self.book, due_date=timezone.now())
+        await self.async_client.aforce_login(self.member)
+        self.assertEqual((await self.async_client.get(reverse('library:stats_api'))).status_code, 403)
+
+        await self.async_client.aforce_login(self.admin)
+        loans = (await self.async_client.get(reverse('library:all_borrowed_books_api'))).json()['borrowed_books']
+        self.assertEqual([loan['username'] for loan in loans], ['async-member'])
+        totals = (await self.async_client.get(reverse('library:stats_api'))).json()
+        self.assertEqual(totals['borrowedBooks'], 1)
+
+
+FLAKY_CALLS = []
+
+
+@tasks.task('test_flaky')
+def flaky_task(fail_times):
+    FLAKY_CALLS.append(fail_times)
+    if len(FLAKY_CALLS) <= fail_times:
+        raise RuntimeError('boom')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_failed_task_is_retried_then_marked_failed(self):
+        row = tasks.enqueue('test_flaky', {'fail_times': 5}, max_attempts=2)
+        with self.assertLogs('library.tasks', 'ERROR') as logs:
+            for _ in range(2):
+                tasks.work(worker='w1', once=True)
+                Task.objects.filter(pk=row.pk, status=Task.PENDING).update(run_at=timezone.now())  # Skip the backoff.
+        self.assertIn('RuntimeError: boom', logs.output[0])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, len(FLAKY_CALLS)), (Task.FAILED, 2, 2))
+
+    def test_claims_are_exclusive_until_the_lease_expires(self):
+        row = tasks.enqueue('test_flaky', {'fail_times': 0})
+        self.assertEqual(tasks.claim_tasks('w1'), [row])
+        self.assertEqual(tasks.claim_tasks('w2'), [])
+        Task.objects.filter(pk=row.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([t.locked_by for t in tasks.claim_tasks('w2')], ['w2'])
+
+    def test_periodic_tasks_are_queued_once_and_rescheduled(self):
+        tasks.schedule_periodic_tasks()
+        tasks.schedule_periodic_tasks()
+        self.assertEqual(Task.objects.filter(name='accrue_fines').count(), 1)
+        tasks.work(worker='w1', once=True)
+        following = Task.objects.get(name='accrue_fines', status=Task.PENDING)
+        self.assertGreater(following.run_at, timezone.now() + timedelta(hours=23))
+
+    def test_failed_periodic_task_is_rescheduled(self):
+        tasks.PERIODIC_TASKS['test_flaky'] = timedelta(hours=1)
+        self.addCleanup(tasks.PERIODIC_TASKS.pop, 'test_flaky')
+        row = tasks.enqueue('test_flaky', {'fail_times': 5}, unique_key='periodic:test_flaky', max_attempts=1)
+        with self.assertLogs('library.tasks', 'ERROR'):
+            tasks.run_task(tasks.claim_tasks('w1')[0])
+        row.refresh_from_db()
+        following = Task.objects.get(unique_key='periodic:test_flaky', status=Task.PENDING)
+        self.assertEqual(row.status, Task.FAILED)
+        self.assertGreater(following.run_at, timezone.now() + timedelta(minutes=59))
+
+
+class OverdueJobTests(TestCase):
+    def test_reminders_and_fines(self):
+        reader = User.objects.create_user('late', email='late@example.com', password='pw-123456')
+        now = timezone.now()
+        for i, days_late in enumerate([3, 100, -2]):
+            book = Book.objects.create(book_id_json=f'O{i}', book_name=f'Overdue {i}', author='A', description='...')
+            BorrowedBook.objects.create(user=reader, book=book, due_date=now - timedelta(days=days_late, hours=1))
+
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            tasks.enqueue('detect_overdue_loans')
+            tasks.enqueue('accrue_fines')
+            tasks.work(worker='w1', once=True)
+            self.assertEqual(len(mail.outbox), 2)
+            overdue.detect_overdue_loans()  # Already reminded loans are not queued again.
+            tasks.work(worker='w1', once=True)
+            self.assertEqual(len(mail.outbox), 2)
+
+        fines = dict(BorrowedBook.objects.values_list('book__book_id_json', 'fine_amount'))
+        self.assertEqual([str(fines[key]) for key in ('O0', 'O1', 'O2')], ['0.75', '10.00', '0.00'])
+
+    def test_reminders_are_sent_once_when_workers_fall_behind(self):
+        reader = User.objects.create_user('late', email='late@example.com', password='pw-123456')
+        book = Book.objects.create(book_id_json='O1', book_name='Overdue', author='A', description='...')
+        loan = BorrowedBook.objects.create(user=reader, book=book, due_date=timezone.now() - timedelta(days=3))
+        overdue.detect_overdue_loans()
+        overdue.detect_overdue_loans()  # The first chunk task is still queued.
+        self.assertEqual(Task.objects.filter(name='send_overdue_reminders').count(), 1)
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            self.assertEqual(overdue.send_overdue_reminders([loan.pk]), 1)
+            self.assertEqual(overdue.send_overdue_reminders([loan.pk]), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(LIBRARY_METRICS_TOKEN='s3cret')
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        Book.objects.create(book_id_json='M1', book_name='Measured', author='A', description='...')
+
+    def scrape(self, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', 'Bearer s3cret')
+        response = self.client.get(reverse('library:metrics'), **headers)
+        lines = response.content.decode().splitlines() if response.status_code == 200 else []
+        return response, dict(line.rsplit(' ', 1) for line in lines if not line.startswith('#'))
+
+    def test_views_queries_and_cache_are_exported(self):
+        url = reverse('library:books_api')
+        self.client.get(url)
+        self.client.get(url)
+        response, samples = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        view = 'view="library:books_api"'
+        self.assertEqual(samples[f'library_request_duration_seconds_count{{{view}}}'], '2')
+        self.assertEqual(samples[f'library_request_duration_seconds_bucket{{{view},le="+Inf"}}'], '2')
+        self.assertGreaterEqual(int(samples[f'library_db_queries_total{{{view}}}']), 2)  # Page + categories, once.
+        self.assertGreater(int(samples[f'library_response_bytes_total{{{view}}}']), 0)
+        self.assertEqual(samples['library_cache_lookups_total{cache="catalog",result="hit"}'], '1')
+        self.assertEqual(samples['library_cache_lookups_total{cache="catalog",result="miss"}'], '1')
+        self.assertEqual(samples[f'library_responses_total{{{view},method="GET",status="200"}}'], '2')
+
+    def test_unknown_methods_share_one_series(self):
+        for method in ('BREW', 'WHEN'):
+            self.client.generic(method, reverse('library:books_api'))
+        samples = self.scrape()[1]
+        self.assertEqual(samples['library_responses_total{view="library:books_api",method="other",status="200"}'], '2')
+
+    @override_settings(LIBRARY_SLOW_REQUEST_QUERIES=0)
+    def test_requests_over_budget_are_logged_with_sql(self):
+        with self.assertLogs('library.metrics', 'WARNING') as logs:
+            self.client.get(reverse('library:books_api'))
+        self.assertIn('library:books_api', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_token_protects_endpoint(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='')[0].status_code, 401)
+        self.assertEqual(self.scrape()[0].status_code, 200)
+        with override_settings(LIBRARY_METRICS_TOKEN=''):
+            self.assertEqual(self.scrape()[0].status_code, 403)  # DEBUG is off in tests.
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_seed_is_consistent_with_open_loans(self):
+        counts = benchmarks.seed(books=60, users=10, categories=4, loans=300, seed_value=7)
+        self.assertEqual((counts['books'], counts['users'], counts['loans']), (60, 10, 300))
+        for book in Book.objects.filter(book_id_json__startswith='S7-'):
+            open_loans = book.borrow_records.filter(return_date__isnull=True).count()
+            self.assertEqual(book.available_copies, max(book.total_copies - open_loans, 0))
+        self.assertTrue(self.client.login(username='S7-reader0', password=benchmarks.SEED_PASSWORD))
+
+    def test_compare_flags_p95_and_throughput_regressions(self):
+        baseline = {'fast': benchmarks.summarize([0.010] * 20), 'slow': benchmarks.summarize([0.010] * 20)}
+        current = {'fast': benchmarks.summarize([0.011] * 20), 'slow': benchmarks.summarize([0.020] * 20)}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/baseline.json'
+            benchmarks.save_results(path, baseline)
+            regressions = benchmarks.compare_results(path, current, threshold=0.2)
+        self.assertEqual(len(regressions), 2)  # p95 and throughput, both for 'slow'.
+        self.assertTrue(all(message.startswith('slow:') for message in regressions))
+
+
+class AuthFastPathTests(TestCase):
+    def setUp(self):
+        auth.clear()
+        self.user = User.objects.create_user('fast', password='pw-fast-path')
+
+    def session_request(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        return request
+
+    def test_logged_in_request_needs_no_queries_on_cache_hit(self):
+        self.client.force_login(self.user)
+        self.assertEqual(get_user(self.session_request()), self.user)  # Loads and caches the user.
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user(self.session_request()), self.user)
+
+    def test_saving_user_invalidates_cache(self):
+        self.client.force_login(self.user)
+        get_user(self.session_request())
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(get_user(self.session_request()).is_authenticated)
+
+    def test_login_rehashes_outdated_password(self):
+        old = PBKDF2PasswordHasher()
+        User.objects.filter(pk=self.user.pk).update(password=old.encode('pw-fast-path', old.salt(), iterations=1000))
+        response = self.client.post(reverse('library:login_api'), {'username': 'fast', 'password': 'pw-fast-path'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertFalse(get_hasher('default').must_update(self.user.password))
+        self.assertTrue(self.user.check_password('pw-fast-path'))
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        caches['ratelimit'].clear()
+        User.objects.create_user('target', password='right-password')
+
+    def login(self, password='wrong'):
+        return self.client.post(reverse('library:login_api'), {'username': 'Target', 'password': password},
+                                content_type='application/json')
+
+    def test_bucket_refills_over_time(self):
+        bucket, store = ratelimit.TokenBucket(rate=1, burst=2), caches['ratelimit']
+        self.assertEqual([bucket.take(store, 'k', now=100.0) for _ in range(2)], [0, 0])
+        self.assertGreater(bucket.take(store, 'k', now=100.5), 0)
+        self.assertEqual(bucket.take(store, 'k', now=105.0), 0)
+
+    def test_file_cache_counters_outlive_the_default_timeout(self):
+        with tempfile.TemporaryDirectory() as location:
+            store = FileBasedCache(location, {})
+            bucket = ratelimit.TokenBucket(rate=10 / 3600, burst=10)
+            for _ in range(2):
+                bucket.take(store, 'signup')
+            current_key = bucket._keys('signup', time.time())[0]
+            with open(store._key_to_file(current_key), 'rb') as fh:
+                expires = pickle.load(fh)
+            self.assertEqual(store.get(current_key), 2)
+            self.assertGreater(expires, time.time() + 3600)
+
+    @override_settings(LIBRARY_RATE_LIMITS={'login': [('username', 1 / 60, 2)]})
+    def test_login_is_rejected_per_username_before_any_work(self):
+        self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+        with self.assertNumQueries(0):
+            response = self.login(password='right-password')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertFalse(response.json()['success'])
+
+    @override_settings(LIBRARY_RATE_LIMITS={'unsafe': [('ip', 1 / 60, 1)]})
+    def test_middleware_limits_unsafe_methods_per_ip(self):
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.client.get(reverse('library:books_api')).status_code, 200)
+
+    @override_settings(LIBRARY_RATE_LIMITS_ENABLED=False, LIBRARY_RATE_LIMITS={'login': [('ip', 1 / 60, 1)]})
+    def test_limits_can_be_switched_off(self):
+        self.assertEqual([self.login().status_code for _ in range(3)], [401, 401, 401])
+
+
+class PageFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Poetry')
+        self.book = Book.objects.create(book_id_json='F1', book_name='Odes', author='A', description='...')
+        self.book.categories.add(self.category)
+
+    def test_category_list_is_cached_until_a_category_changes(self):
+        url = reverse('library:book_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), '<option value="Poetry">')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Drama')
+        self.assertContains(self.client.get(url), '<option value="Drama">')
+
+    def test_book_fragments_follow_book_and_category_writes(self):
+        url = reverse('library:book_detail', args=['F1'])
+        self.assertContains(self.client.get(url), 'Odes')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.book_name = 'Collected Odes'
+            self.book.save()
+        self.assertContains(self.client.get(url), '<h1 class="book-title">Collected Odes</h1>')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Verse'
+            self.category.save()
+        self.assertContains(self.client.get(url), '<span class="category-tag">Verse</span>')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.categories.add(Category.objects.create(name='Classics'))
+        self.assertContains(self.client.get(url), '<span class="category-tag">Classics</span>')
+
+    def test_bulk_import_refreshes_fragments(self):
+        detail_url, list_url = reverse('library:book_detail', args=['F1']), reverse('library:book_list')
+        self.client.get(detail_url)
+        self.client.get(list_url)
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as fh, \
+                self.captureOnCommitCallbacks(execute=True):
+            fh.write(json.dumps({'bookId': 'F1', 'bookName': 'Imported Odes', 'categories': ['Ballads']}))
+            fh.flush()
+            call_command('import_books', fh.name, stdout=io.StringIO())
+        self.assertContains(self.client.get(detail_url), '<h1 class="book-title">Imported Odes</h1>')
+        self.assertContains(self.client.get(list_url), '<option value="Ballads">')
+
+
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.TemporaryDirectory()
+        cls.production = override_settings(
+            LIBRARY_STATIC_MODE='production', STATIC_ROOT=cls.static_root.name,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'library.static.CompressedManifestStaticFilesStorage'}},
+        )
+        cls.production.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.production.disable()
+        cls.static_root.cleanup()
+        super().tearDownClass()
+
+    def test_pages_link_hashed_assets_served_compressed_and_immutable(self):
+        html = self.client.get(reverse('library:book_list')).content.decode()
+        css_url = re.search(r'href="(/static/css/style\.[0-9a-f]{12}\.css)"', html).group(1)
+        response = self.client.get(css_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'{', body)
+        self.assertLess(int(response['Content-Length']), len(body))
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.client.get('/static/images/default_cover.jpg')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.LIBRARY_STATIC_MAX_AGE}')
+        self.assertNotIn('Content-Encoding', response)
+        response = self.client.get('/static/images/default_cover.jpg',
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
@@ -15,12 +15,22 @@ urlpatterns = [
     path('add-book/', views.add_book_page_view, name='add_book_page'),
     path('api/books/add/', views.add_book_api_view, name='add_book_api'), 
     path('api/books/', views.books_api_view, name='books_api'),
+    path('api/books/search/', views.search_books_api_view, name='search_books_api'),
+    path('api/books/suggest/', views.suggest_books_api_view, name='suggest_books_api'),
     path('api/books/borrow/<int:book_pk>/', views.borrow_book_api_view, name='borrow_book_api'),
     path('api/borrowed-books/return/<int:borrowed_pk>/', views.return_book_api_view, name='return_book_api'),
+    path('api/books/hold/<int:book_pk>/', views.place_hold_api_view, name='place_hold_api'),
+    path('api/holds/cancel/<int:hold_pk>/', views.cancel_hold_api_view, name='cancel_hold_api'),
     path('edit-book/<int:book_pk>/', views.edit_book_page_view, name='edit_book_page'),
     path('api/books/update/<int:book_pk>/', views.update_book_api_view, name='update_book_api'),
     path('api/books/delete/<int:book_pk>/', views.delete_book_api_view, name='delete_book_api'),
     path('api/borrowed-books/all/', views.all_borrowed_books_api_view, name='all_borrowed_books_api'),
+    path('api/circulation/', views.circulation_api_view, name='circulation_api'),
+    path('api/loans/history/', views.loan_history_api_view, name='loan_history_api'),
+    path('api/export/', views.export_api_view, name='export_api'),
+    path('api/stats/', views.stats_api_view, name='stats_api'),
+    path('api/events/availability/', views.availability_events_view, name='availability_events'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('admin-dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
     path('user-dashboard/', views.user_dashboard_view, name='user_dashboard'),
 ]
\ No newline at end of file
@@ -1,16 +1,27 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import authenticate, login as django_login, logout as django_logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.utils import timezone
-from django.db import transaction, models as django_db_models
-from django.templatetags.static import static 
-from datetime import timedelta
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 import json
 
-from .models import User, Book, Category, BorrowedBook
+from .models import User, Book, Category, BorrowedBook, Hold
 from .forms import BookForm
+from .catalog import MAX_PAGE_SIZE, MAX_PK, SEARCH_TYPES, InvalidCatalogQuery, apaginate_books, filter_books
+from .serializers import CATALOG_FIELDS, aserialize_catalog_rows, serialize_catalog_rows
+from . import archive, circulation, events, holds, loans, metrics, recommendations, renditions, search as book_search, stats, suggest
+from .ratelimit import rate_limit
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, export_lines, parse_updated_since
+from .cache import (
+    aget_book_version, aget_cached_catalog_page, aget_catalog_version, aget_category_version, aset_cached_catalog_page,
+    catalog_cache_key, get_categories, get_category_version,
+)
 
 # --- Standard Page Rendering Views ---
 
@@ -32,31 +43,34 @@ def signup_page_view(request):
 
 def book_list_view(request):
     """Renders the main book listing page. Books are typically loaded via AJAX."""
-    categories = Category.objects.all().order_by('name')
     context = {
-        'categories_for_filter': categories,
+        'categories_for_filter': get_categories, # Called by the template only if its cached fragment expired
+        'category_version': get_category_version(),
+        'fragment_timeout': settings.LIBRARY_FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'book_list.html', context)
 
-def book_details_view(request, book_id): 
+async def book_details_view(request, book_id):
     """Renders the detail page for a single book."""
-    book = get_object_or_404(Book, book_id_json=book_id)
-    user_has_borrowed_this_book = False
+    book = await aget_object_or_404(Book, book_id_json=book_id)
+    user = await request.auser()
     current_borrow_record = None
 
-    if request.user.is_authenticated:
-        current_borrow_record = BorrowedBook.objects.filter(
-            book=book, user=request.user, return_date__isnull=True
-        ).first()
-        if current_borrow_record:
-            user_has_borrowed_this_book = True
-    
+    if user.is_authenticated:
+        current_borrow_record = await BorrowedBook.objects.filter(
+            book=book, user=user, return_date__isnull=True
+        ).afirst()
+
     context = {
         'book': book,
-        'user_has_borrowed_this_book': user_has_borrowed_this_book,
+        'user_has_borrowed_this_book': current_borrow_record is not None,
         'current_borrow_record': current_borrow_record,
+        'book_version': await aget_book_version(book.pk),
+        'category_version': await aget_category_version(),
+        'fragment_timeout': settings.LIBRARY_FRAGMENT_CACHE_TIMEOUT,
     }
-    return render(request, 'book_details.html', context)
+    # Templates and context processors may still touch the ORM synchronously.
+    return await sync_to_async(render)(request, 'book_details.html', context)
 
 @login_required
 @ensure_csrf_cookie 
@@ -65,10 +79,9 @@ def add_book_page_view(request):
     if not request.user.is_admin:
         return redirect('library:index') 
     
-    categories = Category.objects.all().order_by('name')
     form = BookForm() 
     context = {
-        'categories_from_db': categories,
+        'categories_from_db': get_categories(),
         'form_for_template': form,
         'is_editing': False,
         'book_instance': None,
@@ -86,12 +99,10 @@ def edit_book_page_view(request, book_pk):
     book_instance = get_object_or_404(Book, pk=book_pk)
     form = BookForm(instance=book_instance, initial={'book_id_json': book_instance.book_id_json})
     selected_category_names = [cat.name for cat in book_instance.categories.all()]
-    all_categories = Category.objects.all().order_by('name')
-    
     context = {
         'form_for_template': form,
         'book_instance': book_instance,
-        'categories_from_db': all_categories,
+        'categories_from_db': get_categories(),
         'selected_category_names': selected_category_names,
         'is_editing': True
     }
@@ -103,16 +114,12 @@ def admin_dashboard_view(request):
     if not request.user.is_admin:
         return redirect('library:user_dashboard')
     
-    total_books_count = Book.objects.count()
-    available_books_sum = Book.objects.aggregate(total_available=django_db_models.Sum('available_copies'))['total_available'] or 0
-    borrowed_books_count = BorrowedBook.objects.filter(return_date__isnull=True).count()
-    total_users_count = User.objects.count()
-
+    library_stats = stats.get_stats() # One-row read; counters are maintained incrementally
     context = {
-        'total_books_count': total_books_count,
-        'available_books_sum': available_books_sum,
-        'borrowed_books_count': borrowed_books_count,
-        'total_users_count': total_users_count,
+        'total_books_count': library_stats['total_books'],
+        'available_books_sum': library_stats['available_copies'],
+        'borrowed_books_count': library_stats['borrowed_books'],
+        'total_users_count': library_stats['total_users'],
     }
     return render(request, 'admin_dashboard.html', context)
 
@@ -123,10 +130,10 @@ def user_dashboard_view(request):
         return redirect('library:admin_dashboard') 
 
     current_borrowed = BorrowedBook.objects.filter(user=request.user, return_date__isnull=True).select_related('book')
-    past_borrowed = BorrowedBook.objects.filter(user=request.user, return_date__isnull=False).select_related('book').order_by('-return_date')[:5]
+    past_borrowed = archive.recent_returns(request.user, limit=5)
     
-    borrowed_pks = current_borrowed.values_list('book__pk', flat=True)
-    suggested = Book.objects.exclude(pk__in=borrowed_pks).filter(available_copies__gt=0).order_by('?')[:3]
+    borrowed_pks = [record.book_id for record in current_borrowed]
+    suggested = recommendations.suggest_books(request.user, limit=3, exclude=borrowed_pks)
 
     context = {
         'current_borrowed_books': current_borrowed,
@@ -137,34 +144,66 @@ def user_dashboard_view(request):
 
 # --- API Views ---
 
-def books_api_view(request):
-    """API endpoint to get a list of all books."""
-    books_qs = Book.objects.all().order_by('book_name')
-    books_data = []
-    for book in books_qs:
-        cover_url = None
-        if book.cover_image_file and hasattr(book.cover_image_file, 'url'):
-            cover_url = book.cover_image_file.url
-        else: cover_url = static('images/default_cover.jpg') 
-
-        books_data.append({
-            'bookId': book.book_id_json,
-            'bookName': book.book_name,
-            'author': book.author,
-            'categories': [cat.name for cat in book.categories.all()],
-            'description': book.description,
-            'publisher': book.publisher,
-            'publicationDate': book.publication_date.isoformat() if book.publication_date else None,
-            'language': book.language,
-            'pages': book.pages,
-            'isbn': book.isbn,
-            'coverImage': cover_url,
-            'availability': book.is_available,
-            'availableCopies': book.available_copies,
-            'totalCopies': book.total_copies,
-            'django_pk': book.pk
-        })
-    return JsonResponse({'books': books_data})
+async def books_api_view(request):
+    """API endpoint returning one keyset-paginated page of the filtered, sorted catalog.
+
+    Responses are cached per catalog version and query string, and carry an ETag
+    so unchanged pages are answered with 304 without touching the database.
+    """
+    cache_key, etag = catalog_cache_key(await aget_catalog_version(), request.META.get('QUERY_STRING', ''))
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        content = await aget_cached_catalog_page(cache_key)
+        if content is None:
+            try:
+                books_qs = filter_books(Book.objects.values(*CATALOG_FIELDS), request.GET,
+                                        search_available=await book_search.ais_search_available())
+                page, next_cursor = await apaginate_books(books_qs, request.GET)
+            except InvalidCatalogQuery as e:
+                return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+            books_data = await aserialize_catalog_rows(page)
+            content = JsonResponse({'books': books_data, 'nextCursor': next_cursor, 'hasMore': next_cursor is not None}).content
+            await aset_cached_catalog_page(cache_key, content)
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def search_books_api_view(request):
+    """API endpoint returning the best full-text matches for q, most relevant first."""
+    query = (request.GET.get('q') or '').strip()
+    search_type = request.GET.get('search_type') or 'all'
+    if search_type not in SEARCH_TYPES:
+        return JsonResponse({'success': False, 'message': f'Unknown search_type "{search_type}".'}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get('limit') or 20), MAX_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'limit must be an integer.'}, status=400)
+    if not query:
+        return JsonResponse({'books': []})
+
+    if book_search.is_search_available():
+        ranked_pks = book_search.ranked_book_ids(query, search_type, limit)
+        rows = {row['pk']: row for row in Book.objects.filter(pk__in=ranked_pks).values(*CATALOG_FIELDS)}
+        rows = [rows[pk] for pk in ranked_pks if pk in rows]
+    else:
+        books_qs = filter_books(Book.objects.values(*CATALOG_FIELDS), {'search': query, 'search_type': search_type})
+        rows = list(books_qs.order_by('book_name', 'pk')[:limit])
+    return JsonResponse({'books': serialize_catalog_rows(rows)})
+
+async def suggest_books_api_view(request):
+    """API endpoint returning search-box suggestions: titles, authors and categories with a word starting with q."""
+    search_type = request.GET.get('search_type') or 'all'
+    if search_type not in SEARCH_TYPES:
+        return JsonResponse({'success': False, 'message': f'Unknown search_type "{search_type}".'}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get('limit') or suggest.DEFAULT_LIMIT), suggest.MAX_LIMIT))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'limit must be an integer.'}, status=400)
+    types = suggest.SUGGEST_TYPES if search_type == 'all' else (search_type,)
+    return JsonResponse({'suggestions': await suggest.asuggest(request.GET.get('q') or '', types, limit)})
 
 @login_required
 def add_book_api_view(request):
@@ -189,6 +228,7 @@ def add_book_api_view(request):
                         categories_to_add.append(category)
                     if categories_to_add:
                         new_book.categories.set(categories_to_add) 
+                    renditions.schedule_renditions(new_book) # Resized covers are built after commit
 
                     return JsonResponse({
                         'success': True, 'message': 'Book added successfully!',
@@ -214,10 +254,26 @@ def update_book_api_view(request, book_pk):
         if form.is_valid():
             try:
                 with transaction.atomic():
+                    # Locked so no borrow or return lands between this read and the shift below.
+                    previous_total, previous_available = Book.objects.select_for_update().filter(pk=book_pk)\
+                                                             .values_list('total_copies', 'available_copies').get()
                     updated_book = form.save(commit=False)
-                    if updated_book.available_copies > updated_book.total_copies:
-                        updated_book.available_copies = updated_book.total_copies
-                    updated_book.save() # Saves main fields and ImageField if new one uploaded
+                    # available_copies is never written from the form's read: circulation changes it concurrently.
+                    update_fields = list(form._meta.fields) + ['updated_at']
+                    cover_changed = 'cover_image_file' in form.changed_data
+                    if cover_changed:
+                        updated_book.cover_rendition_format = '' # Serve the original until new renditions exist
+                        update_fields.append('cover_rendition_format')
+                    updated_book.save(update_fields=update_fields) # Saves main fields and ImageField if new one uploaded
+                    if cover_changed:
+                        renditions.schedule_renditions(updated_book)
+                    change = updated_book.total_copies - previous_total
+                    if change:
+                        circulation.shift_available_copies([book_pk], change)
+                        updated_book.available_copies = Book.objects.filter(pk=book_pk)\
+                                                                    .values_list('available_copies', flat=True).get()
+                        stats.adjust(available_copies=updated_book.available_copies - previous_available)
+                        events.schedule_availability_event([book_pk])
 
                     # Update categories M2M
                     category_names = request.POST.getlist('categories_checkbox')
@@ -261,58 +317,118 @@ def delete_book_api_view(request, book_pk):
     return JsonResponse({'success': False, 'message': 'POST request required.'}, status=405)
 
 @login_required 
+@rate_limit('circulation')
 def borrow_book_api_view(request, book_pk):
     """API endpoint for authenticated users to borrow a book."""
     if request.method == 'POST':
-        book_to_borrow = get_object_or_404(Book, pk=book_pk)
-
-        if not book_to_borrow.is_available:
-            return JsonResponse({'success': False, 'message': 'Book is not available.'}, status=400)
-        if BorrowedBook.objects.filter(user=request.user, book=book_to_borrow, return_date__isnull=True).exists():
-            return JsonResponse({'success': False, 'message': 'You have already borrowed this book.'}, status=400)
-
         try:
-            with transaction.atomic():
-                book_to_borrow.available_copies -= 1
-                book_to_borrow.save()
-                due_date = timezone.now() + timedelta(days=14) # 2-week borrow period
-                BorrowedBook.objects.create(user=request.user, book=book_to_borrow, due_date=due_date)
-            return JsonResponse({'success': True, 'message': f'"{book_to_borrow.book_name}" borrowed! Due: {due_date.strftime("%b %d, %Y")}.'})
+            record = circulation.borrow_book(request.user, book_pk)
+        except Book.DoesNotExist:
+            return JsonResponse({'success': False, 'message': 'Book not found.'}, status=404)
+        except circulation.BookUnavailable as e:
+            return JsonResponse({'success': False, 'message': str(e), 'can_hold': True}, status=400)
+        except circulation.CirculationError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
         except Exception as e:
             print(f"Borrow Book API Error: {e}")
             return JsonResponse({'success': False, 'message': f'Error borrowing book: {e}'}, status=500)
+        book_name = Book.objects.filter(pk=book_pk).values_list('book_name', flat=True).first()
+        return JsonResponse({'success': True, 'message': f'"{book_name}" borrowed! Due: {record.due_date.strftime("%b %d, %Y")}.',
+                             'borrowed_pk': record.pk})
     return JsonResponse({'success': False, 'message': 'POST request required.'}, status=405)
 
 @login_required
+@rate_limit('circulation')
 def return_book_api_view(request, borrowed_pk):
     """API endpoint for a user or admin to return a borrowed book."""
     if request.method == 'POST':
+        borrowed_record = get_object_or_404(BorrowedBook.objects.select_related('book'), pk=borrowed_pk)
         try:
-            borrowed_record = get_object_or_404(BorrowedBook, pk=borrowed_pk)
-            if borrowed_record.user != request.user and not request.user.is_admin:
+            if borrowed_record.user_id != request.user.pk and not request.user.is_admin:
                 return JsonResponse({'success': False, 'message': 'Permission denied to return this book.'}, status=403)
             if borrowed_record.return_date is not None:
                 return JsonResponse({'success': False, 'message': 'Book already returned.'}, status=400)
 
-            with transaction.atomic():
-                borrowed_record.return_date = timezone.now()
-                borrowed_record.save()
-                book = borrowed_record.book
-                book.available_copies += 1
-                if book.available_copies > book.total_copies: book.available_copies = book.total_copies
-                book.save()
-            return JsonResponse({'success': True, 'message': f'"{book.book_name}" returned successfully.'})
-        except BorrowedBook.DoesNotExist:
-             return JsonResponse({'success': False, 'message': 'Borrowed record not found.'}, status=404)
+            circulation.return_book(borrowed_record)
+            return JsonResponse({'success': True, 'message': f'"{borrowed_record.book.book_name}" returned successfully.'})
+        except circulation.AlreadyReturned as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
         except Exception as e:
             print(f"Return Book API Error: {e}")
             return JsonResponse({'success': False, 'message': f'Error returning book: {e}'}, status=500)
     return JsonResponse({'success': False, 'message': 'POST request required.'}, status=405)
 
 @login_required
-def all_borrowed_books_api_view(request):
-    """API endpoint for admins to view all currently borrowed books."""
-    if not request.user.is_admin:
+@rate_limit('circulation')
+def place_hold_api_view(request, book_pk):
+    """API endpoint for authenticated users to join the queue for an unavailable book."""
+    if request.method == 'POST':
+        try:
+            hold = holds.place_hold(request.user, book_pk)
+        except Book.DoesNotExist:
+            return JsonResponse({'success': False, 'message': 'Book not found.'}, status=404)
+        except circulation.CirculationError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        except Exception as e:
+            print(f"Place Hold API Error: {e}")
+            return JsonResponse({'success': False, 'message': f'Error placing hold: {e}'}, status=500)
+        position = holds.queue_position(hold)
+        return JsonResponse({'success': True, 'message': f'Hold placed. You are number {position} in line.',
+                             'hold_pk': hold.pk, 'position': position})
+    return JsonResponse({'success': False, 'message': 'POST request required.'}, status=405)
+
+@login_required
+@rate_limit('circulation')
+def cancel_hold_api_view(request, hold_pk):
+    """API endpoint for a user or admin to cancel a hold."""
+    if request.method == 'POST':
+        hold = get_object_or_404(Hold, pk=hold_pk)
+        if hold.user_id != request.user.pk and not request.user.is_admin:
+            return JsonResponse({'success': False, 'message': 'Permission denied to cancel this hold.'}, status=403)
+        try:
+            holds.cancel_hold(hold)
+        except circulation.CirculationError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        except Exception as e:
+            print(f"Cancel Hold API Error: {e}")
+            return JsonResponse({'success': False, 'message': f'Error cancelling hold: {e}'}, status=500)
+        return JsonResponse({'success': True, 'message': 'Hold cancelled.'})
+    return JsonResponse({'success': False, 'message': 'POST request required.'}, status=405)
+
+@login_required
+async def circulation_api_view(request):
+    """API endpoint for admins to page through open loans, with filters and optional totals."""
+    user = await request.auser()
+    if not user.is_admin:
+        return JsonResponse({'success': False, 'message': 'Permission denied.'}, status=403)
+    try:
+        page, next_cursor, totals = await loans.alist_open_loans(request.GET)
+    except loans.InvalidLoanQuery as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    data = {'loans': page, 'nextCursor': next_cursor, 'hasMore': next_cursor is not None}
+    if totals is not None:
+        data['totals'] = totals
+    return JsonResponse(data)
+
+@login_required
+def loan_history_api_view(request):
+    """API endpoint paging through returned loans, archived ones included: a reader's own, or any for admins."""
+    user_id = request.user.pk
+    if request.user.is_admin:
+        user_id = request.GET.get('user') or None
+        if user_id is not None and not (user_id.isascii() and user_id.isdigit() and int(user_id) <= MAX_PK):
+            return JsonResponse({'success': False, 'message': 'user must be a user id.'}, status=400)
+    try:
+        page, next_cursor = loans.list_loan_history(request.GET, user_id=user_id)
+    except loans.InvalidLoanQuery as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({'loans': page, 'nextCursor': next_cursor, 'hasMore': next_cursor is not None})
+
+@login_required
+async def all_borrowed_books_api_view(request):
+    """API endpoint for admins to view all currently borrowed books (see circulation_api_view for large libraries)."""
+    user = await request.auser()
+    if not user.is_admin:
         return JsonResponse({'success': False, 'message': 'Permission denied.'}, status=403)
 
     borrowed_records = BorrowedBook.objects.filter(return_date__isnull=True)\
@@ -323,10 +439,69 @@ def all_borrowed_books_api_view(request):
         'book_title': rec.book.book_name, 'book_pk': rec.book.pk,
         'borrow_date': rec.borrow_date.strftime('%Y-%m-%d %H:%M') if rec.borrow_date else None,
         'due_date': rec.due_date.strftime('%Y-%m-%d') if rec.due_date else None,
-    } for rec in borrowed_records]
+    } async for rec in borrowed_records.aiterator()]
     return JsonResponse({'borrowed_books': borrowed_data})
 
+@login_required
+async def stats_api_view(request):
+    """API endpoint for admins to read the dashboard statistics."""
+    user = await request.auser()
+    if not user.is_admin:
+        return JsonResponse({'success': False, 'message': 'Permission denied.'}, status=403)
+    library_stats = await stats.aget_stats()
+    return JsonResponse({
+        'totalBooks': library_stats['total_books'],
+        'availableCopies': library_stats['available_copies'],
+        'borrowedBooks': library_stats['borrowed_books'],
+        'totalUsers': library_stats['total_users'],
+    })
+
+async def availability_events_view(request):
+    """Server-Sent Events stream of availability changes for the book pages."""
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the endless stream in a worker thread; 204 tells EventSource not to reconnect.
+        return HttpResponse(status=204)
+    if events.broker.subscriber_count() >= settings.LIBRARY_EVENTS_MAX_STREAMS:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '30'
+        return response
+    response = StreamingHttpResponse(events.stream(request.headers.get('Last-Event-ID')),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream.
+    return response
+
+@login_required
+def export_api_view(request):
+    """API endpoint for admins to stream the catalog or loan history as JSONL or CSV."""
+    if not request.user.is_admin:
+        return JsonResponse({'success': False, 'message': 'Permission denied.'}, status=403)
+
+    dataset = request.GET.get('dataset', 'books')
+    fmt = request.GET.get('format', 'jsonl')
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'message': 'Unknown dataset or format.'}, status=400)
+    try:
+        updated_since = parse_updated_since(request.GET.get('updated_since'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_lines(dataset, fmt, updated_since), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the request metrics of this process."""
+    token = settings.LIBRARY_METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponse('Set LIBRARY_METRICS_TOKEN to enable /metrics.', status=403, content_type='text/plain')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- Authentication API Views ---
+@rate_limit('signup')
 def signup_api_view(request):
     """API endpoint for user registration."""
     if request.method == 'POST':
@@ -359,6 +534,7 @@ def signup_api_view(request):
             return JsonResponse({'success': False, 'message': f'An unexpected error occurred during signup.'}, status=500)
     return JsonResponse({'success': False, 'message': 'POST request required.'}, status=405)
 
+@rate_limit('login')
 def login_api_view(request):
     """API endpoint for user login."""
     if request.method == 'POST':
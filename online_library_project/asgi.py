@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'online_library_project.settings')
 
 application = get_asgi_application()
+
+# ASGI servers (uvicorn, daphne) don't serve static/ like runserver does; in
+# production mode library.static.StaticFilesMiddleware serves STATIC_ROOT.
+if settings.DEBUG and settings.LIBRARY_STATIC_MODE == 'development':
+    application = ASGIStaticFilesHandler(application)
@@ -1,4 +1,7 @@
 
+from datetime import timedelta
+from decimal import Decimal
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -13,9 +16,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-0#urtc%+@-i8*u1zs#lodwr3$ffv45pn7obv)h)ramb9!id0so'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# LIBRARY_DEBUG=0 turns it off; list the served host names in LIBRARY_ALLOWED_HOSTS then.
+DEBUG = os.environ.get('LIBRARY_DEBUG', '1') != '0'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('LIBRARY_ALLOWED_HOSTS', '').split(',') if host.strip()]
 
 
 # Application definition
@@ -31,7 +35,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.RequestMetricsMiddleware', # Outermost, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
+    'library.static.StaticFilesMiddleware', # Production static mode only (LIBRARY_STATIC_MODE)
+    'library.ratelimit.RateLimitMiddleware', # Sheds floods before sessions are touched
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -42,6 +49,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'online_library_project.urls'
 
+# With no explicit 'loaders', Django wraps the filesystem and app loaders in the
+# cached loader, so each template is compiled once per process (under runserver
+# the cache is reset when a template file changes). Compare with
+# `python manage.py bench_pages`, which also renders through uncached loaders.
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -65,14 +76,191 @@ WSGI_APPLICATION = 'online_library_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db.sqlite3'),
+# LIBRARY_DB_PROFILE selects the backend:
+#   sqlite   (default) the project file with the pragmas in LIBRARY_SQLITE_PRAGMAS,
+#            applied to every new connection by library.db.
+#   postgres PostgreSQL configured from LIBRARY_DB_* variables. Needs
+#            `pip install "psycopg[binary,pool]"`. Uses Django's native psycopg
+#            pool unless LIBRARY_DB_POOL=0, in which case connections are
+#            persistent (CONN_MAX_AGE) instead. The pool manages connection
+#            lifetime itself, so the two can't be combined.
+
+LIBRARY_DB_PROFILE = os.environ.get('LIBRARY_DB_PROFILE', 'sqlite')
+
+if LIBRARY_DB_PROFILE == 'postgres':
+    LIBRARY_DB_POOL = os.environ.get('LIBRARY_DB_POOL', '1') != '0'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('LIBRARY_DB_NAME', 'online_library'),
+            'USER': os.environ.get('LIBRARY_DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('LIBRARY_DB_PASSWORD', ''),
+            'HOST': os.environ.get('LIBRARY_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('LIBRARY_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if LIBRARY_DB_POOL else int(os.environ.get('LIBRARY_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('LIBRARY_DB_POOL_MIN', '2')),
+                    'max_size': int(os.environ.get('LIBRARY_DB_POOL_MAX', '20')),
+                    'timeout': 10,
+                },
+            } if LIBRARY_DB_POOL else {},
+        }
+    }
+elif LIBRARY_DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db.sqlite3'),
+            'OPTIONS': {
+                # Take the write lock when a transaction starts, so two writers queue
+                # on busy_timeout instead of failing a read-to-write lock upgrade.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ValueError(f"Unknown LIBRARY_DB_PROFILE {LIBRARY_DB_PROFILE!r}; use 'sqlite' or 'postgres'.")
+
+# WAL lets readers run alongside the single writer; synchronous=NORMAL is
+# durable across application crashes in WAL mode (only an OS crash can lose
+# the last commits); busy_timeout (ms) makes writers wait instead of raising
+# "database is locked"; mmap_size (bytes) serves reads from mapped memory.
+LIBRARY_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default. Set LIBRARY_CACHE_BACKEND=file when running several
+# worker processes so they share cached catalog pages and the catalog version.
+
+# Sessions and rate-limit counters get their own aliases so catalog pages never evict them.
+
+if os.environ.get('LIBRARY_CACHE_BACKEND') == 'file':
+    LIBRARY_CACHE_DIR = os.environ.get('LIBRARY_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': LIBRARY_CACHE_DIR,
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(LIBRARY_CACHE_DIR, 'sessions'),
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        },
+        'ratelimit': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(LIBRARY_CACHE_DIR, 'ratelimit'),
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'online-library',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'online-library-sessions',
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        },
+        'ratelimit': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'online-library-ratelimit',
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        },
+    }
+
+# Rate-limit counters need an atomic incr() to be exact across processes (see
+# library.ratelimit). LIBRARY_RATELIMIT_REDIS_URL (e.g. redis://localhost:6379/1,
+# needs the redis package) keeps them in Redis; otherwise the file profile's
+# limits are shared but best-effort, and local memory limits each process alone.
+if os.environ.get('LIBRARY_RATELIMIT_REDIS_URL'):
+    CACHES['ratelimit'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['LIBRARY_RATELIMIT_REDIS_URL'],
     }
+
+# Seconds a rendered catalog page stays cached; writes invalidate it sooner.
+LIBRARY_CATALOG_CACHE_TIMEOUT = 300
+# Seconds the category list and {% cache %} page fragments stay cached. Their
+# keys carry a version that writes bump (see library.cache), so this only
+# bounds how long orphaned entries occupy the cache.
+LIBRARY_FRAGMENT_CACHE_TIMEOUT = 3600
+
+
+
+# Sessions and authentication
+# LIBRARY_SESSION_ENGINE selects where sessions live:
+#   cached_db      (default) the 'sessions' cache in front of the django_session
+#                  table: reads are served from the cache, writes go to both.
+#   signed_cookies the session is the (signed, not encrypted) cookie itself: no
+#                  server-side reads or writes, but a session can't be revoked
+#                  before it expires except by rotating SECRET_KEY.
+#   db             the django_session table only.
+# Logged-in users are cached per process by library.auth for
+# LIBRARY_USER_CACHE_TIMEOUT seconds (0 disables it); saves and deletes in the
+# same process invalidate the entry at once.
+
+LIBRARY_SESSION_ENGINES = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}
+LIBRARY_SESSION_ENGINE = os.environ.get('LIBRARY_SESSION_ENGINE', 'cached_db')
+if LIBRARY_SESSION_ENGINE not in LIBRARY_SESSION_ENGINES:
+    raise ValueError(f"Unknown LIBRARY_SESSION_ENGINE {LIBRARY_SESSION_ENGINE!r}; "
+                     f"use one of {', '.join(LIBRARY_SESSION_ENGINES)}.")
+SESSION_ENGINE = LIBRARY_SESSION_ENGINES[LIBRARY_SESSION_ENGINE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+AUTHENTICATION_BACKENDS = ['library.auth.CachedModelBackend']
+LIBRARY_USER_CACHE_TIMEOUT = 60
+LIBRARY_USER_CACHE_SIZE = 10_000
+
+# The first hasher hashes new passwords; the rest only verify older hashes,
+# which are upgraded to the first one at the next successful login.
+# LIBRARY_PASSWORD_HASHER picks the first: 'argon2' (default when argon2-cffi
+# is installed), 'pbkdf2' (the default otherwise) or 'scrypt'. Parameters are
+# in library.hashers; compare them with `python manage.py bench_hashers`.
+LIBRARY_PASSWORD_HASHERS = {
+    'argon2': 'library.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'library.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
 }
+LIBRARY_PASSWORD_HASHER = os.environ.get('LIBRARY_PASSWORD_HASHER', 'argon2' if find_spec('argon2') else 'pbkdf2')
+if LIBRARY_PASSWORD_HASHER not in LIBRARY_PASSWORD_HASHERS:
+    raise ValueError(f"Unknown LIBRARY_PASSWORD_HASHER {LIBRARY_PASSWORD_HASHER!r}; "
+                     f"use one of {', '.join(LIBRARY_PASSWORD_HASHERS)}.")
+PASSWORD_HASHERS = [LIBRARY_PASSWORD_HASHERS[LIBRARY_PASSWORD_HASHER]] + [
+    hasher for name, hasher in LIBRARY_PASSWORD_HASHERS.items() if name != LIBRARY_PASSWORD_HASHER
+] + [
+    # The rest of Django's defaults. Hashes made with Django's own PBKDF2 or
+    # Argon2 parameters verify with the tuned classes above (same algorithm).
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
 
 
+# Rate limits (library.ratelimit): scope -> [(key, tokens per second, burst)].
+# 'unsafe' covers every POST/PUT/PATCH/DELETE; the others are applied by the
+# rate_limit decorator on the auth and circulation API views. Set
+# LIBRARY_RATE_LIMITS=0 to switch limiting off (e.g. for load tests from one host).
+LIBRARY_RATE_LIMITS_ENABLED = os.environ.get('LIBRARY_RATE_LIMITS', '1') != '0'
+LIBRARY_RATE_LIMITS = {
+    'unsafe': [('ip', 20, 200)],
+    'login': [('ip', 1, 20), ('username', 5 / 60, 10)],
+    'signup': [('ip', 10 / 3600, 10)],
+    'circulation': [('user', 1, 30)],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -119,4 +307,79 @@ AUTH_USER_MODEL = 'library.User'
 LOGIN_URL = '/login/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media')
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles_build', 'static')
\ No newline at end of file
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles_build', 'static')
+
+# LIBRARY_STATIC_MODE=production makes collectstatic write content-hashed,
+# precompressed (.gz, and .br with the brotli package) files to STATIC_ROOT,
+# and library.static.StaticFilesMiddleware serve them with immutable caching.
+# Run collectstatic before starting the server, and `runserver --nostatic` so
+# runserver's own static handler stays out of the way. Production mode needs
+# DEBUG off (LIBRARY_DEBUG=0): under DEBUG, {% static %} links the unhashed
+# names, which must not be cached as immutable. The default 'development'
+# mode serves static/ as is.
+LIBRARY_STATIC_MODE = os.environ.get('LIBRARY_STATIC_MODE', 'development')
+if LIBRARY_STATIC_MODE not in ('development', 'production'):
+    raise ValueError(f"Unknown LIBRARY_STATIC_MODE {LIBRARY_STATIC_MODE!r}; use 'development' or 'production'.")
+if LIBRARY_STATIC_MODE == 'production' and DEBUG:
+    raise ValueError("LIBRARY_STATIC_MODE='production' requires DEBUG off; set LIBRARY_DEBUG=0 and LIBRARY_ALLOWED_HOSTS.")
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'library.static.CompressedManifestStaticFilesStorage' if LIBRARY_STATIC_MODE == 'production'
+                   else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+# Seconds browsers may reuse static files requested by their unhashed names.
+LIBRARY_STATIC_MAX_AGE = 300
+
+# Resized cover images (see library.renditions): 'WEBP' or 'JPEG', and the size of
+# the background thread pool that builds them after an upload (0 = inline).
+LIBRARY_COVER_RENDITION_FORMAT = os.environ.get('LIBRARY_COVER_RENDITION_FORMAT', 'WEBP')
+LIBRARY_RENDITION_WORKERS = 2
+# Email (overdue reminders). The console backend prints messages; use
+# LIBRARY_EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend with
+# EMAIL_FILE_PATH to keep them as files, or an SMTP backend in production.
+EMAIL_BACKEND = os.environ.get('LIBRARY_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('LIBRARY_EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+DEFAULT_FROM_EMAIL = os.environ.get('LIBRARY_FROM_EMAIL', 'library@localhost')
+
+# Overdue fines accrued daily by the accrue_fines task (see library.overdue).
+LIBRARY_FINE_PER_DAY = Decimal('0.25')
+LIBRARY_FINE_CAP = Decimal('10.00')
+
+# Live availability events (library.events), streamed to the book pages at
+# /api/events/availability/ by the ASGI application (asgi.py); under WSGI the
+# stream answers 204 and pages keep fetching the catalog instead.
+# LIBRARY_EVENTS_BACKEND selects how events reach the streams:
+#   local  (default) straight to the streams of the process that committed the
+#          change; enough for a single ASGI server process.
+#   db     through the AvailabilityChange table, which every process with open
+#          streams polls every LIBRARY_EVENTS_POLL_INTERVAL seconds.
+LIBRARY_EVENTS_BACKEND = os.environ.get('LIBRARY_EVENTS_BACKEND', 'local')
+if LIBRARY_EVENTS_BACKEND not in ('local', 'db'):
+    raise ValueError(f"Unknown LIBRARY_EVENTS_BACKEND {LIBRARY_EVENTS_BACKEND!r}; use 'local' or 'db'.")
+LIBRARY_EVENTS_POLL_INTERVAL = 0.5
+LIBRARY_EVENTS_RETENTION = timedelta(hours=1)
+LIBRARY_EVENTS_KEEPALIVE = 15  # Seconds between comment lines that keep idle proxies from closing streams.
+LIBRARY_EVENTS_MAX_STREAMS = 10_000  # Open streams per process; more get 503 and retry later.
+
+# Days a reader has to borrow a copy reserved for their hold before the
+# expire_holds task passes it to the next reader in line (see library.holds).
+LIBRARY_HOLD_PICKUP_DAYS = 3
+
+# Returned loans older than this many days are moved from BorrowedBook to
+# BorrowedBookArchive by the daily archive_loans task (or manage.py
+# archive_loans), so the loan table holds current circulation, not years of
+# history (see library.archive).
+LIBRARY_LOAN_ARCHIVE_AFTER_DAYS = int(os.environ.get('LIBRARY_LOAN_ARCHIVE_AFTER_DAYS', '365'))
+
+# Request metrics (library.metrics), served at /metrics. When LIBRARY_METRICS_TOKEN
+# is set, scrapers must send "Authorization: Bearer <token>"; without a token the
+# endpoint is only open while DEBUG is on and answers 403 otherwise. Requests slower than
+# LIBRARY_SLOW_REQUEST_MS or running more than LIBRARY_SLOW_REQUEST_QUERIES
+# statements are logged with their SQL on the library.metrics logger (None = off).
+LIBRARY_METRICS_TOKEN = os.environ.get('LIBRARY_METRICS_TOKEN', '')
+LIBRARY_SLOW_REQUEST_MS = int(os.environ['LIBRARY_SLOW_REQUEST_MS']) if os.environ.get('LIBRARY_SLOW_REQUEST_MS') else None
+LIBRARY_SLOW_REQUEST_QUERIES = int(os.environ['LIBRARY_SLOW_REQUEST_QUERIES']) if os.environ.get('LIBRARY_SLOW_REQUEST_QUERIES') else None
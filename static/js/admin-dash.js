@@ -1,11 +1,17 @@
 
-let allAdminBooks = []; 
+let allAdminBooks = []; // Books on the current admin table page.
 let currentAdminPage = 1;
 const adminBooksPerPage = 5; 
+let adminPageCursors = [null]; // Cursor for each visited page; index 0 is page 1.
+let adminNextCursor = null;
 let paginationNumbersDivGlobal; 
-let allBorrowedAdminRecords = [];
+let allBorrowedAdminRecords = []; // Open loans on the current borrowed table page.
 let currentBorrowedAdminPage = 1;
 const borrowedAdminBooksPerPage = 5; 
+let borrowedPageCursors = [null]; // Cursor for each visited page of open loans; index 0 is page 1.
+let borrowedNextCursor = null;
+let borrowedRequestId = 0;        // Guards against out-of-order responses when filters change quickly.
+let borrowedListenersAttached = false;
 let borrowedPaginationNumbersDivGlobal; 
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -35,8 +41,33 @@ document.addEventListener('DOMContentLoaded', function() {
              toggleAdminTables('all');
          });
      }
+
+    // Borrows and returns anywhere in the library update this page as they commit
+    if (typeof subscribeToAvailability === 'function') {
+        const refreshCirculation = debounce(() => {
+            refreshDashboardStats();
+            const borrowedSection = document.getElementById('borrowed-books-management-section');
+            if (borrowedSection && borrowedSection.style.display === 'block') loadAllBorrowedAdminRecords(currentBorrowedAdminPage);
+        }, 1000);
+        subscribeToAvailability(changes => {
+            if (applyAvailabilityChanges(allAdminBooks, changes)) renderAdminBookTablePage(currentAdminPage);
+            refreshCirculation();
+        }, () => {
+            loadAdminBooks(currentAdminPage);
+            refreshCirculation();
+        });
+    }
 });
 
+// Returns a wrapper that delays calls to fn until they have paused for waitMs.
+function debounce(fn, waitMs) {
+    let timer = null;
+    return function(...args) {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn.apply(this, args), waitMs);
+    };
+}
+
 // Toggles visibility between "All Books" and "Borrowed Books" tables
 function toggleAdminTables(viewToShow) {
     const allBooksSection = document.getElementById('all-books-management-section');
@@ -51,22 +82,28 @@ function toggleAdminTables(viewToShow) {
     }
 }
 
-// Fetches book data from the API and initiates table rendering.
-async function loadAdminBooks() {
+// Fetches one page of books from the API and renders it (page 1 by default).
+async function loadAdminBooks(page = 1) {
     if (!window.APP_URLS?.booksApi) {
         console.error("Admin Books: APP_URLS.booksApi not defined.");
         displayTableMessage("Error: Book API URL not configured.", 8);
         return;
     }
+    if (page === 1) adminPageCursors = [null];
+    const params = new URLSearchParams({ page_size: adminBooksPerPage });
+    const cursor = adminPageCursors[page - 1];
+    if (cursor) params.set('cursor', cursor);
+
     try {
-        const response = await fetch(window.APP_URLS.booksApi);
+        const response = await fetch(`${window.APP_URLS.booksApi}?${params.toString()}`);
         if (!response.ok) throw new Error(`HTTP error ${response.status}`);
         const data = await response.json();
 
         if (data.books) {
             allAdminBooks = data.books;
-            currentAdminPage = 1; // Reset to first page on new load
-            renderAdminBookTablePage(currentAdminPage);
+            adminNextCursor = data.nextCursor || null;
+            adminPageCursors = adminPageCursors.slice(0, page);
+            renderAdminBookTablePage(page);
             renderAdminPaginationControls();
         } else {
             displayTableMessage("No books found or error in data format.", 8);
@@ -77,30 +114,28 @@ async function loadAdminBooks() {
     }
 }
 
-// Renders a single page of books into the admin table.
+// Renders the currently loaded page of books into the admin table.
 function renderAdminBookTablePage(page) {
     const tableBody = document.getElementById('bookTableBody');
     if (!tableBody) return;
     tableBody.innerHTML = '';
     currentAdminPage = page;
 
-    const startIndex = (page - 1) * adminBooksPerPage;
-    const paginatedBooks = allAdminBooks.slice(startIndex, startIndex + adminBooksPerPage);
-
-    if (paginatedBooks.length === 0) {
+    if (allAdminBooks.length === 0) {
         displayTableMessage(page === 1 ? "No books in the library." : "No more books to display.", 8);
         return;
     }
 
-    paginatedBooks.forEach(book => {
+    allAdminBooks.forEach(book => {
         const row = tableBody.insertRow();
         const availabilityStatus = book.availability ? 'available' : 'borrowed';
-        const coverImageUrl = book.coverImage || '/static/images/default_cover.jpg';
+        const coverImageUrl = book.coverThumb || book.coverImage || '/static/images/default_cover.jpg';
+        const coverSrcset = book.coverSrcset ? `srcset="${book.coverSrcset}" sizes="30px"` : '';
         const editUrl = (window.APP_URLS?.editBookPageBase && book.django_pk) ? `${window.APP_URLS.editBookPageBase}${book.django_pk}/` : '#';
 
         row.innerHTML = `
             <td>${book.bookId || 'N/A'}</td>
-            <td><img src="${coverImageUrl}" alt="${book.bookName || ''}" style="width:30px; height:auto; margin-right:5px;"> ${book.bookName || 'N/A'}</td>
+            <td><img src="${coverImageUrl}" ${coverSrcset} alt="${book.bookName || ''}" style="width:30px; height:auto; margin-right:5px;"> ${book.bookName || 'N/A'}</td>
             <td>${book.author || 'N/A'}</td>
             <td>${Array.isArray(book.categories) ? book.categories.join(', ') : 'N/A'}</td>
             <td>${book.totalCopies ?? 0}</td>
@@ -117,7 +152,7 @@ function renderAdminBookTablePage(page) {
     attachAdminActionListeners();
 }
 
-// Renders pagination controls (page numbers, prev/next buttons).
+// Renders pagination controls. The API pages by cursor, so only Previous/Next and the current page are shown.
 function renderAdminPaginationControls() {
     const prevBtn = document.querySelector('.admin-dashboard-container .pagination .prev-btn');
     const nextBtn = document.querySelector('.admin-dashboard-container .pagination .next-btn');
@@ -127,74 +162,31 @@ function renderAdminPaginationControls() {
         return;
     }
 
-    paginationNumbersDivGlobal.innerHTML = ''; 
-    const totalPages = Math.ceil(allAdminBooks.length / adminBooksPerPage);
-
-    if (totalPages <= 1) {
+    if (currentAdminPage === 1 && !adminNextCursor) {
         prevBtn.parentElement.style.display = 'none'; 
         return;
     }
     prevBtn.parentElement.style.display = 'flex';
-
-    for (let i = 1; i <= totalPages; i++) {
-        const pageLink = document.createElement('a');
-        pageLink.href = '#';
-        pageLink.textContent = i;
-        if (i === currentAdminPage) {
-            pageLink.classList.add('active');
-        }
-        pageLink.addEventListener('click', (e) => {
-            e.preventDefault();
-            renderAdminBookTablePage(i);
-            updateAdminPaginationActiveState(); 
-        });
-        paginationNumbersDivGlobal.appendChild(pageLink); 
-    }
-    updateAdminPaginationActiveState(); 
-}
-
-// Updates the active state of pagination buttons and page numbers.
-function updateAdminPaginationActiveState() {
-    const prevBtn = document.querySelector('.admin-dashboard-container .pagination .prev-btn');
-    const nextBtn = document.querySelector('.admin-dashboard-container .pagination .next-btn');
-    if (!paginationNumbersDivGlobal || !prevBtn || !nextBtn) {
-        console.warn("Pagination control elements not found in updateAdminPaginationActiveState.");
-        return;
-    }
-    const pageLinks = paginationNumbersDivGlobal.querySelectorAll('a'); 
-    const totalPages = Math.ceil(allAdminBooks.length / adminBooksPerPage);
-
+    paginationNumbersDivGlobal.textContent = `Page ${currentAdminPage}`;
     prevBtn.disabled = currentAdminPage === 1;
-    nextBtn.disabled = currentAdminPage === totalPages;
-
-    pageLinks.forEach(link => {
-        link.classList.remove('active');
-        if (parseInt(link.textContent) === currentAdminPage) {
-            link.classList.add('active');
-        }
-    });
+    nextBtn.disabled = !adminNextCursor;
 }
 
 // Sets up event listeners for previous and next pagination buttons.
 function setupAdminPaginationListeners() {
-    const prevBtn = document.querySelector('.admin-dashboard-container .pagination .prev-btn');
-    const nextBtn = document.querySelector('.admin-dashboard-container .pagination .next-btn');
+    const prevBtn = document.querySelector('#all-books-management-section .pagination .prev-btn');
+    const nextBtn = document.querySelector('#all-books-management-section .pagination .next-btn');
 
     if (prevBtn) {
         prevBtn.addEventListener('click', () => {
-            if (currentAdminPage > 1) {
-                renderAdminBookTablePage(currentAdminPage - 1);
-                renderAdminPaginationControls(); 
-            }
+            if (currentAdminPage > 1) loadAdminBooks(currentAdminPage - 1);
         });
     }
     if (nextBtn) {
         nextBtn.addEventListener('click', () => {
-            const totalPages = Math.ceil(allAdminBooks.length / adminBooksPerPage);
-            if (currentAdminPage < totalPages) {
-                renderAdminBookTablePage(currentAdminPage + 1);
-                renderAdminPaginationControls();
-            }
+            if (!adminNextCursor) return;
+            adminPageCursors[currentAdminPage] = adminNextCursor;
+            loadAdminBooks(currentAdminPage + 1);
         });
     }
 }
@@ -234,6 +226,7 @@ async function handleDeleteBook(bookPK) {
         if (result.success) {
             alert(result.message || "Book deleted.");
             loadAdminBooks(); 
+            refreshDashboardStats();
         } else {
             alert(`Error: ${result.message || "Could not delete book."}`);
         }
@@ -244,21 +237,36 @@ async function handleDeleteBook(bookPK) {
 }
 
 
-async function loadAllBorrowedAdminRecords() {
-    if (!window.APP_URLS?.allBorrowedBooksApi) {
-        console.error("Admin Borrowed: APP_URLS.allBorrowedBooksApi not defined.");
-        displayBorrowedTableMessage("Error: Borrowed Books API URL not configured.", 5);
+// Fetches one cursor page of open loans matching the filters (page 1 by default) and renders it.
+async function loadAllBorrowedAdminRecords(page = 1) {
+    if (!window.APP_URLS?.circulationApi) {
+        console.error("Admin Borrowed: APP_URLS.circulationApi not defined.");
+        displayBorrowedTableMessage("Error: Circulation API URL not configured.", 5);
         return;
     }
+    if (page === 1) borrowedPageCursors = [null];
+    const params = new URLSearchParams({ page_size: borrowedAdminBooksPerPage, totals: page === 1 ? '1' : '0' });
+    const dueFilter = document.getElementById('borrowed-due-filter')?.value || '';
+    if (dueFilter === 'overdue') params.set('overdue', '1');
+    else if (dueFilter) params.set('due_within', dueFilter);
+    const userFilter = document.getElementById('borrowed-user-filter')?.value.trim() || '';
+    if (userFilter) params.set('user', userFilter);
+    const cursor = borrowedPageCursors[page - 1];
+    if (cursor) params.set('cursor', cursor);
+
+    const requestId = ++borrowedRequestId;
     try {
-        const response = await fetch(window.APP_URLS.allBorrowedBooksApi);
+        const response = await fetch(`${window.APP_URLS.circulationApi}?${params.toString()}`);
         if (!response.ok) throw new Error(`HTTP error ${response.status}`);
         const data = await response.json();
-
-        if (data.borrowed_books) {
-            allBorrowedAdminRecords = data.borrowed_books;
-            currentBorrowedAdminPage = 1; 
-            renderBorrowedAdminBookTablePage(currentBorrowedAdminPage);
+        if (requestId !== borrowedRequestId) return; // A newer request superseded this one.
+
+        if (data.loans) {
+            allBorrowedAdminRecords = data.loans;
+            borrowedNextCursor = data.nextCursor || null;
+            borrowedPageCursors = borrowedPageCursors.slice(0, page);
+            if (data.totals) renderBorrowedTotals(data.totals);
+            renderBorrowedAdminBookTablePage(page);
             renderBorrowedAdminPaginationControls();
         } else {
             displayBorrowedTableMessage("No currently borrowed books or error in data format.", 5);
@@ -269,105 +277,79 @@ async function loadAllBorrowedAdminRecords() {
     }
 }
 
-// Renders a page of borrowed book records into the admin's borrowed books table.
+// Shows how many open loans match the filters, and how many of those are overdue.
+function renderBorrowedTotals(totals) {
+    const totalsEl = document.getElementById('borrowedTotals');
+    if (totalsEl) totalsEl.textContent = `${totals.count} loans, ${totals.overdue} overdue`;
+}
+
+// Renders the loaded page of open loans into the admin's borrowed books table.
 function renderBorrowedAdminBookTablePage(page) {
     const tableBody = document.getElementById('borrowedBookTableBody');
     if (!tableBody) return;
     tableBody.innerHTML = '';
     currentBorrowedAdminPage = page;
 
-    const startIndex = (page - 1) * borrowedAdminBooksPerPage;
-    const paginatedRecords = allBorrowedAdminRecords.slice(startIndex, startIndex + borrowedAdminBooksPerPage);
-
-    if (paginatedRecords.length === 0) {
-        displayBorrowedTableMessage(page === 1 ? "No books are currently borrowed." : "No more borrowed records.", 5);
+    if (allBorrowedAdminRecords.length === 0) {
+        displayBorrowedTableMessage(page === 1 ? "No borrowed books match these filters." : "No more borrowed records.", 5);
         return;
     }
 
-    paginatedRecords.forEach(record => {
+    const now = new Date();
+    allBorrowedAdminRecords.forEach(record => {
         const row = tableBody.insertRow();
+        const overdue = record.dueDate && new Date(record.dueDate) < now;
         row.innerHTML = `
             <td>${record.username || 'N/A'}</td>
-            <td>${record.book_title || 'N/A'}</td>
-            <td>${record.borrow_date || 'N/A'}</td>
-            <td>${record.due_date || 'N/A'}</td>
+            <td>${record.bookTitle || 'N/A'}</td>
+            <td>${record.borrowDate ? record.borrowDate.slice(0, 16).replace('T', ' ') : 'N/A'}</td>
+            <td${overdue ? ' class="status-borrowed"' : ''}>${record.dueDate ? record.dueDate.slice(0, 10) : 'N/A'}${overdue ? ' (overdue)' : ''}</td>
             <td>
-                <button class="btn primary-btn admin-return-book-btn" data-borrowed-pk="${record.borrowed_pk}" data-book-title="${record.book_title || 'this book'}">Mark as Returned</button>
+                <button class="btn primary-btn admin-return-book-btn" data-borrowed-pk="${record.borrowedPk}" data-book-title="${record.bookTitle || 'this book'}">Mark as Returned</button>
             </td>
         `;
     });
     attachAdminReturnButtonListeners(); 
 }
 
-// Renders pagination controls for the admin's borrowed books table.
+// Renders Previous/Next and the current page number; the API pages by cursor, so there are no page links.
 function renderBorrowedAdminPaginationControls() {
     const paginationContainer = document.getElementById('borrowedPagination');
-    if (!borrowedPaginationNumbersDivGlobal || !paginationContainer) return;
-    
-    const totalPages = Math.ceil(allBorrowedAdminRecords.length / borrowedAdminBooksPerPage);
-    borrowedPaginationNumbersDivGlobal.innerHTML = '';
+    const prevBtn = document.getElementById('borrowedPrevBtn');
+    const nextBtn = document.getElementById('borrowedNextBtn');
+    if (!paginationContainer || !prevBtn || !nextBtn) return;
 
-    if (totalPages <= 1) {
+    if (currentBorrowedAdminPage === 1 && !borrowedNextCursor) {
         paginationContainer.style.display = 'none';
         return;
     }
     paginationContainer.style.display = 'flex';
-
-    for (let i = 1; i <= totalPages; i++) {
-        const pageLink = document.createElement('a');
-        pageLink.href = '#';
-        pageLink.textContent = i;
-        if (i === currentBorrowedAdminPage) pageLink.classList.add('active');
-        pageLink.addEventListener('click', (e) => {
-            e.preventDefault();
-            renderBorrowedAdminBookTablePage(i);
-            updateBorrowedAdminPaginationActiveState();
-        });
-        borrowedPaginationNumbersDivGlobal.appendChild(pageLink);
-    }
-    updateBorrowedAdminPaginationActiveState();
-}
-
-// Updates active state for borrowed books pagination.
-function updateBorrowedAdminPaginationActiveState() {
-    const prevBtn = document.getElementById('borrowedPrevBtn');
-    const nextBtn = document.getElementById('borrowedNextBtn');
-    if (!borrowedPaginationNumbersDivGlobal || !prevBtn || !nextBtn) return;
-
-    const pageLinks = borrowedPaginationNumbersDivGlobal.querySelectorAll('a');
-    const totalPages = Math.ceil(allBorrowedAdminRecords.length / borrowedAdminBooksPerPage);
-
+    if (borrowedPaginationNumbersDivGlobal) borrowedPaginationNumbersDivGlobal.textContent = `Page ${currentBorrowedAdminPage}`;
     prevBtn.disabled = currentBorrowedAdminPage === 1;
-    nextBtn.disabled = currentBorrowedAdminPage === totalPages;
-
-    pageLinks.forEach(link => {
-        link.classList.remove('active');
-        if (parseInt(link.textContent) === currentBorrowedAdminPage) link.classList.add('active');
-    });
+    nextBtn.disabled = !borrowedNextCursor;
 }
 
-// Sets up listeners for borrowed books pagination.
+// Sets up listeners for borrowed books pagination and filters (once).
 function setupBorrowedAdminPaginationListeners() {
+    if (borrowedListenersAttached) return;
+    borrowedListenersAttached = true;
     const prevBtn = document.getElementById('borrowedPrevBtn');
     const nextBtn = document.getElementById('borrowedNextBtn');
 
     if (prevBtn) {
         prevBtn.addEventListener('click', () => {
-            if (!prevBtn.disabled && currentBorrowedAdminPage > 1) {
-                renderBorrowedAdminBookTablePage(currentBorrowedAdminPage - 1);
-                updateBorrowedAdminPaginationActiveState();
-            }
+            if (!prevBtn.disabled && currentBorrowedAdminPage > 1) loadAllBorrowedAdminRecords(currentBorrowedAdminPage - 1);
         });
     }
     if (nextBtn) {
         nextBtn.addEventListener('click', () => {
-            const totalPages = Math.ceil(allBorrowedAdminRecords.length / borrowedAdminBooksPerPage);
-            if (!nextBtn.disabled && currentBorrowedAdminPage < totalPages) {
-                renderBorrowedAdminBookTablePage(currentBorrowedAdminPage + 1);
-                updateBorrowedAdminPaginationActiveState();
-            }
+            if (nextBtn.disabled || !borrowedNextCursor) return;
+            borrowedPageCursors[currentBorrowedAdminPage] = borrowedNextCursor;
+            loadAllBorrowedAdminRecords(currentBorrowedAdminPage + 1);
         });
     }
+    document.getElementById('borrowed-due-filter')?.addEventListener('change', () => loadAllBorrowedAdminRecords());
+    document.getElementById('borrowed-user-filter')?.addEventListener('input', debounce(() => loadAllBorrowedAdminRecords(), 300));
 }
 
 // Attaches listeners to "Mark as Returned" buttons in the admin's borrowed books table.
@@ -402,7 +384,8 @@ async function handleAdminReturnBook(borrowedPk, tableRowElement) {
         if (result.success) {
             alert(result.message || "Book marked as returned.");
             if (tableRowElement) tableRowElement.remove(); 
-            loadAllBorrowedAdminRecords(); // Refresh this table
+            loadAllBorrowedAdminRecords(currentBorrowedAdminPage); // Refresh this page of the table
+            refreshDashboardStats();
      
         } else {
             alert(`Error: ${result.message || "Could not mark book as returned."}`);
@@ -413,6 +396,21 @@ async function handleAdminReturnBook(borrowedPk, tableRowElement) {
     }
 }
 
+// Re-reads the dashboard statistics cards from the stats API after a change.
+async function refreshDashboardStats() {
+    if (!window.APP_URLS?.statsApi) return;
+    try {
+        const response = await fetch(window.APP_URLS.statsApi);
+        if (!response.ok) throw new Error(`HTTP error ${response.status}`);
+        const data = await response.json();
+        document.querySelectorAll('.stat-number[data-stat]').forEach(el => {
+            if (data[el.dataset.stat] !== undefined) el.textContent = data[el.dataset.stat];
+        });
+    } catch (error) {
+        console.error('Error refreshing dashboard stats:', error);
+    }
+}
+
 // Helper to display a message in the borrowed books table body.
 function displayBorrowedTableMessage(message, colspan) {
     const tableBody = document.getElementById('borrowedBookTableBody');
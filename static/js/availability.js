@@ -0,0 +1,32 @@
+// Live availability updates pushed by the server (see library/events.py).
+// Calls onChanges([{bookId, availableCopies}, ...]) for each committed borrow, return or edit,
+// and onReset() when updates were missed and the page should reload its books.
+function subscribeToAvailability(onChanges, onReset) {
+    if (!window.EventSource || !window.APP_URLS?.availabilityEventsApi) return null;
+    const source = new EventSource(window.APP_URLS.availabilityEventsApi);
+    source.addEventListener('availability', (event) => {
+        try {
+            onChanges(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Error applying availability update:', error);
+        }
+    });
+    source.addEventListener('reset', () => { if (onReset) onReset(); });
+    // The browser reconnects on its own (resuming from the last event id); a 204 or 503 closes the stream
+    // for good, and the page then simply keeps the data it fetched.
+    return source;
+}
+
+// Applies availability changes to a list of catalog books (as returned by /api/books/); returns true if any changed.
+function applyAvailabilityChanges(books, changes) {
+    let changed = false;
+    changes.forEach(change => {
+        const book = books.find(b => b.bookId === change.bookId);
+        if (book && book.availableCopies !== change.availableCopies) {
+            book.availableCopies = change.availableCopies;
+            book.availability = change.availableCopies > 0;
+            changed = true;
+        }
+    });
+    return changed;
+}
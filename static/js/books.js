@@ -1,35 +1,100 @@
 
-let allBooksGlobal = []; // Stores all books fetched from the API for client-side filtering.
+let currentPageBooks = []; // Books on the page currently shown; the server does filtering, sorting and paging.
+let pageCursors = [null];   // Cursor used to fetch each visited page (index 0 is the first page).
+let currentPageIndex = 0;
+let nextPageCursor = null;
+let bookListRequestId = 0;  // Guards against out-of-order responses when filters change quickly.
+const BOOK_LIST_PAGE_SIZE = 24;
 
 // Initializes book fetching and filter setup when the DOM is ready.
 document.addEventListener('DOMContentLoaded', function() {
+    if (!document.querySelector('.book-grid')) return; // Page only uses the borrow helpers below.
     if (!window.APP_URLS?.booksApi) {
         console.error("Books JS: APP_URLS.booksApi not defined.");
         displayBookGridMessage("<p class='error-message'>Configuration error: Cannot load books.</p>");
         return;
     }
 
-    fetch(window.APP_URLS.booksApi)
-        .then(response => {
-            if (!response.ok) throw new Error(`HTTP error ${response.status}: Failed to fetch books.`);
-            return response.json();
-        })
-        .then(data => {
-            if (data.books) {
-                allBooksGlobal = data.books; 
-                displayBooks(data.books);
-                setupBookListFilters();      
-                populateCategoryFilterOptions(data.books); 
-            } else {
-                displayBookGridMessage("<p class='error-message'>No books found or error in data format.</p>");
-            }
-        })
-        .catch(error => {
-            console.error('Error fetching books for book list:', error);
-            displayBookGridMessage(`<p class='error-message'>Failed to load books: ${error.message}.</p>`);
-        });
+    setupBookListFilters();
+    setupBookListPagination();
+    loadBookPage(0);
+    if (typeof subscribeToAvailability === 'function') {
+        subscribeToAvailability(changes => {
+            if (applyAvailabilityChanges(currentPageBooks, changes)) displayBooks(currentPageBooks);
+        }, () => loadBookPage(currentPageIndex));
+    }
 });
 
+// Reads the current filter controls into the query parameters understood by the books API.
+function getBookListFilters() {
+    return {
+        category: document.getElementById('category-filter')?.value || 'all',
+        availability: document.getElementById('availability-filter')?.value || 'all',
+        sort: document.getElementById('sort-by')?.value || 'title-asc',
+        search: document.getElementById('search')?.value.trim() || '',
+        search_type: document.getElementById('search-type')?.value || 'all'
+    };
+}
+
+// Fetches the page at pageIndex (using its stored cursor) and renders it.
+async function loadBookPage(pageIndex) {
+    const requestId = ++bookListRequestId;
+    const params = new URLSearchParams(getBookListFilters());
+    params.set('page_size', BOOK_LIST_PAGE_SIZE);
+    const cursor = pageCursors[pageIndex];
+    if (cursor) params.set('cursor', cursor);
+
+    try {
+        const response = await fetch(`${window.APP_URLS.booksApi}?${params.toString()}`);
+        if (!response.ok) throw new Error(`HTTP error ${response.status}: Failed to fetch books.`);
+        const data = await response.json();
+        if (requestId !== bookListRequestId) return; // A newer request superseded this one.
+
+        if (data.books) {
+            currentPageBooks = data.books;
+            currentPageIndex = pageIndex;
+            nextPageCursor = data.nextCursor || null;
+            pageCursors = pageCursors.slice(0, pageIndex + 1);
+            displayBooks(currentPageBooks);
+            updateBookListPagination();
+        } else {
+            displayBookGridMessage("<p class='error-message'>No books found or error in data format.</p>");
+        }
+    } catch (error) {
+        console.error('Error fetching books for book list:', error);
+        displayBookGridMessage(`<p class='error-message'>Failed to load books: ${error.message}.</p>`);
+    }
+}
+
+// Wires the Previous/Next buttons of the book list pagination bar.
+function setupBookListPagination() {
+    const container = document.getElementById('bookListPagination');
+    if (!container) return;
+    container.querySelector('.prev-btn')?.addEventListener('click', () => {
+        if (currentPageIndex > 0) loadBookPage(currentPageIndex - 1);
+    });
+    container.querySelector('.next-btn')?.addEventListener('click', () => {
+        if (!nextPageCursor) return;
+        pageCursors[currentPageIndex + 1] = nextPageCursor;
+        loadBookPage(currentPageIndex + 1);
+    });
+}
+
+// Shows or hides the pagination bar and enables the buttons that apply.
+function updateBookListPagination() {
+    const container = document.getElementById('bookListPagination');
+    if (!container) return;
+    const hasPrev = currentPageIndex > 0;
+    const hasNext = Boolean(nextPageCursor);
+    container.style.display = (hasPrev || hasNext) ? 'flex' : 'none';
+    const prevBtn = container.querySelector('.prev-btn');
+    const nextBtn = container.querySelector('.next-btn');
+    if (prevBtn) prevBtn.disabled = !hasPrev;
+    if (nextBtn) nextBtn.disabled = !hasNext;
+    const numbers = document.getElementById('bookListPaginationNumbers');
+    if (numbers) numbers.textContent = `Page ${currentPageIndex + 1}`;
+}
+
 // Renders book cards into the .book-grid element.
 function displayBooks(booksToDisplay) {
     const bookGrid = document.querySelector('.book-grid');
@@ -50,13 +115,14 @@ function displayBooks(booksToDisplay) {
         const borrowButtonText = book.availability ? 'Borrow' : (book.totalCopies > 0 ? 'Unavailable' : 'Out of Stock');
         const isAdmin = typeof localIsAdmin === 'function' ? localIsAdmin() : false; // From auth.js
 
-        const coverImageUrl = book.coverImage || '/static/images/default_cover.jpg';
+        const coverImageUrl = book.coverThumb || book.coverImage || '/static/images/default_cover.jpg';
+        const coverSrcset = book.coverSrcset ? `srcset="${book.coverSrcset}" sizes="(max-width: 600px) 100vw, 300px"` : '';
         let detailUrl = (window.APP_URLS?.bookDetailBase && book.bookId) ? `${window.APP_URLS.bookDetailBase}${book.bookId}/` : '#';
         let editUrl = (isAdmin && window.APP_URLS?.editBookPageBase && book.django_pk) ? `${window.APP_URLS.editBookPageBase}${book.django_pk}/` : '#';
 
 
         bookCard.innerHTML = `
-            <img src="${coverImageUrl}" alt="${book.bookName || 'Book'} cover" class="book-cover">
+            <img src="${coverImageUrl}" ${coverSrcset} alt="${book.bookName || 'Book'} cover" class="book-cover" loading="lazy">
             <div class="book-info">
                 <h3 class="book-title">${book.bookName || 'Untitled'}</h3>
                 <p class="book-author">${book.author || 'Unknown'}</p>
@@ -74,27 +140,6 @@ function displayBooks(booksToDisplay) {
     attachBorrowButtonListeners();
 }
 
-// Populates the category filter dropdown from the list of all books.
-function populateCategoryFilterOptions(allBooks) {
-    const categoryFilter = document.getElementById('category-filter');
-    if (!categoryFilter) return;
-
-    const uniqueCategories = new Set();
-    allBooks.forEach(book => {
-        if (Array.isArray(book.categories)) book.categories.forEach(cat => uniqueCategories.add(cat));
-    });
-
-    const firstOptionHTML = categoryFilter.options.length > 0 ? categoryFilter.options[0].outerHTML : '<option value="all">All Categories</option>';
-    categoryFilter.innerHTML = firstOptionHTML; 
-    
-    Array.from(uniqueCategories).sort().forEach(category => {
-        const option = document.createElement('option');
-        option.value = category.toLowerCase(); 
-        option.textContent = category;
-        categoryFilter.appendChild(option);
-    });
-}
-
 // Sets up event listeners for all filter and search input elements.
 function setupBookListFilters() { 
     const elements = {
@@ -109,7 +154,10 @@ function setupBookListFilters() {
     for (const key in elements) {
         if (elements[key] && key !== 'searchForm') {
             elements[key].addEventListener('change', applyBookListFilters);
-            if (key === 'search') elements[key].addEventListener('input', applyBookListFilters); // Search on input
+            if (key === 'search') {
+                elements[key].addEventListener('input', debounce(applyBookListFilters, 300)); // Search as the user types
+                elements[key].addEventListener('input', debounce(updateSearchSuggestions, 100));
+            }
         }
     }
     if (elements.searchForm) {
@@ -120,64 +168,38 @@ function setupBookListFilters() {
     }
 }
 
-// Applies all active filters and re-renders the book list.
-function applyBookListFilters() {
-    const filters = {
-        category: document.getElementById('category-filter')?.value || 'all',
-        availability: document.getElementById('availability-filter')?.value || 'all',
-        sort: document.getElementById('sort-by')?.value || 'title-asc',
-        search: document.getElementById('search')?.value.toLowerCase() || '',
-        searchType: document.getElementById('search-type')?.value || 'all'
-    };
-    
-    let filteredBooks = [...allBooksGlobal]; 
-
-    // Apply category filter
-    if (filters.category !== 'all') {
-        filteredBooks = filteredBooks.filter(book => 
-            Array.isArray(book.categories) && book.categories.some(cat => cat.toLowerCase() === filters.category)
-        );
+// Fills the search box's datalist with title, author and category suggestions for what has been typed.
+let suggestRequestId = 0;
+async function updateSearchSuggestions() {
+    const list = document.getElementById('search-suggestions');
+    const query = document.getElementById('search')?.value.trim() || '';
+    if (!list || !window.APP_URLS?.suggestBooksApi) return;
+    const requestId = ++suggestRequestId;
+    if (!query) {
+        list.innerHTML = '';
+        return;
     }
-    // Apply availability filter
-    if (filters.availability === 'available') filteredBooks = filteredBooks.filter(book => book.availability);
-    else if (filters.availability === 'borrowed') filteredBooks = filteredBooks.filter(book => !book.availability);
-    
-    // Apply search filter
-    if (filters.search) {
-        filteredBooks = filteredBooks.filter(book => {
-            const name = (book.bookName || '').toLowerCase();
-            const author = (book.author || '').toLowerCase();
-            const cats = Array.isArray(book.categories) ? book.categories.map(c => c.toLowerCase()) : [];
-
-            const titleMatch = name.includes(filters.search);
-            const authorMatch = author.includes(filters.search);
-            const categoryMatch = cats.some(cat => cat.includes(filters.search));
-
-            if (filters.searchType === 'all') return titleMatch || authorMatch || categoryMatch;
-            if (filters.searchType === 'title') return titleMatch;
-            if (filters.searchType === 'author') return authorMatch;
-            if (filters.searchType === 'category') return categoryMatch;
-            return false;
-        });
+    const params = new URLSearchParams({ q: query, search_type: document.getElementById('search-type')?.value || 'all' });
+    try {
+        const response = await fetch(`${window.APP_URLS.suggestBooksApi}?${params.toString()}`);
+        if (!response.ok) throw new Error(`HTTP error ${response.status}: Failed to fetch suggestions.`);
+        const data = await response.json();
+        if (requestId !== suggestRequestId) return; // A newer keystroke superseded this one.
+        list.replaceChildren(...data.suggestions.map(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.text;
+            option.label = suggestion.type;
+            return option;
+        }));
+    } catch (error) {
+        console.error("Error fetching search suggestions:", error);
     }
-    
-    // Apply sorting
-    filteredBooks.sort((a, b) => {
-        const valA = (field) => (a[field] || (field.includes('Date') ? 0 : '')).toString();
-        const valB = (field) => (b[field] || (field.includes('Date') ? 0 : '')).toString();
+}
 
-        switch (filters.sort) {
-            case 'title-asc': return valA('bookName').localeCompare(valB('bookName'));
-            case 'title-desc': return valB('bookName').localeCompare(valA('bookName'));
-            case 'author-asc': return valA('author').localeCompare(valB('author'));
-            case 'author-desc': return valB('author').localeCompare(valA('author'));
-            case 'newest': return (new Date(valB('publicationDate'))) - (new Date(valA('publicationDate')));
-            case 'oldest': return (new Date(valA('publicationDate'))) - (new Date(valB('publicationDate')));
-            default: return 0;
-        }
-    });
-    
-    displayBooks(filteredBooks);
+// Restarts paging from the first page whenever a filter, search or sort option changes.
+function applyBookListFilters() {
+    pageCursors = [null];
+    loadBookPage(0);
 }
 
 // Attaches click listeners to all "Borrow" buttons.
@@ -263,15 +285,15 @@ async function handleBorrowBook(bookPK, buttonElement) {
                     }
                 }
             }
-            // Update local data and re-render
-            const bookInGlobalList = allBooksGlobal.find(b => b.django_pk == bookPK);
-            if (bookInGlobalList) {
-                bookInGlobalList.availability = false;
-                if (typeof bookInGlobalList.availableCopies === 'number') {
-                     bookInGlobalList.availableCopies = Math.max(0, bookInGlobalList.availableCopies - 1);
+            // Update the current page's data and re-render it without another request
+            const bookOnPage = currentPageBooks.find(b => b.django_pk == bookPK);
+            if (bookOnPage) {
+                bookOnPage.availability = false;
+                if (typeof bookOnPage.availableCopies === 'number') {
+                     bookOnPage.availableCopies = Math.max(0, bookOnPage.availableCopies - 1);
                 }
+                displayBooks(currentPageBooks);
             }
-            applyBookListFilters(); // Re-render the list to reflect changes
         } else {
             alert(result.message || "Failed to borrow book. Please try again.");
         }
@@ -285,4 +307,13 @@ async function handleBorrowBook(bookPK, buttonElement) {
 function displayBookGridMessage(htmlMessage) {
     const bookGrid = document.querySelector('.book-grid');
     if (bookGrid) bookGrid.innerHTML = htmlMessage;
+}
+
+// Returns a wrapper that delays calls to fn until input has paused for waitMs.
+function debounce(fn, waitMs) {
+    let timer = null;
+    return function(...args) {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn.apply(this, args), waitMs);
+    };
 }
\ No newline at end of file